@@ -18,6 +18,22 @@ app.conf.beat_schedule = {
         'task': 'financial_app.tasks.send_daily_summary',
         'schedule': crontab(hour=18, minute=0),  # Run at 6 PM daily
     },
+    'rebuild-monthly-rollups': {
+        'task': 'financial_app.tasks.rebuild_monthly_rollups',
+        'schedule': crontab(hour=2, minute=0),  # Run at 2 AM daily
+    },
+    'flush-user-activity': {
+        'task': 'financial_app.tasks.flush_user_activity',
+        'schedule': crontab(),  # Run every minute
+    },
+    'refresh-dashboards': {
+        'task': 'financial_app.tasks.refresh_dashboards',
+        'schedule': crontab(hour=0, minute=1),  # Run just after midnight
+    },
+    'prune-invoice-pdf-cache': {
+        'task': 'financial_app.tasks.prune_invoice_pdf_cache',
+        'schedule': crontab(minute=30),  # Run every hour
+    },
     'backup-database': {
         'task': 'financial_app.tasks.backup_database',
         'schedule': crontab(hour=0, minute=0),  # Run at midnight
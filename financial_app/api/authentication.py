@@ -0,0 +1,112 @@
+from collections import OrderedDict
+from django.conf import settings
+from django.utils.translation import gettext_lazy as _
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import InvalidToken
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.tokens import AccessToken
+from rest_framework_simplejwt.utils import aware_utcnow
+import jwt
+import threading
+import time
+
+class VerifiedTokenCache:
+    """
+    Bounded LRU of verified JWTs and their payloads, so a token seen again
+    before it expires is trusted without another HMAC check or JSON
+    decode. Entries are keyed by the whole token, never its signature
+    alone, and expire with the token's exp claim.
+    """
+    def __init__(self, maxsize=4096):
+        self.maxsize = maxsize
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+
+    @staticmethod
+    def get_leeway():
+        leeway = api_settings.LEEWAY
+        return leeway.total_seconds() if hasattr(leeway, 'total_seconds') else leeway
+
+    @staticmethod
+    def decode(token):
+        """Verify a token the way SimpleJWT's token backend does."""
+        return jwt.decode(
+            token,
+            api_settings.SIGNING_KEY,
+            algorithms=[api_settings.ALGORITHM],
+            audience=api_settings.AUDIENCE,
+            issuer=api_settings.ISSUER,
+            leeway=api_settings.LEEWAY
+        )
+
+    def verify(self, token, now=None):
+        """
+        Get the payload of a valid token. Raises jwt.InvalidTokenError
+        (or its subclass ExpiredSignatureError) otherwise.
+        """
+        now = time.time() if now is None else now
+        with self.lock:
+            entry = self.entries.get(token)
+            if entry is not None:
+                expires, payload = entry
+                if expires > now:
+                    self.entries.move_to_end(token)
+                    return payload
+                del self.entries[token]
+
+        payload = self.decode(token)
+        if 'exp' in payload:
+            with self.lock:
+                self.entries[token] = (payload['exp'] + self.get_leeway(), payload)
+                self.entries.move_to_end(token)
+                while len(self.entries) > self.maxsize:
+                    self.entries.popitem(last=False)
+        return payload
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+verified_tokens = VerifiedTokenCache(getattr(settings, 'JWT_VERIFICATION_CACHE_SIZE', 4096))
+
+class VerifiedAccessToken(AccessToken):
+    """Access token built from an already verified payload."""
+    def __init__(self, token, payload):
+        self.token = token
+        self.payload = payload
+        self.current_time = aware_utcnow()
+
+class CachedJWTAuthentication(JWTAuthentication):
+    """
+    SimpleJWT authentication that reuses the verification done by
+    JWTAuthenticationMiddleware for the same request, or the shared
+    VerifiedTokenCache. Use it in REST_FRAMEWORK's
+    DEFAULT_AUTHENTICATION_CLASSES in place of JWTAuthentication.
+    """
+    def authenticate(self, request):
+        header = self.get_header(request)
+        if header is None:
+            return None
+
+        raw_token = self.get_raw_token(header)
+        if raw_token is None:
+            return None
+        if isinstance(raw_token, bytes):
+            raw_token = raw_token.decode()
+
+        validated_token = self.get_verified_token(request, raw_token)
+        return self.get_user(validated_token), validated_token
+
+    def get_verified_token(self, request, raw_token):
+        http_request = getattr(request, '_request', request)
+        if getattr(http_request, 'user_token', None) == raw_token:
+            payload = http_request.user_token_payload
+        else:
+            try:
+                payload = verified_tokens.verify(raw_token)
+            except jwt.InvalidTokenError:
+                raise InvalidToken(_('Token is invalid or expired'))
+
+        if payload.get(api_settings.TOKEN_TYPE_CLAIM) != AccessToken.token_type:
+            raise InvalidToken(_('Token has wrong type'))
+        return VerifiedAccessToken(raw_token, payload)
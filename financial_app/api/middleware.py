@@ -5,64 +5,151 @@ from django.conf import settings
 from rest_framework import status
 from rest_framework.response import Response
 from rest_framework.exceptions import APIException
+from logging.handlers import QueueListener
 import jwt
 import json
 import logging
+import os
+import queue
+import random
+import threading
+import time
 import traceback
 from ..models import UserProfile
+from .authentication import verified_tokens
+from .permissions import AuthorizationContext
+from ..services.activity_service import UserActivityService
 
 logger = logging.getLogger(__name__)
 
+class ForwardingHandler(logging.Handler):
+    """Hand a record to the handlers configured for its own logger."""
+    def emit(self, record):
+        logging.getLogger(record.name).handle(record)
+
+class BackgroundLogQueue:
+    """
+    Ship log records to a listener thread that passes them on to their
+    logger's handlers, so formatting and I/O happen off the request thread.
+    The listener starts on first use in each process. Records are dropped
+    and counted when the queue is full rather than blocking a request.
+    """
+    def __init__(self, maxsize=10000):
+        self.maxsize = maxsize
+        self.queue = None
+        self.listener = None
+        self.pid = None
+        self.dropped = 0
+        self.lock = threading.Lock()
+
+    def start(self):
+        with self.lock:
+            if self.pid == os.getpid():
+                return
+            # A forked worker needs its own queue and thread
+            self.queue = queue.Queue(self.maxsize)
+            self.listener = QueueListener(self.queue, ForwardingHandler())
+            self.listener.start()
+            self.pid = os.getpid()
+
+    def put(self, record):
+        if self.pid != os.getpid():
+            self.start()
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+    def flush(self):
+        """Wait until every queued record has been handled."""
+        if self.pid == os.getpid():
+            self.queue.join()
+
+class LazyLogEntry:
+    """
+    Log message holding raw request and response bodies, parsed and
+    serialized to JSON only when a handler formats it.
+    """
+    def __init__(self, entry):
+        self.entry = entry
+
+    @staticmethod
+    def parse_body(body):
+        if body is None:
+            return None
+        try:
+            return json.loads(body)
+        except ValueError:
+            return body.decode('utf-8', 'replace')
+
+    def __str__(self):
+        entry = dict(self.entry)
+        entry['request_body'] = self.parse_body(entry['request_body'])
+        entry['response_body'] = self.parse_body(entry['response_body'])
+        return json.dumps(entry, default=str)
+
 class APILoggingMiddleware:
     """
-    Middleware to log all API requests and responses
+    Middleware to log API requests and responses without slowing them down.
+    Bodies are captured as capped raw bytes, and parsing, serialization and
+    output happen on a background thread.
+
+    Settings:
+        API_LOG_SAMPLE_RATE: share of requests logged, errors (4xx and 5xx)
+            are always logged (default 1.0)
+        API_LOG_BODY_LIMIT: bytes of each body kept (default 4096)
+        API_LOG_RESPONSE_BODIES: 'errors', 'all' or 'none' (default
+            'errors'), which responses have their body logged
+        API_LOG_QUEUE_SIZE: records waiting for the background thread
+            before new ones are dropped (default 10000)
     """
+    log_queue = None
+
     def __init__(self, get_response):
         self.get_response = get_response
+        self.sample_rate = getattr(settings, 'API_LOG_SAMPLE_RATE', 1.0)
+        self.body_limit = getattr(settings, 'API_LOG_BODY_LIMIT', 4096)
+        self.response_bodies = getattr(settings, 'API_LOG_RESPONSE_BODIES', 'errors')
+        if APILoggingMiddleware.log_queue is None:
+            APILoggingMiddleware.log_queue = BackgroundLogQueue(
+                getattr(settings, 'API_LOG_QUEUE_SIZE', 10000)
+            )
 
     def __call__(self, request):
         # Skip logging for non-API requests
         if not request.path.startswith('/api/'):
             return self.get_response(request)
 
-        # Log request
+        sampled = logger.isEnabledFor(logging.INFO) and (
+            self.sample_rate >= 1 or random.random() < self.sample_rate
+        )
         start_time = timezone.now()
-        method = request.method
-        path = request.path
-        query_params = dict(request.GET)
-        headers = self.get_safe_headers(request)
+        started = time.perf_counter()
 
-        # Log request body for non-GET requests
+        # Only JSON request bodies are kept, uploads are never read here
         body = None
-        if method != 'GET':
-            try:
-                body = json.loads(request.body) if request.body else None
-            except json.JSONDecodeError:
-                body = '<Invalid JSON>'
+        if sampled and request.method != 'GET' and request.content_type == 'application/json':
+            body = request.body[:self.body_limit]
 
-        # Get the response
         response = self.get_response(request)
+        duration = time.perf_counter() - started
 
-        # Calculate request duration
-        duration = (timezone.now() - start_time).total_seconds()
-
-        # Log response
         status_code = response.status_code
-        response_body = None
+        if not sampled and status_code < 400:
+            return response
 
-        if status_code != 204:  # No content
-            try:
-                response_body = json.loads(response.content)
-            except json.JSONDecodeError:
-                response_body = '<Invalid JSON>'
+        response_body = None
+        if (status_code != 204 and not response.streaming and
+                (self.response_bodies == 'all' or
+                 (self.response_bodies == 'errors' and status_code >= 400))):
+            response_body = response.content[:self.body_limit]
 
-        # Prepare log entry
         log_entry = {
             'timestamp': start_time.isoformat(),
-            'method': method,
-            'path': path,
-            'query_params': query_params,
-            'headers': headers,
+            'method': request.method,
+            'path': request.path,
+            'query_params': dict(request.GET),
+            'headers': self.get_safe_headers(request),
             'request_body': body,
             'status_code': status_code,
             'response_body': response_body,
@@ -72,11 +159,15 @@ class APILoggingMiddleware:
 
         # Log based on status code
         if status_code >= 500:
-            logger.error(json.dumps(log_entry))
+            level = logging.ERROR
         elif status_code >= 400:
-            logger.warning(json.dumps(log_entry))
+            level = logging.WARNING
         else:
-            logger.info(json.dumps(log_entry))
+            level = logging.INFO
+        if logger.isEnabledFor(level):
+            self.log_queue.put(logger.makeRecord(
+                logger.name, level, __file__, 0, LazyLogEntry(log_entry), None, None
+            ))
 
         return response
 
@@ -90,16 +181,99 @@ class APILoggingMiddleware:
             if k.lower() not in sensitive_headers
         }
 
+class SlidingWindowRateLimiter:
+    """
+    Sliding window rate limiter shared by every process through the cache.
+
+    Requests are counted per fixed window with an atomic cache.incr, and
+    the count of the previous window is weighted by how much of it still
+    overlaps the sliding window, so a burst across a window boundary
+    cannot double the allowance. The previous window's count is final once
+    it ends and is kept in process, and a key found over its limit is
+    refused in process until it may fall below it. A request usually costs
+    one cache round trip, the increment. The first request a process sees
+    in a window also reads the previous count, and the first one of a
+    window anywhere creates the counter first, so it takes up to four.
+    """
+
+    def __init__(self, cache_alias='default'):
+        self.cache_alias = cache_alias
+        self.final_counts = {}
+        self.blocked_until = {}
+
+    @property
+    def cache(self):
+        from django.core.cache import caches
+        return caches[self.cache_alias]
+
+    def hit(self, key, calls, period, now=None):
+        """
+        Count a request against key and return whether it is allowed, at
+        most calls requests in any period seconds.
+        """
+        now = time.time() if now is None else now
+        if self.blocked_until.get(key, 0) > now:
+            return False
+
+        window = int(now // period)
+        elapsed = (now - window * period) / period
+        current = self.increment(f"{key}:{window}", period)
+        previous = self.get_final_count(f"{key}:{window - 1}")
+
+        if previous * (1 - elapsed) + current <= calls:
+            return True
+
+        # The estimate only falls as the previous window slides out
+        if previous and current < calls:
+            unblock = (window + 1 - (calls - current) / previous) * period
+        else:
+            unblock = (window + 1) * period
+        if len(self.blocked_until) > 10000:
+            self.blocked_until.clear()
+        self.blocked_until[key] = unblock
+        return False
+
+    def increment(self, key, period):
+        # Counters outlive their window to serve as the previous one
+        try:
+            return self.cache.incr(key)
+        except ValueError:
+            if self.cache.add(key, 1, period * 2):
+                return 1
+            return self.cache.incr(key)
+
+    def get_final_count(self, key):
+        count = self.final_counts.get(key)
+        if count is None:
+            if len(self.final_counts) > 10000:
+                self.final_counts.clear()
+            count = self.final_counts[key] = self.cache.get(key, 0)
+        return count
+
 class RateLimitMiddleware:
     """
-    Middleware to implement rate limiting
+    Rate limit authenticated API requests per user with a sliding window.
+
+    Settings:
+        API_RATE_LIMITS: limits by type, e.g. {'DEFAULT': {'calls': 100,
+            'period': 60, 'roles': {'ADMIN': 300}}}, where roles maps a
+            UserProfile role to its own number of calls
+        API_RATE_LIMIT_PATHS: (path fragment, limit type) pairs, the first
+            fragment found in the path selects the limit
     """
+    DEFAULT_RATE_LIMITS = {
+        'DEFAULT': {'calls': 100, 'period': 60},  # 100 calls per minute
+        'EXPORT': {'calls': 10, 'period': 3600},  # 10 exports per hour
+    }
+    DEFAULT_RATE_LIMIT_PATHS = (
+        ('/export/', 'EXPORT'),
+    )
+
     def __init__(self, get_response):
         self.get_response = get_response
-        self.rate_limits = {
-            'DEFAULT': {'calls': 100, 'period': 60},  # 100 calls per minute
-            'EXPORT': {'calls': 10, 'period': 3600},  # 10 exports per hour
-        }
+        self.rate_limits = getattr(settings, 'API_RATE_LIMITS', self.DEFAULT_RATE_LIMITS)
+        self.limit_paths = getattr(settings, 'API_RATE_LIMIT_PATHS', self.DEFAULT_RATE_LIMIT_PATHS)
+        self.limiter = SlidingWindowRateLimiter()
 
     def __call__(self, request):
         if not request.path.startswith('/api/'):
@@ -109,7 +283,7 @@ class RateLimitMiddleware:
             return self.get_response(request)
 
         # Determine rate limit type
-        limit_type = 'EXPORT' if '/export/' in request.path else 'DEFAULT'
+        limit_type = self.get_limit_type(request)
         
         # Check rate limit
         if self.is_rate_limited(request, limit_type):
@@ -120,25 +294,34 @@ class RateLimitMiddleware:
 
         return self.get_response(request)
 
+    def get_limit_type(self, request):
+        for fragment, limit_type in self.limit_paths:
+            if fragment in request.path:
+                return limit_type
+        return 'DEFAULT'
+
+    def get_role(self, request):
+        # Shared with the permission checks, so usually a cache hit
+        return AuthorizationContext.for_request(request).role
+
     def is_rate_limited(self, request, limit_type):
-        from django.core.cache import cache
-        
-        key = f"rate_limit:{request.user.id}:{limit_type}:{timezone.now().strftime('%Y%m%d%H%M')}"
-        current = cache.get(key, 0)
-        
-        if current >= self.rate_limits[limit_type]['calls']:
-            return True
-        
-        cache.set(
-            key,
-            current + 1,
-            self.rate_limits[limit_type]['period']
+        limit = self.rate_limits[limit_type]
+        calls = limit['calls']
+        if limit.get('roles'):
+            calls = limit['roles'].get(self.get_role(request), calls)
+
+        return not self.limiter.hit(
+            f"rate_limit:{request.user.id}:{limit_type}",
+            calls,
+            limit['period']
         )
-        return False
 
 class JWTAuthenticationMiddleware:
     """
-    Middleware to handle JWT authentication
+    Middleware to handle JWT authentication. Verified tokens are kept in
+    an in-process LRU, and the payload is left on the request for
+    CachedJWTAuthentication, so a token is verified at most once per
+    request and once per process while it is valid.
     """
     def __init__(self, get_response):
         self.get_response = get_response
@@ -151,12 +334,8 @@ class JWTAuthenticationMiddleware:
         if auth_header.startswith('Bearer '):
             token = auth_header.split(' ')[1]
             try:
-                payload = jwt.decode(
-                    token,
-                    settings.SECRET_KEY,
-                    algorithms=['HS256']
-                )
-                request.user_token_payload = payload
+                request.user_token_payload = verified_tokens.verify(token)
+                request.user_token = token
             except jwt.ExpiredSignatureError:
                 return JsonResponse({
                     'error': 'Token expired',
@@ -206,22 +385,30 @@ class ErrorHandlingMiddleware:
 
 class UserActivityMiddleware:
     """
-    Middleware to track user activity
+    Middleware to track user activity without database writes. Each
+    process records a user in the cache at most once per
+    USER_ACTIVITY_INTERVAL, and the flush_user_activity task writes the
+    profiles in bulk.
     """
     def __init__(self, get_response):
         self.get_response = get_response
+        self.interval = UserActivityService.get_interval()
+        self.recorded = {}
 
     def __call__(self, request):
         response = self.get_response(request)
 
         if request.user.is_authenticated:
-            try:
-                profile = UserProfile.objects.get(user=request.user)
-                profile.last_active = timezone.now()
-                profile.last_login_ip = self.get_client_ip(request)
-                profile.save(update_fields=['last_active', 'last_login_ip'])
-            except UserProfile.DoesNotExist:
-                pass
+            now = time.monotonic()
+            last_recorded = self.recorded.get(request.user.id)
+            if last_recorded is None or now - last_recorded >= self.interval:
+                if len(self.recorded) > 10000:
+                    self.recorded.clear()
+                self.recorded[request.user.id] = now
+                try:
+                    UserActivityService.record(request.user.id, self.get_client_ip(request))
+                except Exception as e:
+                    logger.error(f"Error recording activity of user {request.user.id}: {str(e)}")
 
         return response
 
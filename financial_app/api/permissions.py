@@ -1,5 +1,57 @@
+from django.conf import settings
+from django.core.cache import cache
 from rest_framework import permissions
-from ..models import UserProfile
+from ..models import UserProfile, Company
+
+class AuthorizationContext:
+    """
+    What permission checks need to know about a user: their profile role
+    (None without a profile) and the ids of the companies they own. It is
+    loaded once per request, and kept in the cache for
+    AUTHORIZATION_CACHE_TTL seconds (default 30, 0 to disable) until the
+    user's profile or companies change, so checks are in-memory lookups.
+    """
+    def __init__(self, user_id, role, company_ids):
+        self.user_id = user_id
+        self.role = role
+        self.company_ids = company_ids
+
+    @staticmethod
+    def get_cache_key(user_id):
+        return f"authorization_context:{user_id}"
+
+    @classmethod
+    def for_request(cls, request):
+        http_request = getattr(request, '_request', request)
+        context = getattr(http_request, '_authorization_context', None)
+        if context is None or context.user_id != request.user.pk:
+            context = http_request._authorization_context = cls.load(request.user)
+        return context
+
+    @classmethod
+    def load(cls, user):
+        if not user.is_authenticated:
+            return cls(None, None, frozenset())
+
+        ttl = getattr(settings, 'AUTHORIZATION_CACHE_TTL', 30)
+        cached = cache.get(cls.get_cache_key(user.pk)) if ttl else None
+        if cached is not None:
+            return cls(user.pk, *cached)
+
+        role = UserProfile.objects.filter(user_id=user.pk).values_list('role', flat=True).first()
+        company_ids = frozenset(
+            Company.objects.filter(owner_id=user.pk).values_list('pk', flat=True)
+        )
+        if ttl:
+            cache.set(cls.get_cache_key(user.pk), (role, company_ids), ttl)
+        return cls(user.pk, role, company_ids)
+
+    @classmethod
+    def invalidate(cls, user_id):
+        cache.delete(cls.get_cache_key(user_id))
+
+    def owns(self, company_id):
+        return company_id is not None and company_id in self.company_ids
 
 class IsCompanyOwner(permissions.BasePermission):
     """
@@ -9,10 +61,10 @@ class IsCompanyOwner(permissions.BasePermission):
         # Read permissions are allowed to any request,
         # so we'll always allow GET, HEAD or OPTIONS requests.
         if request.method in permissions.SAFE_METHODS:
-            return obj.owner == request.user
+            return obj.owner_id == request.user.pk
         
         # Write permissions are only allowed to the owner
-        return obj.owner == request.user
+        return obj.owner_id == request.user.pk
 
 class HasCompanyAccess(permissions.BasePermission):
     """
@@ -20,42 +72,36 @@ class HasCompanyAccess(permissions.BasePermission):
     based on their role.
     """
     def has_permission(self, request, view):
-        try:
-            profile = request.user.profile
-            # Admins and accountants have full access
-            if profile.role in ['ADMIN', 'ACCOUNTANT']:
-                return True
-            # Viewers only have read access
-            elif profile.role == 'VIEWER':
-                return request.method in permissions.SAFE_METHODS
-            return False
-        except UserProfile.DoesNotExist:
-            return False
+        role = AuthorizationContext.for_request(request).role
+        # Admins and accountants have full access
+        if role in ['ADMIN', 'ACCOUNTANT']:
+            return True
+        # Viewers only have read access
+        elif role == 'VIEWER':
+            return request.method in permissions.SAFE_METHODS
+        return False
 
     def has_object_permission(self, request, view, obj):
-        try:
-            profile = request.user.profile
-            company = getattr(obj, 'company', None)
-            if not company:
-                return False
-
-            # Check if user has access to this company
-            if company.owner == request.user:
-                return True
-
-            # Role-based permissions
-            if profile.role == 'ADMIN':
-                return True
-            elif profile.role == 'ACCOUNTANT':
-                # Accountants can do everything except delete
-                return request.method != 'DELETE'
-            elif profile.role == 'VIEWER':
-                # Viewers can only view
-                return request.method in permissions.SAFE_METHODS
-            return False
-        except UserProfile.DoesNotExist:
+        context = AuthorizationContext.for_request(request)
+        company_id = getattr(obj, 'company_id', None)
+        if context.role is None or company_id is None:
             return False
 
+        # Check if user has access to this company
+        if context.owns(company_id):
+            return True
+
+        # Role-based permissions
+        if context.role == 'ADMIN':
+            return True
+        elif context.role == 'ACCOUNTANT':
+            # Accountants can do everything except delete
+            return request.method != 'DELETE'
+        elif context.role == 'VIEWER':
+            # Viewers can only view
+            return request.method in permissions.SAFE_METHODS
+        return False
+
 class CanApproveExpenses(permissions.BasePermission):
     """
     Permission to check if user can approve expenses.
@@ -63,11 +109,8 @@ class CanApproveExpenses(permissions.BasePermission):
     def has_permission(self, request, view):
         if not request.user.is_authenticated:
             return False
-        try:
-            profile = request.user.profile
-            return profile.role in ['ADMIN', 'ACCOUNTANT']
-        except UserProfile.DoesNotExist:
-            return False
+        role = AuthorizationContext.for_request(request).role
+        return role in ['ADMIN', 'ACCOUNTANT']
 
 class CanManageInvoices(permissions.BasePermission):
     """
@@ -76,33 +119,27 @@ class CanManageInvoices(permissions.BasePermission):
     def has_permission(self, request, view):
         if not request.user.is_authenticated:
             return False
-        try:
-            profile = request.user.profile
-            if profile.role == 'VIEWER':
-                return request.method in permissions.SAFE_METHODS
-            return profile.role in ['ADMIN', 'ACCOUNTANT']
-        except UserProfile.DoesNotExist:
-            return False
+        role = AuthorizationContext.for_request(request).role
+        if role == 'VIEWER':
+            return request.method in permissions.SAFE_METHODS
+        return role in ['ADMIN', 'ACCOUNTANT']
 
     def has_object_permission(self, request, view, obj):
-        try:
-            profile = request.user.profile
-            # Viewers can only view
-            if profile.role == 'VIEWER':
-                return request.method in permissions.SAFE_METHODS
-            
-            # Check specific actions for accountants
-            if profile.role == 'ACCOUNTANT':
-                if request.method == 'DELETE':
-                    return False
-                if getattr(view, 'action', None) == 'void':
-                    return False
-                return True
-            
-            # Admins have full access
-            return profile.role == 'ADMIN'
-        except UserProfile.DoesNotExist:
-            return False
+        role = AuthorizationContext.for_request(request).role
+        # Viewers can only view
+        if role == 'VIEWER':
+            return request.method in permissions.SAFE_METHODS
+        
+        # Check specific actions for accountants
+        if role == 'ACCOUNTANT':
+            if request.method == 'DELETE':
+                return False
+            if getattr(view, 'action', None) == 'void':
+                return False
+            return True
+        
+        # Admins have full access
+        return role == 'ADMIN'
 
 class CanManageClients(permissions.BasePermission):
     """
@@ -111,13 +148,10 @@ class CanManageClients(permissions.BasePermission):
     def has_permission(self, request, view):
         if not request.user.is_authenticated:
             return False
-        try:
-            profile = request.user.profile
-            if profile.role == 'VIEWER':
-                return request.method in permissions.SAFE_METHODS
-            return profile.role in ['ADMIN', 'ACCOUNTANT']
-        except UserProfile.DoesNotExist:
-            return False
+        role = AuthorizationContext.for_request(request).role
+        if role == 'VIEWER':
+            return request.method in permissions.SAFE_METHODS
+        return role in ['ADMIN', 'ACCOUNTANT']
 
 class CanAccessReports(permissions.BasePermission):
     """
@@ -126,11 +160,8 @@ class CanAccessReports(permissions.BasePermission):
     def has_permission(self, request, view):
         if not request.user.is_authenticated:
             return False
-        try:
-            profile = request.user.profile
-            return profile.role in ['ADMIN', 'ACCOUNTANT', 'VIEWER']
-        except UserProfile.DoesNotExist:
-            return False
+        role = AuthorizationContext.for_request(request).role
+        return role in ['ADMIN', 'ACCOUNTANT', 'VIEWER']
 
 class CanManageSettings(permissions.BasePermission):
     """
@@ -139,13 +170,12 @@ class CanManageSettings(permissions.BasePermission):
     def has_permission(self, request, view):
         if not request.user.is_authenticated:
             return False
-        try:
-            profile = request.user.profile
-            if request.method in permissions.SAFE_METHODS:
-                return True
-            return profile.role == 'ADMIN'
-        except UserProfile.DoesNotExist:
+        role = AuthorizationContext.for_request(request).role
+        if role is None:
             return False
+        if request.method in permissions.SAFE_METHODS:
+            return True
+        return role == 'ADMIN'
 
 class IsOwnerOrReadOnly(permissions.BasePermission):
     """
@@ -157,8 +187,8 @@ class IsOwnerOrReadOnly(permissions.BasePermission):
         if request.method in permissions.SAFE_METHODS:
             return True
 
-        # Instance must have an attribute named `owner`.
-        return obj.created_by == request.user
+        # Instance must have an attribute named `created_by`.
+        return obj.created_by_id == request.user.pk
 
 class CanExportData(permissions.BasePermission):
     """
@@ -167,11 +197,8 @@ class CanExportData(permissions.BasePermission):
     def has_permission(self, request, view):
         if not request.user.is_authenticated:
             return False
-        try:
-            profile = request.user.profile
-            return profile.role in ['ADMIN', 'ACCOUNTANT']
-        except UserProfile.DoesNotExist:
-            return False
+        role = AuthorizationContext.for_request(request).role
+        return role in ['ADMIN', 'ACCOUNTANT']
 
 class CanManagePayments(permissions.BasePermission):
     """
@@ -180,22 +207,16 @@ class CanManagePayments(permissions.BasePermission):
     def has_permission(self, request, view):
         if not request.user.is_authenticated:
             return False
-        try:
-            profile = request.user.profile
-            if profile.role == 'VIEWER':
-                return request.method in permissions.SAFE_METHODS
-            return profile.role in ['ADMIN', 'ACCOUNTANT']
-        except UserProfile.DoesNotExist:
-            return False
+        role = AuthorizationContext.for_request(request).role
+        if role == 'VIEWER':
+            return request.method in permissions.SAFE_METHODS
+        return role in ['ADMIN', 'ACCOUNTANT']
 
     def has_object_permission(self, request, view, obj):
-        try:
-            profile = request.user.profile
-            if profile.role == 'VIEWER':
-                return request.method in permissions.SAFE_METHODS
-            elif profile.role == 'ACCOUNTANT':
-                # Accountants can create and view payments but not delete them
-                return request.method != 'DELETE'
-            return profile.role == 'ADMIN'
-        except UserProfile.DoesNotExist:
-            return False
\ No newline at end of file
+        role = AuthorizationContext.for_request(request).role
+        if role == 'VIEWER':
+            return request.method in permissions.SAFE_METHODS
+        elif role == 'ACCOUNTANT':
+            # Accountants can create and view payments but not delete them
+            return request.method != 'DELETE'
+        return role == 'ADMIN'
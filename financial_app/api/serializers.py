@@ -1,10 +1,88 @@
 from rest_framework import serializers
+from rest_framework.permissions import SAFE_METHODS
 from django.contrib.auth.models import User
+from django.db import transaction
 from ..models import (
     Company, Client, Invoice, InvoiceItem, 
     Expense, ExpenseCategory, UserProfile, 
     PaymentRecord
 )
+from ..services.invoice_service import InvoiceService
+
+class DynamicFieldsMixin:
+    """
+    Sparse fieldsets for the top level serializer of a read request:
+
+        ?fields=id,status,total_amount   serialize only these fields
+        ?expand=client,items             serialize these relations in full
+
+    List responses are compact by default: the relations named in
+    Meta.expandable_fields are sent as ids unless expanded. Nested
+    serializers and writes always use every field.
+    """
+
+    @staticmethod
+    def get_param_list(request, name):
+        value = request.query_params.get(name)
+        if value is None:
+            return None
+        return {item.strip() for item in value.split(',') if item.strip()}
+
+    def is_top_level(self):
+        return self.parent is None or (
+            isinstance(self.parent, serializers.ListSerializer) and
+            self.parent.parent is None
+        )
+
+    def get_fields(self):
+        fields = super().get_fields()
+        request = self.context.get('request')
+        if request is None or request.method not in SAFE_METHODS or not self.is_top_level():
+            return fields
+
+        requested = self.get_param_list(request, 'fields')
+        expand = self.get_param_list(request, 'expand') or set()
+        if requested is not None:
+            for name in list(fields):
+                if name not in requested and name not in expand:
+                    del fields[name]
+
+        view = self.context.get('view')
+        if getattr(view, 'action', None) == 'list':
+            for name in getattr(self.Meta, 'expandable_fields', ()):
+                if name in fields and name not in expand:
+                    fields[name] = serializers.PrimaryKeyRelatedField(
+                        read_only=True,
+                        many=isinstance(fields[name], serializers.ListSerializer)
+                    )
+        return fields
+
+    def get_relations(self):
+        """
+        Get the model relations read by the fields being serialized: the
+        nested ones, many valued id lists and Meta.field_relations.
+        """
+        relations = set()
+        field_relations = getattr(self.Meta, 'field_relations', {})
+        for name, field in self.fields.items():
+            if field.write_only:
+                continue
+            if isinstance(field, (serializers.BaseSerializer, serializers.ManyRelatedField)):
+                relations.add(field.source)
+            if name in field_relations:
+                relations.add(field_relations[name])
+        return relations
+
+    def get_columns(self):
+        """Get the model fields to load for the fields being serialized."""
+        concrete = {
+            field.name for field in self.Meta.model._meta.concrete_fields
+        }
+        return {
+            field.source.split('.')[0]
+            for field in self.fields.values()
+            if not field.write_only and field.source.split('.')[0] in concrete
+        }
 
 class UserSerializer(serializers.ModelSerializer):
     class Meta:
@@ -12,7 +90,7 @@ class UserSerializer(serializers.ModelSerializer):
         fields = ('id', 'username', 'email', 'first_name', 'last_name')
         read_only_fields = ('id',)
 
-class UserProfileSerializer(serializers.ModelSerializer):
+class UserProfileSerializer(DynamicFieldsMixin, serializers.ModelSerializer):
     user = UserSerializer(read_only=True)
     
     class Meta:
@@ -20,8 +98,9 @@ class UserProfileSerializer(serializers.ModelSerializer):
         fields = ('id', 'user', 'role', 'language', 'phone', 
                  'notification_preferences', 'created_at')
         read_only_fields = ('id', 'created_at')
+        expandable_fields = ('user',)
 
-class CompanySerializer(serializers.ModelSerializer):
+class CompanySerializer(DynamicFieldsMixin, serializers.ModelSerializer):
     owner = UserSerializer(read_only=True)
     
     class Meta:
@@ -32,13 +111,14 @@ class CompanySerializer(serializers.ModelSerializer):
                  'swift_code', 'iban', 'default_payment_terms',
                  'invoice_notes_template', 'invoice_footer', 'created_at')
         read_only_fields = ('id', 'owner', 'created_at')
+        expandable_fields = ('owner',)
 
     def validate_logo(self, value):
         if value and value.size > 5 * 1024 * 1024:  # 5MB limit
             raise serializers.ValidationError("Logo file size cannot exceed 5MB.")
         return value
 
-class ClientSerializer(serializers.ModelSerializer):
+class ClientSerializer(DynamicFieldsMixin, serializers.ModelSerializer):
     company = CompanySerializer(read_only=True)
     outstanding_balance = serializers.DecimalField(
         max_digits=10, 
@@ -52,20 +132,26 @@ class ClientSerializer(serializers.ModelSerializer):
                  'vat_number', 'contact_person', 'notes', 'payment_terms',
                  'credit_limit', 'is_active', 'created_at', 'outstanding_balance')
         read_only_fields = ('id', 'company', 'created_at')
+        expandable_fields = ('company',)
+        field_relations = {'outstanding_balance': 'ledger'}
 
     def to_representation(self, instance):
         representation = super().to_representation(instance)
-        representation['outstanding_balance'] = instance.get_outstanding_balance()
+        if 'outstanding_balance' in self.fields:
+            representation['outstanding_balance'] = instance.get_outstanding_balance()
         return representation
 
 class InvoiceItemSerializer(serializers.ModelSerializer):
+    # Writable so updates can match submitted items to existing ones
+    id = serializers.IntegerField(required=False)
+
     class Meta:
         model = InvoiceItem
         fields = ('id', 'description', 'quantity', 'unit_price', 
                  'tax_rate', 'total')
-        read_only_fields = ('id', 'total')
+        read_only_fields = ('total',)
 
-class InvoiceSerializer(serializers.ModelSerializer):
+class InvoiceSerializer(DynamicFieldsMixin, serializers.ModelSerializer):
     company = CompanySerializer(read_only=True)
     client = ClientSerializer(read_only=True)
     items = InvoiceItemSerializer(many=True, required=False)
@@ -84,28 +170,30 @@ class InvoiceSerializer(serializers.ModelSerializer):
                  'recurring_frequency', 'next_recurring_date', 'created_at')
         read_only_fields = ('id', 'company', 'invoice_number', 'subtotal',
                           'tax_amount', 'total_amount', 'amount_paid', 'created_at')
+        expandable_fields = ('company', 'client', 'items')
 
     def create(self, validated_data):
         items_data = validated_data.pop('items', [])
-        invoice = Invoice.objects.create(**validated_data)
         
-        for item_data in items_data:
-            InvoiceItem.objects.create(invoice=invoice, **item_data)
+        with transaction.atomic():
+            invoice = Invoice.objects.create(**validated_data)
+            InvoiceService.add_items(invoice, items_data)
         
         return invoice
 
     def update(self, instance, validated_data):
-        items_data = validated_data.pop('items', [])
+        items_data = validated_data.pop('items', None)
         
         # Update invoice fields
         for attr, value in validated_data.items():
             setattr(instance, attr, value)
-        instance.save()
         
-        # Update invoice items
-        instance.items.all().delete()
-        for item_data in items_data:
-            InvoiceItem.objects.create(invoice=instance, **item_data)
+        with transaction.atomic():
+            # Only insert, update or delete the items that changed and
+            # write the invoice fields and totals in a single save
+            if items_data is not None:
+                InvoiceService.sync_items(instance, items_data, save=False)
+            instance.save()
         
         return instance
 
@@ -115,7 +203,7 @@ class ExpenseCategorySerializer(serializers.ModelSerializer):
         fields = ('id', 'name', 'description', 'is_active', 'parent')
         read_only_fields = ('id',)
 
-class ExpenseSerializer(serializers.ModelSerializer):
+class ExpenseSerializer(DynamicFieldsMixin, serializers.ModelSerializer):
     company = CompanySerializer(read_only=True)
     category = ExpenseCategorySerializer(read_only=True)
     category_id = serializers.PrimaryKeyRelatedField(
@@ -135,13 +223,14 @@ class ExpenseSerializer(serializers.ModelSerializer):
                  'approved_by', 'approval_date', 'tags', 'notes', 'created_at')
         read_only_fields = ('id', 'company', 'created_by', 'approved_by',
                           'approval_date', 'created_at')
+        expandable_fields = ('company', 'category', 'created_by', 'approved_by')
 
     def validate_receipt(self, value):
         if value and value.size > 5 * 1024 * 1024:  # 5MB limit
             raise serializers.ValidationError("Receipt file size cannot exceed 5MB.")
         return value
 
-class PaymentRecordSerializer(serializers.ModelSerializer):
+class PaymentRecordSerializer(DynamicFieldsMixin, serializers.ModelSerializer):
     invoice = InvoiceSerializer(read_only=True)
     invoice_id = serializers.PrimaryKeyRelatedField(
         source='invoice',
@@ -156,6 +245,7 @@ class PaymentRecordSerializer(serializers.ModelSerializer):
                  'payment_method', 'status', 'transaction_id', 'reference_number',
                  'notes', 'processed_by', 'processing_fee', 'created_at')
         read_only_fields = ('id', 'processed_by', 'created_at')
+        expandable_fields = ('invoice', 'processed_by')
 
     def validate(self, data):
         if data['amount'] > data['invoice'].get_balance_due():
@@ -1,16 +1,26 @@
 from rest_framework import viewsets, status, filters
 from rest_framework.decorators import action
 from rest_framework.response import Response
-from rest_framework.permissions import IsAuthenticated
-from rest_framework.pagination import PageNumberPagination
+from rest_framework.permissions import IsAuthenticated, SAFE_METHODS
+from rest_framework.pagination import BasePagination, PageNumberPagination
+from rest_framework.exceptions import NotFound
+from rest_framework.utils.urls import replace_query_param
+from django.core.exceptions import ValidationError as DjangoValidationError
 from django.shortcuts import get_object_or_404
-from django.db.models import Q
+from django.db.models import Count, Max, Q
 from django.utils import timezone
+from django.utils.cache import get_conditional_response
+from django.utils.http import quote_etag
+from base64 import b64decode, b64encode
+from collections import OrderedDict
 from datetime import datetime
+from functools import partial
+import hashlib
+import json
 from ..models import (
     Company, Client, Invoice, InvoiceItem, 
     Expense, ExpenseCategory, UserProfile, 
-    PaymentRecord
+    PaymentRecord, ClientBalance
 )
 from .serializers import (
     CompanySerializer, ClientSerializer, InvoiceSerializer,
@@ -20,15 +30,333 @@ from .serializers import (
 from ..services.report_service import ReportService
 from ..services.analytics_service import AnalyticsService
 
+class KeysetPagination(BasePagination):
+    """
+    Forward-only keyset pagination on the view's cursor_ordering, a pair
+    such as ('-issue_date', '-id') ending in a unique field. Each page is
+    one indexed range query, so deep pages cost the same as the first and
+    no COUNT(*) is run. Any ?ordering= parameter is ignored.
+    """
+    cursor_query_param = 'cursor'
+    invalid_cursor_message = 'Invalid cursor'
+
+    def __init__(self, page_size):
+        self.page_size = page_size
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.ordering = view.cursor_ordering
+        fields = [name.lstrip('-') for name in self.ordering]
+        descending = self.ordering[0].startswith('-')
+        queryset = queryset.order_by(*self.ordering)
+
+        cursor = self.decode_cursor(request, queryset.model, fields)
+        if cursor is not None:
+            value, pk = cursor
+            lookup = 'lt' if descending else 'gt'
+            queryset = queryset.filter(
+                Q(**{f'{fields[0]}__{lookup}': value}) |
+                Q(**{fields[0]: value, f'{fields[1]}__{lookup}': pk})
+            )
+
+        page = list(queryset[:self.page_size + 1])
+        self.has_next = len(page) > self.page_size
+        page = page[:self.page_size]
+        self.last_position = None
+        if page:
+            # Rows may be instances or values() dicts
+            last = page[-1]
+            self.last_position = [
+                last[field] if isinstance(last, dict) else getattr(last, field)
+                for field in fields
+            ]
+        return page
+
+    def decode_cursor(self, request, model, fields):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if not encoded:
+            return None
+        try:
+            value, pk = json.loads(b64decode(encoded.encode('ascii')).decode('utf-8'))
+            return (
+                model._meta.get_field(fields[0]).to_python(value),
+                model._meta.get_field(fields[1]).to_python(pk)
+            )
+        except (TypeError, ValueError, DjangoValidationError):
+            raise NotFound(self.invalid_cursor_message)
+
+    def encode_cursor(self, position):
+        value, pk = position
+        if hasattr(value, 'isoformat'):
+            value = value.isoformat()
+        encoded = b64encode(json.dumps([value, pk]).encode('utf-8')).decode('ascii')
+        return replace_query_param(
+            self.request.build_absolute_uri(),
+            self.cursor_query_param,
+            encoded
+        )
+
+    def get_next_link(self):
+        if not self.has_next:
+            return None
+        return self.encode_cursor(self.last_position)
+
+    def get_state(self):
+        """Get what the response renders besides the rows."""
+        return {'has_next': self.has_next}
+
+    def get_paginated_response(self, data):
+        return Response(OrderedDict([
+            ('next', self.get_next_link()),
+            ('results', data)
+        ]))
+
 class StandardResultsSetPagination(PageNumberPagination):
+    """
+    Page number pagination, or keyset pagination when the request opts in
+    with ?pagination=cursor (or carries a cursor) and the view declares a
+    cursor_ordering.
+    """
     page_size = 10
     page_size_query_param = 'page_size'
     max_page_size = 100
 
-class CompanyViewSet(viewsets.ModelViewSet):
+    def paginate_queryset(self, queryset, request, view=None):
+        self.keyset = None
+        if getattr(view, 'cursor_ordering', None) and (
+            request.query_params.get('pagination') == 'cursor' or
+            KeysetPagination.cursor_query_param in request.query_params
+        ):
+            self.keyset = KeysetPagination(self.get_page_size(request))
+            return self.keyset.paginate_queryset(queryset, request, view)
+        return super().paginate_queryset(queryset, request, view)
+
+    def get_state(self):
+        """Get what the response renders besides the rows."""
+        if self.keyset is not None:
+            return self.keyset.get_state()
+        return {'count': self.page.paginator.count}
+
+    def get_paginated_response(self, data):
+        if self.keyset is not None:
+            return self.keyset.get_paginated_response(data)
+        return super().get_paginated_response(data)
+
+class RelatedLoadingMixin:
+    """
+    Load everything a viewset's serializer reads from related objects in a
+    fixed number of queries, however many rows are serialized. Viewsets
+    declare what their serializer needs when every field is serialized:
+
+        select_related_fields: forward relations joined into the query
+        prefetch_related_fields: many valued relations, one query each
+        ledger_client_paths: paths to the clients whose outstanding
+            balance is serialized ('' for the object itself)
+
+    A path is only followed when the serializer reads its first relation,
+    and list and detail requests only fetch the model fields it serializes,
+    so compact and sparse (?fields=) responses load less. Only reads are
+    optimized, so a write response never shows a balance loaded before the
+    write changed it.
+    """
+    select_related_fields = ()
+    prefetch_related_fields = ()
+    ledger_client_paths = ()
+
+    def filter_queryset(self, queryset):
+        queryset = super().filter_queryset(queryset)
+        if self.request.method in SAFE_METHODS:
+            serializer = self.get_serializer()
+            queryset = self.load_related(queryset, serializer.get_relations())
+            # Custom actions may read more than the serializer does
+            if self.action in ('list', 'retrieve'):
+                columns = serializer.get_columns()
+                columns.update(
+                    name.lstrip('-') for name in getattr(self, 'cursor_ordering', ())
+                )
+                queryset = queryset.only(*columns)
+        return queryset
+
+    @staticmethod
+    def is_read(path, relations):
+        return relations is None or path.split('__')[0] in relations
+
+    @classmethod
+    def load_related(cls, queryset, relations=None):
+        """
+        Apply the declared relations read by the serializer, every one when
+        relations is None.
+        """
+        select = [path for path in cls.select_related_fields if cls.is_read(path, relations)]
+        if select:
+            queryset = queryset.select_related(*select)
+        prefetch = [path for path in cls.prefetch_related_fields if cls.is_read(path, relations)]
+        if prefetch:
+            queryset = queryset.prefetch_related(*prefetch)
+        return queryset
+
+    @classmethod
+    def load_ledgers(cls, instances, relations=None):
+        """Attach client ledgers to already fetched instances in bulk."""
+        clients = []
+        for path in cls.ledger_client_paths:
+            if not cls.is_read(f'{path}__ledger' if path else 'ledger', relations):
+                continue
+            for instance in instances:
+                for attr in filter(None, path.split('__')):
+                    instance = getattr(instance, attr)
+                clients.append(instance)
+        ClientBalance.attach(clients)
+
+    def get_serializer(self, *args, **kwargs):
+        if (args and args[0] is not None and self.ledger_client_paths and
+                self.request.method in SAFE_METHODS):
+            instances = list(args[0]) if kwargs.get('many') else [args[0]]
+            if kwargs.get('many'):
+                args = (instances,) + args[1:]
+            serializer = super().get_serializer(*args, **kwargs)
+            self.load_ledgers(
+                instances,
+                getattr(serializer, 'child', serializer).get_relations()
+            )
+            return serializer
+        return super().get_serializer(*args, **kwargs)
+
+USER_ETAG_FIELDS = ('username', 'email', 'first_name', 'last_name')
+CATEGORY_ETAG_FIELDS = ('name', 'description', 'is_active', 'parent')
+
+def nested_etag_fields(path, fields):
+    """Prefix the fields of a nested object with the path to it."""
+    return tuple(f'{path}__{field}' for field in fields)
+
+class ConditionalGetMixin:
+    """
+    Send an ETag with list and detail responses and answer a conditional
+    GET with 304 Not Modified before any row is serialized when the
+    client's copy is current.
+
+    The version of a response is the state of its paginator and the values
+    of etag_fields for the rows it serves. Pages are cut from a values()
+    query of the keys and etag_fields, so a current copy costs that one
+    query (and the COUNT of numbered pages), and the instances are only
+    loaded to render a changed response. Many valued relations are
+    versioned by their latest value and their number of rows.
+
+    etag_fields must cover everything that changes what the serializer
+    renders: the timestamps of nested objects that have one, and the
+    rendered fields of nested users and categories, which have none. For
+    the same reason no Last-Modified is sent.
+    """
+    etag_fields = ('updated_at',)
+
+    def get_version(self, queryset, fields):
+        """Get the count and latest timestamps of a queryset in one query."""
+        return queryset.order_by().aggregate(
+            count=Count('pk', distinct=True),
+            **{f'latest_{index}': Max(field) for index, field in enumerate(fields)}
+        )
+
+    def is_many_valued(self, path):
+        """Whether a field path crosses a many valued relation."""
+        model = self.get_queryset().model
+        for name in path.split('__'):
+            field = model._meta.get_field(name)
+            if field.one_to_many or field.many_to_many:
+                return True
+            model = field.related_model
+        return False
+
+    def get_row_versions(self, queryset):
+        """
+        Turn a queryset into one values() row per object holding its key,
+        cursor fields and etag_fields, in the queryset's order.
+        """
+        many_valued = [path for path in self.etag_fields if self.is_many_valued(path)]
+        rows = queryset.prefetch_related(None).values(
+            'pk',
+            *(name.lstrip('-') for name in getattr(self, 'cursor_ordering', ())),
+            *(path for path in self.etag_fields if path not in many_valued)
+        )
+        if many_valued:
+            # Grouped by the other columns, which hold one value per object.
+            # Grouped queries leave out the default ordering, so keep it
+            if not queryset.query.order_by:
+                rows = rows.order_by(*queryset.model._meta.ordering)
+            rows = rows.annotate(**{
+                aggregate: function(path)
+                for index, path in enumerate(many_valued)
+                for aggregate, function in (
+                    (f'latest_{index}', Max), (f'count_{index}', Count)
+                )
+            })
+        return rows
+
+    def conditional_response(self, versions, render):
+        """
+        Return 304 if the request's ETag matches the versions, else the
+        response from render(), with the ETag set on either.
+        """
+        request = self.request
+        key = repr((
+            request.user.pk,
+            request.path,
+            sorted(request.query_params.lists()),
+            request.accepted_renderer.format,
+            versions
+        ))
+        etag = quote_etag(hashlib.sha1(key.encode()).hexdigest())
+
+        response = get_conditional_response(request, etag=etag)
+        if response is None:
+            response = render()
+        if response.status_code in (status.HTTP_200_OK, status.HTTP_304_NOT_MODIFIED):
+            response['ETag'] = etag
+        return response
+
+    def list(self, request, *args, **kwargs):
+        queryset = self.filter_queryset(self.get_queryset())
+        rows = self.get_row_versions(queryset)
+        page = self.paginate_queryset(rows)
+        rows = list(rows) if page is None else page
+
+        def render():
+            keys = [row['pk'] for row in rows]
+            instances = queryset.in_bulk(keys)
+            # Rows deleted since the page was cut are left out
+            serializer = self.get_serializer(
+                [instances[key] for key in keys if key in instances], many=True
+            )
+            if page is None:
+                return Response(serializer.data)
+            return self.get_paginated_response(serializer.data)
+
+        versions = [rows]
+        if page is not None:
+            versions.append(self.paginator.get_state())
+        return self.conditional_response(versions, render)
+
+    def retrieve(self, request, *args, **kwargs):
+        lookup_url_kwarg = self.lookup_url_kwarg or self.lookup_field
+        try:
+            rows = list(self.get_row_versions(self.filter_queryset(self.get_queryset()).filter(
+                **{self.lookup_field: kwargs[lookup_url_kwarg]}
+            )))
+        except (TypeError, ValueError, DjangoValidationError):
+            rows = []
+        if not rows:
+            # Let get_object raise the usual error
+            return super().retrieve(request, *args, **kwargs)
+        return self.conditional_response(
+            [rows],
+            partial(super().retrieve, request, *args, **kwargs)
+        )
+
+class CompanyViewSet(ConditionalGetMixin, RelatedLoadingMixin, viewsets.ModelViewSet):
     serializer_class = CompanySerializer
     permission_classes = [IsAuthenticated]
     pagination_class = StandardResultsSetPagination
+    select_related_fields = ('owner',)
+    etag_fields = ('updated_at',) + nested_etag_fields('owner', USER_ETAG_FIELDS)
 
     def get_queryset(self):
         return Company.objects.filter(owner=self.request.user)
@@ -39,16 +367,31 @@ class CompanyViewSet(viewsets.ModelViewSet):
     @action(detail=True, methods=['get'])
     def dashboard(self, request, pk=None):
         company = self.get_object()
-        analytics = AnalyticsService.get_business_overview(company)
-        return Response(analytics)
+        versions = [
+            self.get_version(Invoice.objects.filter(company=company), ['updated_at']),
+            self.get_version(Expense.objects.filter(company=company), ['updated_at']),
+            # The overview covers a period ending today
+            {'today': timezone.now().date()}
+        ]
+        return self.conditional_response(
+            versions,
+            lambda: Response(AnalyticsService.get_business_overview(company))
+        )
 
-class ClientViewSet(viewsets.ModelViewSet):
+class ClientViewSet(ConditionalGetMixin, RelatedLoadingMixin, viewsets.ModelViewSet):
     serializer_class = ClientSerializer
     permission_classes = [IsAuthenticated]
     pagination_class = StandardResultsSetPagination
     filter_backends = [filters.SearchFilter, filters.OrderingFilter]
     search_fields = ['name', 'email', 'phone']
     ordering_fields = ['name', 'created_at']
+    cursor_ordering = ('name', 'id')
+    select_related_fields = ('company__owner', 'ledger')
+    etag_fields = (
+        ('updated_at', 'company__updated_at', 'ledger__updated_at') +
+        nested_etag_fields('company__owner', USER_ETAG_FIELDS)
+    )
+    ledger_client_paths = ('',)
 
     def get_queryset(self):
         return Client.objects.filter(company__owner=self.request.user)
@@ -60,7 +403,8 @@ class ClientViewSet(viewsets.ModelViewSet):
     @action(detail=True, methods=['get'])
     def invoices(self, request, pk=None):
         client = self.get_object()
-        invoices = Invoice.objects.filter(client=client)
+        invoices = list(InvoiceViewSet.load_related(Invoice.objects.filter(client=client)))
+        InvoiceViewSet.load_ledgers(invoices)
         serializer = InvoiceSerializer(invoices, many=True)
         return Response(serializer.data)
 
@@ -82,13 +426,24 @@ class ClientViewSet(viewsets.ModelViewSet):
         statement = ReportService.generate_client_statement(client, start_date, end_date)
         return Response(statement)
 
-class InvoiceViewSet(viewsets.ModelViewSet):
+class InvoiceViewSet(ConditionalGetMixin, RelatedLoadingMixin, viewsets.ModelViewSet):
     serializer_class = InvoiceSerializer
     permission_classes = [IsAuthenticated]
     pagination_class = StandardResultsSetPagination
     filter_backends = [filters.SearchFilter, filters.OrderingFilter]
     search_fields = ['invoice_number', 'client__name']
     ordering_fields = ['issue_date', 'due_date', 'total_amount']
+    cursor_ordering = ('-issue_date', '-id')
+    select_related_fields = ('company__owner', 'client__company__owner', 'client__ledger')
+    prefetch_related_fields = ('items',)
+    ledger_client_paths = ('client',)
+    etag_fields = (
+        ('updated_at', 'company__updated_at', 'client__updated_at',
+         'client__company__updated_at', 'client__ledger__updated_at',
+         'items__updated_at') +
+        nested_etag_fields('company__owner', USER_ETAG_FIELDS) +
+        nested_etag_fields('client__company__owner', USER_ETAG_FIELDS)
+    )
 
     def get_queryset(self):
         queryset = Invoice.objects.filter(company__owner=self.request.user)
@@ -153,13 +508,22 @@ class ExpenseCategoryViewSet(viewsets.ModelViewSet):
     permission_classes = [IsAuthenticated]
     queryset = ExpenseCategory.objects.all()
 
-class ExpenseViewSet(viewsets.ModelViewSet):
+class ExpenseViewSet(ConditionalGetMixin, RelatedLoadingMixin, viewsets.ModelViewSet):
     serializer_class = ExpenseSerializer
     permission_classes = [IsAuthenticated]
     pagination_class = StandardResultsSetPagination
     filter_backends = [filters.SearchFilter, filters.OrderingFilter]
     search_fields = ['description', 'vendor']
     ordering_fields = ['date', 'amount']
+    cursor_ordering = ('-date', '-id')
+    select_related_fields = ('company__owner', 'category', 'created_by', 'approved_by')
+    etag_fields = (
+        ('updated_at', 'company__updated_at') +
+        nested_etag_fields('company__owner', USER_ETAG_FIELDS) +
+        nested_etag_fields('category', CATEGORY_ETAG_FIELDS) +
+        nested_etag_fields('created_by', USER_ETAG_FIELDS) +
+        nested_etag_fields('approved_by', USER_ETAG_FIELDS)
+    )
 
     def get_queryset(self):
         queryset = Expense.objects.filter(company__owner=self.request.user)
@@ -189,10 +553,25 @@ class ExpenseViewSet(viewsets.ModelViewSet):
         expense.save()
         return Response({'status': 'Expense approved successfully'})
 
-class PaymentRecordViewSet(viewsets.ModelViewSet):
+class PaymentRecordViewSet(ConditionalGetMixin, RelatedLoadingMixin, viewsets.ModelViewSet):
     serializer_class = PaymentRecordSerializer
     permission_classes = [IsAuthenticated]
     pagination_class = StandardResultsSetPagination
+    cursor_ordering = ('-payment_date', '-id')
+    select_related_fields = (
+        'invoice__company__owner', 'invoice__client__company__owner',
+        'invoice__client__ledger', 'processed_by'
+    )
+    prefetch_related_fields = ('invoice__items',)
+    ledger_client_paths = ('invoice__client',)
+    etag_fields = (
+        ('updated_at', 'invoice__updated_at', 'invoice__company__updated_at',
+         'invoice__client__updated_at', 'invoice__client__company__updated_at',
+         'invoice__client__ledger__updated_at', 'invoice__items__updated_at') +
+        nested_etag_fields('invoice__company__owner', USER_ETAG_FIELDS) +
+        nested_etag_fields('invoice__client__company__owner', USER_ETAG_FIELDS) +
+        nested_etag_fields('processed_by', USER_ETAG_FIELDS)
+    )
 
     def get_queryset(self):
         return PaymentRecord.objects.filter(
@@ -1,30 +1,99 @@
 from django.core.management.base import BaseCommand, CommandError
 from django.utils import timezone
-from django.db import transaction
+from django.db import transaction, connections
 from django.conf import settings
-import csv
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import django
+import io
+import json
 import pandas as pd
 import logging
 import os
-from datetime import datetime
+from decimal import Decimal
 
 from financial_app.models import (
-    Client, Invoice, InvoiceItem, 
-    Expense, ExpenseCategory, Company
+    Client, Invoice, InvoiceItem, InvoiceNumberSequence,
+    Expense, ExpenseCategory, Company, ClientBalance
 )
+from financial_app.services.rollup_service import RollupService
+from financial_app.services.dashboard_service import DashboardService
 
 logger = logging.getLogger(__name__)
 
+REQUIRED_FIELDS = {
+    'clients': ['name', 'email'],
+    'invoices': ['client_email', 'amount', 'issue_date', 'due_date'],
+    'expenses': ['category', 'amount', 'date'],
+    'categories': ['name'],
+}
+
+# Options passed on to worker processes in parallel mode
+SHARD_OPTIONS = [
+    'type', 'file_path', 'date_format', 'currency', 'update_existing',
+    'skip_errors', 'chunk_size', 'resume'
+]
+
+class ByteRangeReader(io.RawIOBase):
+    """Raw binary stream over the bytes [start, end) of a file."""
+
+    def __init__(self, path, start, end):
+        super().__init__()
+        self.file = open(path, 'rb')
+        self.file.seek(start)
+        self.remaining = end - start
+
+    def readable(self):
+        return True
+
+    def readinto(self, buffer):
+        size = min(len(buffer), self.remaining)
+        if size <= 0:
+            return 0
+        read = self.file.readinto(memoryview(buffer)[:size])
+        self.remaining -= read
+        return read
+
+    def close(self):
+        self.file.close()
+        super().close()
+
+def import_shard(job):
+    """Import one shard in a worker process and return its stats."""
+    command = Command()
+    options = job['options']
+    try:
+        company = command.get_company(job['company_id'])
+        checkpoint_path = (
+            f"{command.get_checkpoint_path(options['file_path'], options['type'])}"
+            f".{job['index'] + 1}-of-{job['count']}"
+        )
+        checkpoint = command.load_checkpoint(checkpoint_path) if options['resume'] else None
+        rows_done = checkpoint['rows_done'] if checkpoint else 0
+
+        if 'data' not in job['shard']:
+            # CSV shards are numbered from their own first line
+            command.row_location = f"shard {job['index'] + 1} rows"
+            command.first_row_number = 1
+
+        chunks = command.read_shard_chunks(job['shard'], options['chunk_size'], rows_done)
+        return command.run_chunks(chunks, company, options, checkpoint_path, checkpoint)
+    finally:
+        connections.close_all()
+
 class Command(BaseCommand):
     help = 'Import data from CSV/Excel files'
 
+    # How rows are numbered in error messages
+    row_location = 'file rows'
+    first_row_number = 2
+
     def add_arguments(self, parser):
         parser.add_argument(
             'file_path',
             type=str,
             help='Path to import file'
         )
-        
+
         parser.add_argument(
             '--type',
             type=str,
@@ -32,82 +101,181 @@ class Command(BaseCommand):
             required=True,
             help='Type of data to import'
         )
-        
+
         parser.add_argument(
             '--company-id',
             type=int,
             required=True,
             help='Company ID to associate with imported data'
         )
-        
+
         parser.add_argument(
             '--date-format',
             type=str,
             default='%Y-%m-%d',
             help='Date format in import file'
         )
-        
+
         parser.add_argument(
             '--currency',
             type=str,
             default='EUR',
             help='Currency for monetary values'
         )
-        
+
         parser.add_argument(
             '--update-existing',
             action='store_true',
             help='Update existing records based on unique identifiers'
         )
-        
+
         parser.add_argument(
             '--skip-errors',
             action='store_true',
             help='Continue import on error'
         )
 
+        parser.add_argument(
+            '--chunk-size',
+            type=int,
+            default=5000,
+            help='Number of rows read, validated and committed per batch'
+        )
+
+        parser.add_argument(
+            '--resume',
+            action='store_true',
+            help='Continue an interrupted import from its checkpoint'
+        )
+
+        parser.add_argument(
+            '--workers',
+            type=int,
+            default=1,
+            help='Number of processes importing shards of the file in parallel'
+        )
+
     def handle(self, *args, **options):
         try:
             # Set up logging
             self.setup_logging()
-            
+
             # Validate company
             company = self.get_company(options['company_id'])
-            
-            # Read import file
-            data = self.read_import_file(
-                options['file_path'],
-                options['date_format']
-            )
-            
-            # Process data based on type
-            import_method = getattr(self, f"import_{options['type']}")
-            stats = import_method(
-                data,
-                company,
-                options['update_existing'],
-                options['skip_errors'],
-                options['currency']
-            )
-            
+
+            import_type = options['type']
+            file_path = options['file_path']
+            if not os.path.exists(file_path):
+                raise CommandError(f"File not found: {file_path}")
+
+            try:
+                if options['workers'] > 1:
+                    stats = self.import_parallel(file_path, company, options)
+                else:
+                    stats = self.import_file(file_path, company, options)
+            finally:
+                # Committed chunks stay in place on failure, so keep the
+                # derived tables consistent with them either way
+                self.finalize_import(import_type, company)
+
             # Log summary
-            self.log_import_summary(stats, options['type'])
-            
+            self.log_import_summary(stats, import_type)
+
+        except CommandError:
+            raise
         except Exception as e:
             logger.error(f"Import failed: {str(e)}")
             raise CommandError(f"Import failed: {str(e)}")
 
+    def import_file(self, file_path, company, options):
+        """Import the whole file in this process."""
+        checkpoint_path = self.get_checkpoint_path(file_path, options['type'])
+        checkpoint = self.load_checkpoint(checkpoint_path) if options['resume'] else None
+        rows_done = checkpoint['rows_done'] if checkpoint else 0
+        if rows_done:
+            self.stdout.write(f"Resuming import after {rows_done} rows")
+
+        chunks = self.read_import_chunks(file_path, options['chunk_size'], rows_done)
+        return self.run_chunks(chunks, company, options, checkpoint_path, checkpoint)
+
+    def import_parallel(self, file_path, company, options):
+        """
+        Split the file into shards and import them in a process pool, one
+        database connection per worker, then merge the per-shard stats.
+        """
+        shards = self.plan_shards(file_path, options['workers'])
+        shard_options = {key: options[key] for key in SHARD_OPTIONS}
+        jobs = [
+            {
+                'index': index,
+                'count': len(shards),
+                'company_id': company.pk,
+                'options': shard_options,
+                'shard': shard
+            }
+            for index, shard in enumerate(shards)
+        ]
+
+        # Forked workers must not share the parent's open connections
+        connections.close_all()
+
+        stats = self.empty_stats()
+        failures = []
+        with ProcessPoolExecutor(max_workers=len(jobs), initializer=django.setup) as executor:
+            futures = {executor.submit(import_shard, job): job['index'] for job in jobs}
+            for future in as_completed(futures):
+                try:
+                    stats = self.merge_stats(stats, future.result())
+                except Exception as e:
+                    failures.append(f"shard {futures[future] + 1}: {str(e)}")
+
+        if failures:
+            error = (
+                f"{len(failures)} of {len(jobs)} shards failed ({'; '.join(failures)}). "
+                f"Rerun with --resume and the same --workers to continue."
+            )
+            logger.error(error)
+            raise CommandError(error)
+        return stats
+
+    def run_chunks(self, chunks, company, options, checkpoint_path, checkpoint=None):
+        """Import chunks one transaction at a time, checkpointing after each."""
+        import_type = options['type']
+        import_method = getattr(self, f"import_{import_type}")
+        rows_done = checkpoint['rows_done'] if checkpoint else 0
+        stats = checkpoint['stats'] if checkpoint else self.empty_stats()
+
+        for chunk in chunks:
+            self.validate_fields(chunk, REQUIRED_FIELDS[import_type])
+
+            with transaction.atomic():
+                chunk_stats = import_method(
+                    chunk,
+                    company,
+                    options['update_existing'],
+                    options['skip_errors'],
+                    options['currency'],
+                    options['date_format']
+                )
+
+            rows_done += len(chunk)
+            stats = self.merge_stats(stats, chunk_stats)
+            self.save_checkpoint(checkpoint_path, rows_done, stats)
+
+        self.remove_checkpoint(checkpoint_path)
+        return stats
+
     def setup_logging(self):
         """Configure logging for import process."""
         log_dir = os.path.join(settings.BASE_DIR, 'logs', 'imports')
         if not os.path.exists(log_dir):
             os.makedirs(log_dir)
-            
+
         log_file = os.path.join(
             log_dir,
             f'import_{timezone.now().strftime("%Y%m%d_%H%M%S")}.log'
         )
-        
+
         logging.basicConfig(
             filename=log_file,
             level=logging.INFO,
@@ -121,243 +289,463 @@ class Command(BaseCommand):
         except Company.DoesNotExist:
             raise CommandError(f"Company with ID {company_id} does not exist")
 
-    def read_import_file(self, file_path, date_format):
-        """Read and validate import file."""
-        if not os.path.exists(file_path):
-            raise CommandError(f"File not found: {file_path}")
-            
+    def read_import_chunks(self, file_path, chunk_size, skip_rows=0):
+        """Read the import file as DataFrames of at most chunk_size rows."""
         file_ext = os.path.splitext(file_path)[1].lower()
-        
+
         try:
             if file_ext == '.csv':
-                return pd.read_csv(file_path)
+                # Skip rows already imported but keep the header line, and
+                # keep the index counting data rows from the top of the file
+                for chunk in pd.read_csv(
+                    file_path,
+                    chunksize=chunk_size,
+                    skiprows=range(1, skip_rows + 1)
+                ):
+                    chunk.index += skip_rows
+                    yield chunk
             elif file_ext in ['.xlsx', '.xls']:
-                return pd.read_excel(file_path)
+                data = pd.read_excel(file_path)
+                for start in range(skip_rows, len(data), chunk_size):
+                    yield data.iloc[start:start + chunk_size]
             else:
                 raise CommandError(f"Unsupported file type: {file_ext}")
+        except CommandError:
+            raise
         except Exception as e:
             raise CommandError(f"Error reading file: {str(e)}")
 
-    @transaction.atomic
-    def import_clients(self, data, company, update_existing, skip_errors, currency):
-        """Import client data."""
-        required_fields = ['name', 'email']
-        self.validate_fields(data, required_fields)
-        
-        stats = {
+    def plan_shards(self, file_path, workers):
+        """
+        Split the import file into at most workers shards. CSV files are
+        split into byte ranges aligned to line starts, so records must not
+        contain quoted line breaks; Excel files are read once and split
+        into row ranges.
+        """
+        file_ext = os.path.splitext(file_path)[1].lower()
+
+        try:
+            if file_ext in ['.xlsx', '.xls']:
+                data = pd.read_excel(file_path)
+                shard_size = -(-len(data) // workers) or 1
+                return [
+                    {'data': data.iloc[start:start + shard_size]}
+                    for start in range(0, len(data), shard_size)
+                ]
+            if file_ext != '.csv':
+                raise CommandError(f"Unsupported file type: {file_ext}")
+
+            columns = pd.read_csv(file_path, nrows=0).columns.tolist()
+            with open(file_path, 'rb') as csv_file:
+                csv_file.readline()
+                data_start = csv_file.tell()
+                size = os.fstat(csv_file.fileno()).st_size
+
+                boundaries = [data_start]
+                for index in range(1, workers):
+                    position = data_start + (size - data_start) * index // workers
+                    if position <= boundaries[-1]:
+                        continue
+                    # Move forward to the start of the next line
+                    csv_file.seek(position - 1)
+                    csv_file.readline()
+                    if boundaries[-1] < csv_file.tell() < size:
+                        boundaries.append(csv_file.tell())
+                boundaries.append(size)
+
+            return [
+                {'file_path': file_path, 'start': start, 'end': end, 'columns': columns}
+                for start, end in zip(boundaries, boundaries[1:])
+            ]
+        except CommandError:
+            raise
+        except Exception as e:
+            raise CommandError(f"Error reading file: {str(e)}")
+
+    def read_shard_chunks(self, shard, chunk_size, skip_rows=0):
+        """Read one shard from plan_shards as DataFrames of at most chunk_size rows."""
+        if 'data' in shard:
+            data = shard['data']
+            for start in range(skip_rows, len(data), chunk_size):
+                yield data.iloc[start:start + chunk_size]
+            return
+
+        reader = ByteRangeReader(shard['file_path'], shard['start'], shard['end'])
+        with io.BufferedReader(reader) as stream:
+            for chunk in pd.read_csv(
+                stream,
+                header=None,
+                names=shard['columns'],
+                skiprows=skip_rows,
+                chunksize=chunk_size
+            ):
+                chunk.index += skip_rows
+                yield chunk
+
+    def get_checkpoint_path(self, file_path, import_type):
+        return f"{file_path}.{import_type}.checkpoint"
+
+    def load_checkpoint(self, checkpoint_path):
+        if not os.path.exists(checkpoint_path):
+            return None
+        with open(checkpoint_path) as checkpoint_file:
+            return json.load(checkpoint_file)
+
+    def save_checkpoint(self, checkpoint_path, rows_done, stats):
+        # Write then rename so an interruption never leaves a partial file
+        temp_path = f"{checkpoint_path}.tmp"
+        with open(temp_path, 'w') as checkpoint_file:
+            json.dump({'rows_done': rows_done, 'stats': stats}, checkpoint_file)
+        os.replace(temp_path, checkpoint_path)
+
+    def remove_checkpoint(self, checkpoint_path):
+        if os.path.exists(checkpoint_path):
+            os.remove(checkpoint_path)
+
+    def empty_stats(self):
+        return {
             'processed': 0,
             'created': 0,
             'updated': 0,
             'errors': 0
         }
-        
-        for _, row in data.iterrows():
+
+    def merge_stats(self, stats, chunk_stats):
+        return {key: stats[key] + chunk_stats[key] for key in stats}
+
+    def finalize_import(self, import_type, company):
+        """
+        Rebuild the derived tables that bulk writes bypass (the client
+        balance ledgers and the monthly rollup are maintained by save()
+        and signals otherwise), and refresh the dashboard.
+        """
+        if import_type == 'invoices':
+            ClientBalance.rebuild(
+                Client.objects.filter(company=company).values_list('pk', flat=True)
+            )
+        if import_type in ('invoices', 'expenses'):
+            RollupService.rebuild(company)
+        if import_type in ('clients', 'invoices', 'expenses'):
+            DashboardService.invalidate(company.pk, import_type[:-1])
+
+    def text_column(self, chunk, name, default=''):
+        if name not in chunk.columns:
+            return pd.Series(default, index=chunk.index, dtype=object)
+        return chunk[name].where(chunk[name].notna(), default).astype(str)
+
+    def date_column(self, chunk, name, date_format):
+        return pd.to_datetime(chunk[name], format=date_format, errors='coerce').dt.date
+
+    def amount_column(self, chunk, name):
+        return pd.to_numeric(chunk[name], errors='coerce')
+
+    def items_column(self, chunk, name):
+        """
+        Parse a column of JSON item lists into unsaved InvoiceItems, NaN
+        where the list or any of its items is invalid and an empty list
+        where the row has none.
+        """
+        def parse(text):
+            if not text:
+                return []
             try:
-                client_data = {
-                    'name': row['name'],
-                    'email': row['email'],
-                    'phone': row.get('phone', ''),
-                    'address': row.get('address', ''),
-                    'vat_number': row.get('vat_number', ''),
-                    'notes': row.get('notes', '')
-                }
-                
-                if update_existing:
-                    client, created = Client.objects.update_or_create(
-                        company=company,
-                        email=row['email'],
-                        defaults=client_data
-                    )
-                else:
-                    client = Client.objects.create(
-                        company=company,
-                        **client_data
+                items = []
+                for item in json.loads(text):
+                    line = InvoiceItem(
+                        description=str(item['description']),
+                        quantity=Decimal(str(item['quantity'])),
+                        unit_price=Decimal(str(item['unit_price']))
                     )
-                    created = True
-                
-                stats['processed'] += 1
-                if created:
-                    stats['created'] += 1
-                else:
-                    stats['updated'] += 1
-                    
-            except Exception as e:
-                stats['errors'] += 1
-                logger.error(f"Error importing client: {str(e)}")
-                if not skip_errors:
-                    raise
-        
+                    if not line.quantity.is_finite() or not line.unit_price.is_finite():
+                        return None
+                    line.total = line.calculate_total()
+                    items.append(line)
+                return items
+            except (ValueError, TypeError, KeyError, ArithmeticError):
+                return None
+
+        return self.text_column(chunk, name).map(parse)
+
+    def report_errors(self, chunk, invalid, message, skip_errors):
+        """Log rows flagged in the boolean Series invalid and return their count."""
+        count = int(invalid.sum())
+        if not count:
+            return 0
+        rows = ', '.join(
+            str(index + self.first_row_number) for index in chunk.index[invalid][:20]
+        )
+        error = f"{count} rows {message} ({self.row_location} {rows})"
+        logger.error(error)
+        if not skip_errors:
+            raise CommandError(error)
+        return count
+
+    def import_clients(self, chunk, company, update_existing, skip_errors, currency, date_format):
+        """Import client data."""
+        stats = self.empty_stats()
+
+        name = self.text_column(chunk, 'name')
+        email = self.text_column(chunk, 'email').str.strip()
+        invalid = (name == '') | (email == '')
+        stats['errors'] += self.report_errors(chunk, invalid, 'have no name or email', skip_errors)
+
+        rows = pd.DataFrame({
+            'name': name,
+            'email': email,
+            'phone': self.text_column(chunk, 'phone'),
+            'address': self.text_column(chunk, 'address'),
+            'vat_number': self.text_column(chunk, 'vat_number'),
+            'notes': self.text_column(chunk, 'notes'),
+        })[~invalid].drop_duplicates(subset=['email'], keep='last')
+
+        existing = set(Client.objects.filter(
+            company=company,
+            email__in=list(rows['email'])
+        ).values_list('email', flat=True))
+        is_existing = rows['email'].isin(existing)
+
+        if not update_existing:
+            stats['errors'] += self.report_errors(rows, is_existing, 'already exist', skip_errors)
+            rows = rows[~is_existing]
+
+        clients = [
+            Client(company=company, **record)
+            for record in rows.to_dict('records')
+        ]
+        Client.objects.bulk_create(
+            clients,
+            batch_size=1000,
+            update_conflicts=update_existing,
+            unique_fields=['company', 'email'] if update_existing else None,
+            update_fields=[
+                'name', 'phone', 'address', 'vat_number', 'notes', 'updated_at'
+            ] if update_existing else None
+        )
+
+        updated = int(is_existing.sum()) if update_existing else 0
+        stats['processed'] += len(clients)
+        stats['updated'] += updated
+        stats['created'] += len(clients) - updated
         return stats
 
-    @transaction.atomic
-    def import_invoices(self, data, company, update_existing, skip_errors, currency):
+    def import_invoices(self, chunk, company, update_existing, skip_errors, currency, date_format):
         """Import invoice data."""
-        required_fields = ['client_email', 'amount', 'issue_date', 'due_date']
-        self.validate_fields(data, required_fields)
-        
-        stats = {
-            'processed': 0,
-            'created': 0,
-            'updated': 0,
-            'errors': 0
-        }
-        
-        for _, row in data.iterrows():
-            try:
-                # Get client
-                client = Client.objects.get(
-                    company=company,
-                    email=row['client_email']
-                )
-                
-                invoice_data = {
-                    'company': company,
-                    'client': client,
-                    'issue_date': pd.to_datetime(row['issue_date']).date(),
-                    'due_date': pd.to_datetime(row['due_date']).date(),
-                    'total_amount': row['amount'],
-                    'status': row.get('status', 'DRAFT'),
-                    'notes': row.get('notes', '')
-                }
-                
-                if update_existing and 'invoice_number' in row:
-                    invoice, created = Invoice.objects.update_or_create(
-                        company=company,
-                        invoice_number=row['invoice_number'],
-                        defaults=invoice_data
-                    )
-                else:
-                    invoice = Invoice.objects.create(**invoice_data)
-                    created = True
-                
-                # Import invoice items if present
-                if 'items' in row:
-                    self.import_invoice_items(invoice, row['items'])
-                
-                stats['processed'] += 1
-                if created:
-                    stats['created'] += 1
-                else:
-                    stats['updated'] += 1
-                    
-            except Exception as e:
-                stats['errors'] += 1
-                logger.error(f"Error importing invoice: {str(e)}")
-                if not skip_errors:
-                    raise
-        
+        stats = self.empty_stats()
+
+        emails = self.text_column(chunk, 'client_email').str.strip()
+        client_ids = dict(Client.objects.filter(
+            company=company,
+            email__in=list(emails.unique())
+        ).values_list('email', 'id'))
+
+        rows = pd.DataFrame({
+            'client_id': emails.map(client_ids),
+            'issue_date': self.date_column(chunk, 'issue_date', date_format),
+            'due_date': self.date_column(chunk, 'due_date', date_format),
+            'amount': self.amount_column(chunk, 'amount'),
+            'status': self.text_column(chunk, 'status', 'DRAFT'),
+            'notes': self.text_column(chunk, 'notes'),
+            'invoice_number': self.text_column(chunk, 'invoice_number') if update_existing else '',
+            'items': self.items_column(chunk, 'items'),
+        })
+
+        invalid = rows['client_id'].isna()
+        stats['errors'] += self.report_errors(chunk, invalid, 'reference an unknown client', skip_errors)
+        bad_items = ~invalid & rows['items'].isna()
+        stats['errors'] += self.report_errors(chunk, bad_items, 'have invalid items', skip_errors)
+        invalid |= bad_items
+        # Rows with items take their totals from them
+        has_items = rows['items'].map(lambda items: bool(items))
+        bad_values = ~invalid & (
+            rows['issue_date'].isna() | rows['due_date'].isna() |
+            (rows['amount'].isna() & ~has_items)
+        )
+        stats['errors'] += self.report_errors(chunk, bad_values, 'have invalid dates or amounts', skip_errors)
+        rows = rows[~(invalid | bad_values)]
+
+        # Allocate numbers for new invoices with one sequence update
+        missing_number = rows['invoice_number'] == ''
+        if missing_number.any():
+            rows.loc[missing_number, 'invoice_number'] = InvoiceNumberSequence.next_numbers(
+                company.pk,
+                int(missing_number.sum())
+            )
+        rows = rows.drop_duplicates(subset=['invoice_number'], keep='last')
+
+        existing = set()
+        if update_existing:
+            existing = set(Invoice.objects.filter(
+                company=company,
+                invoice_number__in=list(rows['invoice_number'])
+            ).values_list('invoice_number', flat=True))
+
+        invoices = []
+        for record in rows.to_dict('records'):
+            if record['items']:
+                amount = sum((item.total for item in record['items']), Decimal('0'))
+            else:
+                amount = Decimal(str(record['amount']))
+            invoices.append(Invoice(
+                company=company,
+                client_id=int(record['client_id']),
+                invoice_number=record['invoice_number'],
+                issue_date=record['issue_date'],
+                due_date=record['due_date'],
+                subtotal=amount,
+                tax_amount=Decimal('0'),
+                total_amount=amount,
+                # Imported paid invoices were settled in full
+                amount_paid=amount if record['status'] == 'PAID' else Decimal('0'),
+                status=record['status'],
+                notes=record['notes']
+            ))
+        Invoice.objects.bulk_create(
+            invoices,
+            batch_size=1000,
+            update_conflicts=update_existing,
+            unique_fields=['company', 'invoice_number'] if update_existing else None,
+            update_fields=[
+                'client', 'issue_date', 'due_date', 'subtotal', 'tax_amount',
+                'total_amount', 'amount_paid', 'status', 'notes', 'updated_at'
+            ] if update_existing else None
+        )
+
+        # Import invoice items for new invoices if present
+        new_items = rows[has_items.loc[rows.index] & ~rows['invoice_number'].isin(existing)]
+        if len(new_items):
+            self.import_invoice_items(company, new_items)
+
+        stats['processed'] += len(invoices)
+        stats['updated'] += len(existing)
+        stats['created'] += len(invoices) - len(existing)
         return stats
 
-    def import_invoice_items(self, invoice, items_data):
-        """Import invoice items."""
+    def import_invoice_items(self, company, rows):
+        """Insert the items parsed by items_column for just created invoices."""
+        invoice_ids = dict(Invoice.objects.filter(
+            company=company,
+            invoice_number__in=list(rows['invoice_number'])
+        ).values_list('invoice_number', 'id'))
+
         items = []
-        for item in items_data:
-            items.append(InvoiceItem(
-                invoice=invoice,
-                description=item['description'],
-                quantity=item['quantity'],
-                unit_price=item['unit_price']
-            ))
-        InvoiceItem.objects.bulk_create(items)
+        for invoice_number, lines in zip(rows['invoice_number'], rows['items']):
+            for line in lines:
+                line.invoice_id = invoice_ids[invoice_number]
+                items.append(line)
+        InvoiceItem.objects.bulk_create(items, batch_size=1000)
 
-    @transaction.atomic
-    def import_expenses(self, data, company, update_existing, skip_errors, currency):
+    def import_expenses(self, chunk, company, update_existing, skip_errors, currency, date_format):
         """Import expense data."""
-        required_fields = ['category', 'amount', 'date']
-        self.validate_fields(data, required_fields)
-        
-        stats = {
-            'processed': 0,
-            'created': 0,
-            'updated': 0,
-            'errors': 0
-        }
-        
-        for _, row in data.iterrows():
-            try:
-                # Get or create category
-                category, _ = ExpenseCategory.objects.get_or_create(
-                    name=row['category']
-                )
-                
-                expense_data = {
-                    'company': company,
-                    'category': category,
-                    'amount': row['amount'],
-                    'date': pd.to_datetime(row['date']).date(),
-                    'description': row.get('description', ''),
-                    'vendor': row.get('vendor', ''),
-                    'reference_number': row.get('reference_number', ''),
-                    'payment_method': row.get('payment_method', 'CASH'),
-                    'tax_deductible': row.get('tax_deductible', False)
-                }
-                
-                if update_existing and 'reference_number' in row:
-                    expense, created = Expense.objects.update_or_create(
-                        company=company,
-                        reference_number=row['reference_number'],
-                        defaults=expense_data
-                    )
-                else:
-                    expense = Expense.objects.create(**expense_data)
-                    created = True
-                
-                stats['processed'] += 1
-                if created:
-                    stats['created'] += 1
-                else:
-                    stats['updated'] += 1
-                    
-            except Exception as e:
-                stats['errors'] += 1
-                logger.error(f"Error importing expense: {str(e)}")
-                if not skip_errors:
-                    raise
-        
+        stats = self.empty_stats()
+
+        category_names = self.text_column(chunk, 'category').str.strip()
+        rows = pd.DataFrame({
+            'category': category_names,
+            'amount': self.amount_column(chunk, 'amount'),
+            'date': self.date_column(chunk, 'date', date_format),
+            'description': self.text_column(chunk, 'description'),
+            'vendor': self.text_column(chunk, 'vendor'),
+            'reference_number': self.text_column(chunk, 'reference_number'),
+            'payment_method': self.text_column(chunk, 'payment_method', 'CASH'),
+            'tax_deductible': self.text_column(chunk, 'tax_deductible', 'False')
+                .str.lower().isin(['true', '1', 'yes']),
+        })
+
+        invalid = (rows['category'] == '') | rows['amount'].isna() | rows['date'].isna()
+        stats['errors'] += self.report_errors(chunk, invalid, 'have an invalid category, amount or date', skip_errors)
+        rows = rows[~invalid]
+
+        category_ids = self.resolve_categories(set(rows['category']))
+
+        existing = {}
+        if update_existing and 'reference_number' in chunk.columns:
+            references = [ref for ref in rows['reference_number'].unique() if ref]
+            existing = dict(Expense.objects.filter(
+                company=company,
+                reference_number__in=references
+            ).values_list('reference_number', 'id'))
+
+        to_create, to_update = [], []
+        for record in rows.to_dict('records'):
+            expense = Expense(
+                company=company,
+                category_id=category_ids[record.pop('category')],
+                amount=Decimal(str(record.pop('amount'))),
+                **record
+            )
+            expense_id = existing.get(record['reference_number'])
+            if expense_id:
+                expense.pk = expense_id
+                expense.updated_at = timezone.now()
+                to_update.append(expense)
+            else:
+                to_create.append(expense)
+
+        Expense.objects.bulk_create(to_create, batch_size=1000)
+        if to_update:
+            Expense.objects.bulk_update(
+                to_update,
+                ['category', 'amount', 'date', 'description', 'vendor',
+                 'payment_method', 'tax_deductible', 'updated_at'],
+                batch_size=1000
+            )
+
+        stats['processed'] += len(to_create) + len(to_update)
+        stats['created'] += len(to_create)
+        stats['updated'] += len(to_update)
         return stats
 
-    @transaction.atomic
-    def import_categories(self, data, company, update_existing, skip_errors, currency):
+    def resolve_categories(self, names):
+        """Map category names to ids, creating missing categories in bulk."""
+        category_ids = dict(ExpenseCategory.objects.filter(
+            name__in=names
+        ).values_list('name', 'id'))
+        missing = names - set(category_ids)
+        if missing:
+            ExpenseCategory.objects.bulk_create(
+                [ExpenseCategory(name=name) for name in missing],
+                ignore_conflicts=True
+            )
+            category_ids.update(ExpenseCategory.objects.filter(
+                name__in=missing
+            ).values_list('name', 'id'))
+        return category_ids
+
+    def import_categories(self, chunk, company, update_existing, skip_errors, currency, date_format):
         """Import expense categories."""
-        required_fields = ['name']
-        self.validate_fields(data, required_fields)
-        
-        stats = {
-            'processed': 0,
-            'created': 0,
-            'updated': 0,
-            'errors': 0
-        }
-        
-        for _, row in data.iterrows():
-            try:
-                category_data = {
-                    'name': row['name'],
-                    'description': row.get('description', ''),
-                    'is_active': row.get('is_active', True)
-                }
-                
-                if update_existing:
-                    category, created = ExpenseCategory.objects.update_or_create(
-                        name=row['name'],
-                        defaults=category_data
-                    )
-                else:
-                    category = ExpenseCategory.objects.create(**category_data)
-                    created = True
-                
-                stats['processed'] += 1
-                if created:
-                    stats['created'] += 1
-                else:
-                    stats['updated'] += 1
-                    
-            except Exception as e:
-                stats['errors'] += 1
-                logger.error(f"Error importing category: {str(e)}")
-                if not skip_errors:
-                    raise
-        
+        stats = self.empty_stats()
+
+        rows = pd.DataFrame({
+            'name': self.text_column(chunk, 'name').str.strip(),
+            'description': self.text_column(chunk, 'description'),
+            'is_active': self.text_column(chunk, 'is_active', 'True')
+                .str.lower().isin(['true', '1', 'yes']),
+        })
+        invalid = rows['name'] == ''
+        stats['errors'] += self.report_errors(chunk, invalid, 'have no name', skip_errors)
+        rows = rows[~invalid].drop_duplicates(subset=['name'], keep='last')
+
+        existing = set(ExpenseCategory.objects.filter(
+            name__in=list(rows['name'])
+        ).values_list('name', flat=True))
+        is_existing = rows['name'].isin(existing)
+
+        if not update_existing:
+            stats['errors'] += self.report_errors(rows, is_existing, 'already exist', skip_errors)
+            rows = rows[~is_existing]
+
+        categories = [ExpenseCategory(**record) for record in rows.to_dict('records')]
+        ExpenseCategory.objects.bulk_create(
+            categories,
+            update_conflicts=update_existing,
+            unique_fields=['name'] if update_existing else None,
+            update_fields=['description', 'is_active'] if update_existing else None
+        )
+
+        updated = int(is_existing.sum()) if update_existing else 0
+        stats['processed'] += len(categories)
+        stats['updated'] += updated
+        stats['created'] += len(categories) - updated
         return stats
 
     def validate_fields(self, data, required_fields):
@@ -378,6 +766,6 @@ class Command(BaseCommand):
             f"Records updated: {stats['updated']}\n"
             f"Errors encountered: {stats['errors']}\n"
         )
-        
+
         self.stdout.write(self.style.SUCCESS(summary))
-        logger.info(summary)
\ No newline at end of file
+        logger.info(summary)
@@ -0,0 +1,35 @@
+from django.core.management.base import BaseCommand, CommandError
+import logging
+
+from financial_app.models import Company
+from financial_app.services.rollup_service import RollupService
+
+logger = logging.getLogger(__name__)
+
+class Command(BaseCommand):
+    help = 'Rebuild the monthly company rollup table from invoices, expenses and payments'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--company',
+            type=int,
+            help='Only rebuild rollups for this company ID'
+        )
+
+    def handle(self, *args, **options):
+        try:
+            company = None
+            if options['company']:
+                company = Company.objects.get(pk=options['company'])
+
+            count = RollupService.rebuild(company)
+
+            self.stdout.write(
+                self.style.SUCCESS(f"Rebuilt {count} monthly rollup rows")
+            )
+
+        except Company.DoesNotExist:
+            raise CommandError(f"Company {options['company']} not found")
+        except Exception as e:
+            logger.error(f"Monthly rollup rebuild failed: {str(e)}")
+            raise CommandError(f"Rollup rebuild failed: {str(e)}")
@@ -0,0 +1,45 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+import logging
+
+from financial_app.models import Client, ClientBalance
+
+logger = logging.getLogger(__name__)
+
+class Command(BaseCommand):
+    help = 'Rebuild the per-client balance ledgers from the invoices'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--company',
+            type=int,
+            help='Only reconcile clients of this company ID'
+        )
+
+        parser.add_argument(
+            '--client',
+            type=int,
+            nargs='+',
+            help='Only reconcile these client IDs'
+        )
+
+    def handle(self, *args, **options):
+        try:
+            client_ids = None
+            if options['client']:
+                client_ids = options['client']
+            elif options['company']:
+                client_ids = Client.objects.filter(
+                    company_id=options['company']
+                ).values_list('pk', flat=True)
+
+            with transaction.atomic():
+                count = ClientBalance.rebuild(client_ids)
+
+            self.stdout.write(
+                self.style.SUCCESS(f"Reconciled {count} client balance ledgers")
+            )
+
+        except Exception as e:
+            logger.error(f"Client balance reconciliation failed: {str(e)}")
+            raise CommandError(f"Reconciliation failed: {str(e)}")
@@ -1,7 +1,5 @@
 from django.core.management.base import BaseCommand, CommandError
 from django.utils import timezone
-from django.core.mail import send_mail, EmailMessage
-from django.template.loader import render_to_string
 from django.conf import settings
 from django.db.models import Q, Sum, F
 import logging
@@ -11,6 +9,7 @@ from financial_app.models import (
     Company, Invoice, Expense, Client, 
     UserProfile, PaymentRecord
 )
+from financial_app.services.mail_service import MailService
 
 logger = logging.getLogger(__name__)
 
@@ -65,6 +64,7 @@ class Command(BaseCommand):
             total_errors = 0
             
             for company in companies:
+                self.messages = []
                 try:
                     for notification_type in options['notification_types']:
                         sent, errors = self.process_notifications(
@@ -78,6 +78,9 @@ class Command(BaseCommand):
                     logger.error(f"Error processing company {company.id}: {str(e)}")
                     total_errors += 1
                     continue
+                finally:
+                    # Hand the company's notifications to the batched mail dispatcher
+                    MailService.dispatch(self.messages)
             
             self.stdout.write(
                 self.style.SUCCESS(
@@ -366,24 +369,16 @@ class Command(BaseCommand):
         return self.should_send_invoice_reminder(invoice)
 
     def send_notification(self, template, context, recipients, subject):
-        """Send email notification."""
+        """Queue email notification for the batched mail dispatcher."""
         try:
-            html_message = render_to_string(
-                f'financial_app/email/{template}.html',
-                context
-            )
-            
-            email = EmailMessage(
+            self.messages.append(MailService.build_message(
                 subject=subject,
-                body=html_message,
-                from_email=settings.DEFAULT_FROM_EMAIL,
+                template=f'financial_app/email/{template}.html',
+                context=context,
                 to=recipients
-            )
-            
-            email.content_subtype = 'html'
-            email.send()
+            ))
             
-            logger.info(f"Sent {template} notification to {', '.join(recipients)}")
+            logger.info(f"Queued {template} notification to {', '.join(recipients)}")
             
         except Exception as e:
             logger.error(f"Failed to send notification: {str(e)}")
@@ -2,13 +2,12 @@ from django.core.management.base import BaseCommand, CommandError
 from django.utils import timezone
 from django.conf import settings
 from django.db.models import Q, Sum
-from django.core.mail import EmailMessage
-from django.template.loader import render_to_string
 import logging
+import os
 from datetime import datetime, timedelta
 
 from financial_app.models import Invoice, Client, Company
-from financial_app.services.invoice_service import InvoiceService
+from financial_app.services.mail_service import MailService
 
 logger = logging.getLogger(__name__)
 
@@ -64,6 +63,7 @@ class Command(BaseCommand):
             self.stdout.write(f"Processing reminders for {len(companies)} companies")
             
             for company in companies:
+                self.messages = []
                 try:
                     sent, errors = self.process_company_reminders(company, options)
                     total_sent += sent
@@ -72,6 +72,9 @@ class Command(BaseCommand):
                     logger.error(f"Error processing company {company.id}: {str(e)}")
                     total_errors += 1
                     continue
+                finally:
+                    # Hand the company's reminders to the batched mail dispatcher
+                    MailService.dispatch(self.messages)
             
             self.stdout.write(
                 self.style.SUCCESS(
@@ -159,7 +162,7 @@ class Command(BaseCommand):
             company=company,
             status__in=['SENT', 'PARTIALLY_PAID'],
             due_date__lte=overdue_date
-        ).select_related('client')
+        ).select_related('client', 'company__owner')
 
     def get_upcoming_invoices(self, company, days_before):
         """Get upcoming invoices that need reminders."""
@@ -169,7 +172,7 @@ class Command(BaseCommand):
             company=company,
             status__in=['SENT', 'PARTIALLY_PAID'],
             due_date=target_date
-        ).select_related('client')
+        ).select_related('client', 'company__owner')
 
     def should_send_reminder(self, invoice):
         """Check if reminder should be sent based on previous reminders."""
@@ -201,35 +204,17 @@ class Command(BaseCommand):
             'balance_due': invoice.get_balance_due()
         }
         
-        html_message = render_to_string(
-            'financial_app/email/invoice_overdue_reminder.html',
-            context
-        )
-        
-        subject = f'Overdue Invoice Reminder - {invoice.invoice_number}'
-        
-        email = EmailMessage(
-            subject=subject,
-            body=html_message,
-            from_email=settings.DEFAULT_FROM_EMAIL,
+        # The invoice PDF is attached and reminder tracking updated by the
+        # mail task once the reminder is delivered
+        self.messages.append(MailService.build_message(
+            subject=f'Overdue Invoice Reminder - {invoice.invoice_number}',
+            template='financial_app/email/invoice_overdue_reminder.html',
+            context=context,
             to=[invoice.client.email],
-            cc=[invoice.company.owner.email]
-        )
-        
-        # Attach invoice PDF
-        pdf_file = InvoiceService.generate_pdf(invoice)
-        email.attach(
-            f'invoice_{invoice.invoice_number}.pdf',
-            pdf_file,
-            'application/pdf'
-        )
-        
-        email.send()
-        
-        # Update reminder tracking
-        invoice.last_reminder_sent = timezone.now()
-        invoice.reminder_count += 1
-        invoice.save()
+            cc=[invoice.company.owner.email],
+            invoice_pdfs=[invoice.pk],
+            reminder_for=invoice.pk
+        ))
 
     def send_upcoming_reminder(self, invoice):
         """Send upcoming payment reminder."""
@@ -241,29 +226,13 @@ class Command(BaseCommand):
             'amount_due': invoice.get_balance_due()
         }
         
-        html_message = render_to_string(
-            'financial_app/email/upcoming_payment_reminder.html',
-            context
-        )
-        
-        subject = f'Payment Reminder - Invoice {invoice.invoice_number}'
-        
-        email = EmailMessage(
-            subject=subject,
-            body=html_message,
-            from_email=settings.DEFAULT_FROM_EMAIL,
-            to=[invoice.client.email]
-        )
-        
-        # Attach invoice PDF
-        pdf_file = InvoiceService.generate_pdf(invoice)
-        email.attach(
-            f'invoice_{invoice.invoice_number}.pdf',
-            pdf_file,
-            'application/pdf'
-        )
-        
-        email.send()
+        self.messages.append(MailService.build_message(
+            subject=f'Payment Reminder - Invoice {invoice.invoice_number}',
+            template='financial_app/email/upcoming_payment_reminder.html',
+            context=context,
+            to=[invoice.client.email],
+            invoice_pdfs=[invoice.pk]
+        ))
 
 def format_currency(amount, currency='EUR'):
     """Helper function to format currency amounts."""
@@ -1,19 +1,23 @@
-from django.utils import timezone
-from actstream import action
-from django.contrib.contenttypes.models import ContentType
+from .services.activity_service import ActivityStreamService
 
 class ActivityLogMiddleware:
+    """
+    Log write requests to the activity stream. Actions recorded while the
+    request runs, here or by signal handlers, are written together at the
+    end of the request.
+    """
     def __init__(self, get_response):
         self.get_response = get_response
 
     def __call__(self, request):
-        response = self.get_response(request)
-        
-        if hasattr(request, 'user') and request.user.is_authenticated:
-            if request.method in ['POST', 'PUT', 'DELETE']:
-                # Log write operations
-                action_text = f"{request.method} on {request.path}"
-                action.send(request.user, verb=action_text, target=None)
+        with ActivityStreamService.batch():
+            response = self.get_response(request)
+            
+            if hasattr(request, 'user') and request.user.is_authenticated:
+                if request.method in ['POST', 'PUT', 'DELETE']:
+                    # Log write operations
+                    action_text = f"{request.method} on {request.path}"
+                    ActivityStreamService.record(action_text, actor=request.user)
         
         return response
 
@@ -23,10 +27,9 @@ class ActivityLogMiddleware:
 
     def process_exception(self, request, exception):
         if hasattr(request, 'user') and request.user.is_authenticated:
-            action.send(
-                request.user,
-                verb="encountered error",
-                description=str(exception),
-                target=None
+            ActivityStreamService.record(
+                "encountered error",
+                actor=request.user,
+                description=str(exception)
             )
-        return None
\ No newline at end of file
+        return None
@@ -1,15 +1,29 @@
-from django.db import models
+from django.db import models, transaction
 from django.contrib.auth.models import User
 from django.core.validators import MinValueValidator, EmailValidator, RegexValidator
-from django.utils.crypto import get_random_string
 from django.utils import timezone
-from django.core.exceptions import ValidationError
+from django.core.exceptions import ValidationError, ObjectDoesNotExist
 from django.utils.translation import gettext_lazy as _
 from django.urls import reverse
-from django.db.models import Sum
-from datetime import datetime, timedelta
+from django.db.models import Sum, F, Q
+from django.db.models.functions import Coalesce
+from contextlib import contextmanager
+from datetime import datetime
+from decimal import Decimal
+import threading
 import uuid
 
+# Invoice ids whose totals are recalculated once at the end of a batch
+# instead of after every item change (see Invoice.deferred_totals).
+_deferred_totals = threading.local()
+
+def get_deferred_invoice_ids():
+    """Return the set of invoice ids with deferred totals for this thread."""
+    ids = getattr(_deferred_totals, 'ids', None)
+    if ids is None:
+        ids = _deferred_totals.ids = set()
+    return ids
+
 class TimeStampedModel(models.Model):
     """Abstract base class with created and updated timestamps."""
     created_at = models.DateTimeField(auto_now_add=True)
@@ -18,6 +32,53 @@ class TimeStampedModel(models.Model):
     class Meta:
         abstract = True
 
+class MonthlyRollupMixin:
+    """
+    Remembers the stored values of ROLLUP_FIELDS so that saves and deletes
+    can be applied to CompanyMonthlyRollup as deltas (see signals.py).
+
+    Models using it set ROLLUP_FIELDS and implement
+    get_rollup_contributions, and override get_rollup_company_id when they
+    have no company_id field.
+    """
+    ROLLUP_FIELDS = ()
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._rollup_values = instance.get_rollup_values()
+        return instance
+
+    def refresh_from_db(self, *args, **kwargs):
+        super().refresh_from_db(*args, **kwargs)
+        self._rollup_values = self.get_rollup_values()
+
+    def get_rollup_values(self):
+        """Return the current ROLLUP_FIELDS values, or None if not fully loaded."""
+        loaded = self.__dict__
+        if not all(field in loaded for field in self.ROLLUP_FIELDS):
+            return None
+        return {field: loaded[field] for field in self.ROLLUP_FIELDS}
+
+    def load_rollup_values(self):
+        """Read the stored ROLLUP_FIELDS values of this row, None if it has none."""
+        return type(self)._base_manager.filter(pk=self.pk).values(
+            *self.ROLLUP_FIELDS
+        ).first()
+
+    def get_rollup_company_id(self):
+        return self.company_id
+
+    def get_rollup_contributions(self, values):
+        """
+        Return what a row with the given values adds to the rollup as
+        [((company_id, month, category_id), {measure: amount})]. Must be
+        implemented by the model.
+        """
+        raise NotImplementedError(
+            f"{type(self).__name__} must implement get_rollup_contributions()"
+        )
+
 class UserProfile(TimeStampedModel):
     ROLE_CHOICES = [
         ('ADMIN', 'Admin'),
@@ -44,6 +105,7 @@ class UserProfile(TimeStampedModel):
         help_text=_('User notification preferences in JSON format')
     )
     avatar = models.ImageField(upload_to='avatars/', null=True, blank=True)
+    last_active = models.DateTimeField(null=True, blank=True)
     last_login_ip = models.GenericIPAddressField(null=True, blank=True)
 
     class Meta:
@@ -189,7 +251,7 @@ class Client(TimeStampedModel):
         ordering = ['name']
         unique_together = ['company', 'email']
         indexes = [
-            models.Index(fields=['company', 'name']),
+            models.Index(fields=['company', 'name', 'id']),
             models.Index(fields=['email']),
         ]
 
@@ -199,13 +261,17 @@ class Client(TimeStampedModel):
     def get_absolute_url(self):
         return reverse('client_detail', args=[str(self.id)])
 
+    def get_balance_ledger(self):
+        """Get the client's balance ledger, building it on first access."""
+        try:
+            return self.ledger
+        except ObjectDoesNotExist:
+            ClientBalance.rebuild([self.pk])
+            return ClientBalance.objects.get(client=self)
+
     def get_outstanding_balance(self):
-        """Calculate total outstanding balance for the client."""
-        return self.invoice_set.filter(
-            status__in=['SENT', 'OVERDUE']
-        ).aggregate(
-            total=Sum('total_amount')
-        )['total'] or 0
+        """Get total outstanding balance for the client."""
+        return self.get_balance_ledger().outstanding
 
     def is_credit_limit_exceeded(self):
         """Check if client has exceeded their credit limit."""
@@ -213,7 +279,56 @@ class Client(TimeStampedModel):
             return False
         return self.get_outstanding_balance() > self.credit_limit
 
-class Invoice(TimeStampedModel):
+class InvoiceNumberSequence(models.Model):
+    """Per company and month counter used to allocate invoice numbers."""
+    company = models.ForeignKey(
+        Company,
+        on_delete=models.CASCADE,
+        related_name='invoice_sequences'
+    )
+    period = models.CharField(max_length=6, help_text=_('Period as YYYYMM'))
+    last_value = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        verbose_name = _('Invoice Number Sequence')
+        verbose_name_plural = _('Invoice Number Sequences')
+        unique_together = ['company', 'period']
+
+    def __str__(self):
+        return f"{self.company_id} {self.period}: {self.last_value}"
+
+    @classmethod
+    def next_number(cls, company_id, date=None):
+        """
+        Allocate the next invoice number for a company, e.g. INV-202401-0001.
+        The counter row is incremented with an atomic UPDATE, which holds
+        its row lock until the surrounding transaction ends, so concurrent
+        writers never receive the same number.
+        """
+        return cls.next_numbers(company_id, 1, date)[0]
+
+    @classmethod
+    def next_numbers(cls, company_id, count, date=None):
+        """Allocate a block of consecutive invoice numbers with one UPDATE."""
+        date = date or timezone.now()
+        period = f"{date.year}{date.month:02d}"
+        with transaction.atomic():
+            sequence, _ = cls.objects.get_or_create(
+                company_id=company_id,
+                period=period
+            )
+            cls.objects.filter(pk=sequence.pk).update(
+                last_value=F('last_value') + count
+            )
+            last_value = cls.objects.select_for_update().values_list(
+                'last_value', flat=True
+            ).get(pk=sequence.pk)
+        return [
+            f"INV-{period}-{value:04d}"
+            for value in range(last_value - count + 1, last_value + 1)
+        ]
+
+class Invoice(MonthlyRollupMixin, TimeStampedModel):
     STATUS_CHOICES = [
         ('DRAFT', 'Draft'),
         ('SENT', 'Sent'),
@@ -233,7 +348,7 @@ class Invoice(TimeStampedModel):
         on_delete=models.CASCADE,
         related_name='invoices'
     )
-    invoice_number = models.CharField(max_length=50, unique=True, blank=True)
+    invoice_number = models.CharField(max_length=50, blank=True)
     status = models.CharField(
         max_length=15,
         choices=STATUS_CHOICES,
@@ -290,27 +405,29 @@ class Invoice(TimeStampedModel):
         verbose_name = _('Invoice')
         verbose_name_plural = _('Invoices')
         ordering = ['-issue_date']
+        unique_together = ['company', 'invoice_number']
         indexes = [
             models.Index(fields=['company', 'status']),
             models.Index(fields=['client', 'status']),
             models.Index(fields=['issue_date']),
+            models.Index(fields=['company', 'issue_date', 'id']),
             models.Index(fields=['due_date']),
+            models.Index(fields=['status', 'due_date']),
         ]
 
     def __str__(self):
         return f"Invoice {self.invoice_number} - {self.client.name}"
 
+    TOTAL_FIELDS = ['subtotal', 'tax_amount', 'total_amount', 'status', 'updated_at']
+
     def save(self, *args, **kwargs):
         # Generate invoice number if not set
         if not self.invoice_number:
-            year = timezone.now().year
-            month = timezone.now().month
-            random_string = get_random_string(length=4, allowed_chars='1234567890')
-            self.invoice_number = f"INV-{year}{month:02d}-{random_string}"
+            self.invoice_number = InvoiceNumberSequence.next_number(self.company_id)
         
-        # Calculate totals
-        self.subtotal = sum(item.total for item in self.items.all())
-        self.tax_amount = self.subtotal * (self.tax_rate / 100)
+        # Subtotal is maintained incrementally by the items, so only the
+        # derived amounts are recalculated here
+        self.tax_amount = self.subtotal * Decimal(self.tax_rate) / Decimal('100')
         self.total_amount = self.subtotal + self.tax_amount
         
         # Update status based on payments
@@ -321,7 +438,116 @@ class Invoice(TimeStampedModel):
         elif self.status == 'SENT' and self.due_date < timezone.now().date():
             self.status = 'OVERDUE'
         
-        super().save(*args, **kwargs)
+        adding = self._state.adding
+        previous_state = getattr(self, '_ledger_state', None)
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+            
+            # Keep the client balance ledger in step with this invoice
+            current_state = self.get_ledger_state()
+            if previous_state is None and not adding:
+                ClientBalance.rebuild([self.client_id])
+            else:
+                ClientBalance.apply_invoice_change(previous_state, current_state)
+        self._ledger_state = current_state
+        self._stored_status = self.status
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._ledger_state = instance.get_ledger_state()
+        # Status changes are detected against this (see signals.py)
+        instance._stored_status = instance.__dict__.get('status')
+        return instance
+
+    def refresh_from_db(self, *args, **kwargs):
+        super().refresh_from_db(*args, **kwargs)
+        self._ledger_state = self.get_ledger_state()
+        # Loading another deferred field must not take in an unsaved status
+        fields = kwargs.get('fields')
+        if fields is None or 'status' in fields:
+            self._stored_status = self.__dict__.get('status')
+
+    ROLLUP_FIELDS = ('company_id', 'status', 'issue_date', 'total_amount', 'tax_amount')
+
+    def get_rollup_contributions(self, values):
+        if values['status'] != 'PAID':
+            return []
+        month = values['issue_date'].replace(day=1)
+        return [(
+            (values['company_id'], month, None),
+            {'revenue': values['total_amount'], 'tax': values['tax_amount']}
+        )]
+
+    def get_ledger_state(self):
+        """
+        Return this invoice's contribution to its client's balance ledger as
+        (client_id, outstanding, overdue, paid), or None if not fully loaded.
+        """
+        loaded = self.__dict__
+        if not all(f in loaded for f in ('client_id', 'status', 'total_amount', 'amount_paid')):
+            return None
+        outstanding = self.total_amount if self.status in ClientBalance.OUTSTANDING_STATUSES else 0
+        overdue = self.total_amount if self.status == 'OVERDUE' else 0
+        return (self.client_id, outstanding or 0, overdue or 0, self.amount_paid or 0)
+
+    def apply_item_delta(self, delta):
+        """
+        Apply a change in line item totals to the invoice. The subtotal is
+        incremented in the database, so concurrent item changes never
+        overwrite each other, and the tax, total and status are then
+        recalculated from the stored row. Ignored while totals are deferred
+        for this invoice.
+        """
+        if not delta or self.pk in get_deferred_invoice_ids():
+            return
+        with transaction.atomic():
+            # The UPDATE holds the row lock until the transaction ends
+            if not Invoice.objects.filter(pk=self.pk).update(subtotal=F('subtotal') + delta):
+                return
+            # Only the subtotal moved, so the snapshots loaded with the row
+            # still describe the stored totals the ledger and rollup hold
+            stored = Invoice.objects.get(pk=self.pk)
+            stored.save(update_fields=self.TOTAL_FIELDS)
+
+        for field in self.TOTAL_FIELDS:
+            setattr(self, field, getattr(stored, field))
+        self._ledger_state = stored._ledger_state
+        self._rollup_values = stored._rollup_values
+        self._stored_status = stored._stored_status
+
+    def recalculate_totals(self, save=True):
+        """Recalculate the subtotal from the items with one DB-side aggregate."""
+        self.subtotal = self.items.aggregate(
+            total=Sum('total')
+        )['total'] or Decimal('0')
+        if save:
+            self.save(update_fields=self.TOTAL_FIELDS)
+
+    @contextmanager
+    def deferred_totals(self, recalculate=True):
+        """
+        Suspend per-item totals updates while items are created in bulk and
+        recalculate the totals once on exit. Pass recalculate=False when the
+        caller writes the totals itself.
+        Usage:
+            with invoice.deferred_totals():
+                for item in items:
+                    invoice.items.create(...)
+        """
+        deferred_ids = get_deferred_invoice_ids()
+        if self.pk in deferred_ids:
+            # Nested block, the outermost one recalculates
+            yield self
+            return
+        with transaction.atomic():
+            deferred_ids.add(self.pk)
+            try:
+                yield self
+            finally:
+                deferred_ids.discard(self.pk)
+            if recalculate:
+                self.recalculate_totals()
 
     def clean(self):
         if self.due_date and self.issue_date and self.due_date < self.issue_date:
@@ -352,6 +578,161 @@ class Invoice(TimeStampedModel):
         self.reminder_count += 1
         self.save()
 
+class ClientBalance(models.Model):
+    """
+    Denormalized balance ledger per client, kept current by Invoice.save and
+    invoice deletion, and rebuilt by the reconcile_client_balances command.
+    """
+    OUTSTANDING_STATUSES = ['SENT', 'OVERDUE']
+
+    client = models.OneToOneField(
+        Client,
+        on_delete=models.CASCADE,
+        related_name='ledger'
+    )
+    outstanding = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+    overdue = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+    paid_to_date = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        verbose_name = _('Client Balance')
+        verbose_name_plural = _('Client Balances')
+
+    def __str__(self):
+        return f"{self.client_id}: {self.outstanding}"
+
+    @classmethod
+    def apply_invoice_change(cls, previous_state, current_state, rebuild_missing=True):
+        """
+        Apply the difference between two invoice ledger states (as returned
+        by Invoice.get_ledger_state) to the affected client ledgers. Missing
+        ledgers are rebuilt unless rebuild_missing is False.
+        """
+        deltas = {}
+        for state, sign in ((previous_state, -1), (current_state, 1)):
+            if state is None:
+                continue
+            client_id, outstanding, overdue, paid = state
+            delta = deltas.setdefault(client_id, [0, 0, 0])
+            delta[0] += sign * outstanding
+            delta[1] += sign * overdue
+            delta[2] += sign * paid
+
+        for client_id, (outstanding, overdue, paid) in deltas.items():
+            if not (outstanding or overdue or paid):
+                continue
+            updated = cls.objects.filter(client_id=client_id).update(
+                outstanding=F('outstanding') + outstanding,
+                overdue=F('overdue') + overdue,
+                paid_to_date=F('paid_to_date') + paid,
+                updated_at=timezone.now()
+            )
+            if not updated and rebuild_missing:
+                cls.rebuild([client_id])
+
+    @classmethod
+    def apply_status_transition(cls, invoice_ids, from_status, to_status):
+        """
+        Apply a queryset update that moved the given invoices from one
+        status to another, with one grouped aggregate over the invoices.
+        """
+        outstanding_sign = (
+            (to_status in cls.OUTSTANDING_STATUSES) - (from_status in cls.OUTSTANDING_STATUSES)
+        )
+        overdue_sign = (to_status == 'OVERDUE') - (from_status == 'OVERDUE')
+        if not (outstanding_sign or overdue_sign):
+            return
+
+        totals = Invoice.objects.filter(pk__in=invoice_ids).values('client_id').annotate(
+            total=Sum('total_amount')
+        ).order_by()
+        for row in totals:
+            total = row['total'] or 0
+            cls.apply_invoice_change(
+                None,
+                (row['client_id'], outstanding_sign * total, overdue_sign * total, 0)
+            )
+
+    @classmethod
+    def attach(cls, clients):
+        """
+        Load the ledgers of many clients at once, rebuilding missing ones
+        together, so their balances can be read without a query per client.
+        Ledgers already loaded with select_related are kept.
+        """
+        missing = {}
+        for client in clients:
+            if not (Client.ledger.is_cached(client) and hasattr(client, 'ledger')):
+                missing.setdefault(client.pk, []).append(client)
+        if not missing:
+            return
+
+        ledgers = {
+            ledger.client_id: ledger
+            for ledger in cls.objects.filter(client_id__in=missing)
+        }
+        absent = [client_id for client_id in missing if client_id not in ledgers]
+        if absent:
+            cls.rebuild(absent)
+            ledgers.update(
+                (ledger.client_id, ledger)
+                for ledger in cls.objects.filter(client_id__in=absent)
+            )
+
+        for client_id, instances in missing.items():
+            for client in instances:
+                client.ledger = ledgers[client_id]
+
+    @classmethod
+    def rebuild(cls, client_ids=None):
+        """
+        Rebuild ledgers from the invoices with one grouped aggregate.
+        Rebuilds every client when client_ids is None.
+        """
+        clients = Client.objects.all()
+        if client_ids is not None:
+            clients = clients.filter(pk__in=client_ids)
+
+        zero = Decimal('0')
+        totals = clients.annotate(
+            ledger_outstanding=Coalesce(Sum(
+                'invoices__total_amount',
+                filter=Q(invoices__status__in=cls.OUTSTANDING_STATUSES)
+            ), zero),
+            ledger_overdue=Coalesce(Sum(
+                'invoices__total_amount',
+                filter=Q(invoices__status='OVERDUE')
+            ), zero),
+            ledger_paid=Coalesce(Sum('invoices__amount_paid'), zero)
+        ).values_list('pk', 'ledger_outstanding', 'ledger_overdue', 'ledger_paid')
+
+        rebuilt = 0
+        batch = []
+        for client_id, outstanding, overdue, paid in totals.iterator(chunk_size=2000):
+            batch.append(cls(
+                client_id=client_id,
+                outstanding=outstanding,
+                overdue=overdue,
+                paid_to_date=paid
+            ))
+            if len(batch) >= 1000:
+                rebuilt += cls._upsert(batch)
+                batch = []
+        if batch:
+            rebuilt += cls._upsert(batch)
+        return rebuilt
+
+    @classmethod
+    def _upsert(cls, ledgers):
+        cls.objects.bulk_create(
+            ledgers,
+            update_conflicts=True,
+            unique_fields=['client'],
+            update_fields=['outstanding', 'overdue', 'paid_to_date', 'updated_at']
+        )
+        return len(ledgers)
+
 class InvoiceItem(TimeStampedModel):
     invoice = models.ForeignKey(
         Invoice,
@@ -385,12 +766,33 @@ class InvoiceItem(TimeStampedModel):
         verbose_name = _('Invoice Item')
         verbose_name_plural = _('Invoice Items')
 
-    def save(self, *args, **kwargs):
-        self.total = self.quantity * self.unit_price
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Remember the stored total so saves can be applied as a delta
+        instance._stored_total = instance.__dict__.get('total')
+        return instance
+
+    def refresh_from_db(self, *args, **kwargs):
+        super().refresh_from_db(*args, **kwargs)
+        self._stored_total = self.__dict__.get('total')
+
+    def calculate_total(self):
+        """Calculate the line total including item level tax."""
+        total = self.quantity * self.unit_price
         if self.tax_rate:
-            self.total += self.total * (self.tax_rate / 100)
+            total += total * (self.tax_rate / 100)
+        # Round as stored so deltas add up to the DB-side aggregate
+        return total.quantize(Decimal('0.01'))
+
+    def save(self, *args, **kwargs):
+        self.total = self.calculate_total()
         super().save(*args, **kwargs)
-        self.invoice.save()  # Update invoice totals
+        
+        # Update invoice totals by the change in this line only
+        previous_total = getattr(self, '_stored_total', None) or Decimal('0')
+        self._stored_total = self.total
+        self.invoice.apply_item_delta(self.total - previous_total)
 
 class ExpenseCategory(models.Model):
     name = models.CharField(max_length=50, unique=True)
@@ -412,7 +814,7 @@ class ExpenseCategory(models.Model):
     def __str__(self):
         return self.name
 
-class Expense(TimeStampedModel):
+class Expense(MonthlyRollupMixin, TimeStampedModel):
     company = models.ForeignKey(
         Company,
         on_delete=models.CASCADE,
@@ -486,7 +888,7 @@ class Expense(TimeStampedModel):
         verbose_name_plural = _('Expenses')
         ordering = ['-date']
         indexes = [
-            models.Index(fields=['company', 'date']),
+            models.Index(fields=['company', 'date', 'id']),
             models.Index(fields=['category']),
             models.Index(fields=['created_by']),
         ]
@@ -504,6 +906,15 @@ class Expense(TimeStampedModel):
         if self.approved_by and not self.approval_date:
             raise ValidationError(_('Approval date is required when expense is approved'))
 
+    ROLLUP_FIELDS = ('company_id', 'category_id', 'date', 'amount')
+
+    def get_rollup_contributions(self, values):
+        month = values['date'].replace(day=1)
+        return [(
+            (values['company_id'], month, values['category_id']),
+            {'expense': values['amount']}
+        )]
+
     def get_absolute_url(self):
         return reverse('expense_detail', args=[str(self.id)])
 
@@ -517,45 +928,30 @@ class Expense(TimeStampedModel):
         self.save()
 
     def generate_next_recurring_expense(self):
-        """Generate the next recurring expense based on frequency."""
+        """
+        Create the expenses for every occurrence of this recurring expense
+        due by today, including missed ones, and advance next_recurring_date.
+        """
         if not self.is_recurring or not self.recurring_frequency:
-            return None
+            return []
 
-        next_date = self.next_recurring_date or self.date
-        
-        # Calculate next date based on frequency
-        if self.recurring_frequency == 'DAILY':
-            next_date += timedelta(days=1)
-        elif self.recurring_frequency == 'WEEKLY':
-            next_date += timedelta(weeks=1)
-        elif self.recurring_frequency == 'MONTHLY':
-            next_date = next_date + timedelta(days=32)
-            next_date = next_date.replace(day=1) - timedelta(days=1)
-        elif self.recurring_frequency == 'QUARTERLY':
-            next_date = next_date + timedelta(days=92)
-            next_date = next_date.replace(day=1) - timedelta(days=1)
-        elif self.recurring_frequency == 'YEARLY':
-            next_date = next_date.replace(year=next_date.year + 1)
-
-        # Create new expense
-        new_expense = Expense.objects.create(
-            company=self.company,
-            category=self.category,
-            amount=self.amount,
-            date=next_date,
-            description=self.description,
-            vendor=self.vendor,
-            payment_method=self.payment_method,
-            is_recurring=True,
-            recurring_frequency=self.recurring_frequency,
-            next_recurring_date=next_date,
-            tax_deductible=self.tax_deductible,
-            created_by=self.created_by,
-            tags=self.tags,
-            notes=self.notes
+        from .services.recurring_service import RecurringService, calculate_next_recurring_date
+        if not self.next_recurring_date:
+            self.next_recurring_date = calculate_next_recurring_date(
+                self.date,
+                self.recurring_frequency
+            )
+            Expense.objects.filter(pk=self.pk).update(
+                next_recurring_date=self.next_recurring_date,
+                updated_at=timezone.now()
+            )
+
+        expenses = RecurringService.materialize_expenses(
+            timezone.now().date(),
+            templates=[self]
         )
-        
-        return new_expense
+        self.refresh_from_db(fields=['next_recurring_date'])
+        return expenses
 
     def get_tax_amount(self):
         """Calculate tax amount if expense is tax deductible."""
@@ -564,7 +960,7 @@ class Expense(TimeStampedModel):
         # Implement tax calculation logic based on your requirements
         return self.amount * 0.20  # Example: 20% tax deduction
 
-class PaymentRecord(TimeStampedModel):
+class PaymentRecord(MonthlyRollupMixin, TimeStampedModel):
     STATUS_CHOICES = [
         ('PENDING', 'Pending'),
         ('COMPLETED', 'Completed'),
@@ -625,12 +1021,30 @@ class PaymentRecord(TimeStampedModel):
         ordering = ['-payment_date']
         indexes = [
             models.Index(fields=['invoice', 'status']),
-            models.Index(fields=['payment_date']),
+            models.Index(fields=['payment_date', 'id']),
         ]
 
     def __str__(self):
         return f"Payment {self.id} for Invoice {self.invoice.invoice_number}"
 
+    ROLLUP_FIELDS = ('invoice_id', 'status', 'payment_date', 'amount')
+
+    def get_rollup_company_id(self):
+        return self.invoice.company_id
+
+    def get_rollup_contributions(self, values):
+        if values['status'] == 'COMPLETED':
+            measure = 'inflow'
+        elif values['status'] == 'REFUNDED':
+            measure = 'outflow'
+        else:
+            return []
+        month = values['payment_date'].replace(day=1)
+        return [(
+            (self.get_rollup_company_id(), month, None),
+            {measure: values['amount']}
+        )]
+
     def save(self, *args, **kwargs):
         super().save(*args, **kwargs)
         
@@ -641,4 +1055,90 @@ class PaymentRecord(TimeStampedModel):
             ).aggregate(
                 total=Sum('amount')
             )['total'] or 0
-            self.invoice.save()
\ No newline at end of file
+            self.invoice.save()
+
+class CompanyMonthlyRollup(models.Model):
+    """
+    Monthly totals per company, and per expense category for expenses.
+    Rows without a category hold the invoice and payment figures:
+    revenue and tax of paid invoices by issue month, inflow of completed
+    and outflow of refunded payments by payment month. Kept current by
+    the signal handlers in signals.py and rebuilt nightly by
+    RollupService.rebuild.
+    """
+    MEASURES = ('revenue', 'tax', 'expense', 'inflow', 'outflow')
+
+    company = models.ForeignKey(
+        Company,
+        on_delete=models.CASCADE,
+        related_name='monthly_rollups'
+    )
+    month = models.DateField(help_text=_('First day of the month'))
+    category = models.ForeignKey(
+        ExpenseCategory,
+        null=True,
+        blank=True,
+        on_delete=models.CASCADE,
+        related_name='monthly_rollups'
+    )
+    revenue = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    tax = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    expense = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    inflow = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    outflow = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        verbose_name = _('Company Monthly Rollup')
+        verbose_name_plural = _('Company Monthly Rollups')
+        ordering = ['company', 'month']
+        constraints = [
+            models.UniqueConstraint(
+                fields=['company', 'month', 'category'],
+                condition=Q(category__isnull=False),
+                name='unique_rollup_company_month_category'
+            ),
+            models.UniqueConstraint(
+                fields=['company', 'month'],
+                condition=Q(category__isnull=True),
+                name='unique_rollup_company_month'
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.company_id} {self.month:%Y-%m} {self.category_id or '-'}"
+
+    @classmethod
+    def apply_change(cls, previous, current, create_missing=True):
+        """
+        Apply the difference between two lists of contributions (as returned
+        by get_rollup_contributions) with one UPDATE per affected row.
+        """
+        deltas = {}
+        for contributions, sign in ((previous or [], -1), (current or [], 1)):
+            for key, measures in contributions:
+                delta = deltas.setdefault(key, {})
+                for measure, amount in measures.items():
+                    delta[measure] = delta.get(measure, 0) + sign * (amount or 0)
+
+        for (company_id, month, category_id), delta in deltas.items():
+            changes = {
+                measure: F(measure) + amount
+                for measure, amount in delta.items() if amount
+            }
+            if not changes:
+                continue
+            changes['updated_at'] = timezone.now()
+            rows = cls.objects.filter(
+                company_id=company_id,
+                month=month,
+                category_id=category_id
+            )
+            with transaction.atomic():
+                if not rows.update(**changes) and create_missing:
+                    cls.objects.get_or_create(
+                        company_id=company_id,
+                        month=month,
+                        category_id=category_id
+                    )
+                    rows.update(**changes)
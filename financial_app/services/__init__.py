@@ -3,13 +3,26 @@ from .expense_service import ExpenseService
 from .report_service import ReportService
 from .analytics_service import AnalyticsService
 from .client_service import ClientService
+from .rollup_service import RollupService
+from .pdf_service import InvoicePdfService
+from .mail_service import MailService
+from .recurring_service import RecurringService
+from .activity_service import UserActivityService, ActivityStreamService
+from .dashboard_service import DashboardService
 
 __all__ = [
     'InvoiceService',
     'ExpenseService',
     'ReportService',
     'AnalyticsService',
-    'ClientService'
+    'ClientService',
+    'RollupService',
+    'InvoicePdfService',
+    'MailService',
+    'RecurringService',
+    'UserActivityService',
+    'ActivityStreamService',
+    'DashboardService'
 ]
 
 # Service Registry for dependency injection
@@ -30,7 +43,14 @@ class ServiceRegistry:
                 'expense': ExpenseService,
                 'report': ReportService,
                 'analytics': AnalyticsService,
-                'client': ClientService
+                'client': ClientService,
+                'rollup': RollupService,
+                'invoice_pdf': InvoicePdfService,
+                'mail': MailService,
+                'recurring': RecurringService,
+                'user_activity': UserActivityService,
+                'activity_stream': ActivityStreamService,
+                'dashboard': DashboardService
             }
         return cls._instance
 
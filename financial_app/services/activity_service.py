@@ -0,0 +1,219 @@
+from contextlib import contextmanager
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.contrib.contenttypes.models import ContentType
+from django.core.cache import cache
+from django.db import transaction
+from django.utils import timezone
+from functools import partial
+import logging
+import threading
+from ..models import UserProfile, Company
+
+logger = logging.getLogger(__name__)
+
+class UserActivityService:
+    """
+    Write-behind tracking of when and from where users were last active.
+
+    Activity is recorded in the cache only: the latest (time, ip) per user,
+    and the user id in a numbered slot of the current time bucket. The
+    flush_user_activity task reads the users of every completed bucket and
+    writes their profiles with one bulk update, so a profile is written at
+    most once per interval however many requests the user makes.
+
+    Settings:
+        USER_ACTIVITY_INTERVAL: seconds per bucket, also how often each
+            process records a user (default 60)
+    """
+
+    KEY_PREFIX = 'user_activity'
+
+    @staticmethod
+    def get_interval():
+        return getattr(settings, 'USER_ACTIVITY_INTERVAL', 60)
+
+    @staticmethod
+    def get_retention():
+        """Seconds activity stays in the cache waiting for a flush."""
+        return max(UserActivityService.get_interval() * 10, 3600)
+
+    @staticmethod
+    def get_bucket(when):
+        return int(when.timestamp() // UserActivityService.get_interval())
+
+    @staticmethod
+    def _increment(key, timeout):
+        try:
+            return cache.incr(key)
+        except ValueError:
+            if cache.add(key, 1, timeout):
+                return 1
+            return cache.incr(key)
+
+    @staticmethod
+    def record(user_id, ip_address, when=None):
+        """Record that a user was active, without touching the database."""
+        when = when or timezone.now()
+        retention = UserActivityService.get_retention()
+        bucket_key = f"{UserActivityService.KEY_PREFIX}:bucket:{UserActivityService.get_bucket(when)}"
+        slot = UserActivityService._increment(bucket_key, retention)
+        cache.set_many({
+            f"{UserActivityService.KEY_PREFIX}:user:{user_id}": (when, ip_address),
+            f"{bucket_key}:{slot}": user_id
+        }, retention)
+
+    @staticmethod
+    def flush(now=None):
+        """
+        Write the activity of the users seen in completed buckets since the
+        last flush to their profiles. Returns the number of profiles
+        updated.
+        """
+        try:
+            prefix = UserActivityService.KEY_PREFIX
+            # Leave one bucket of grace for writers running slightly late
+            last_bucket = UserActivityService.get_bucket(now or timezone.now()) - 2
+            # Buckets older than the retention have expired, so a stale or
+            # missing pointer never walks further back than that
+            oldest = last_bucket - (
+                UserActivityService.get_retention() // UserActivityService.get_interval()
+            )
+            flushed = max(cache.get(f"{prefix}:flushed", oldest), oldest)
+
+            user_ids = set()
+            for bucket in range(flushed + 1, last_bucket + 1):
+                bucket_key = f"{prefix}:bucket:{bucket}"
+                count = cache.get(bucket_key)
+                if count:
+                    user_ids.update(cache.get_many([
+                        f"{bucket_key}:{slot}" for slot in range(1, count + 1)
+                    ]).values())
+
+            activity = cache.get_many([f"{prefix}:user:{user_id}" for user_id in user_ids])
+            profiles = []
+            for profile in UserProfile.objects.filter(user_id__in=user_ids).only('pk', 'user_id'):
+                seen = activity.get(f"{prefix}:user:{profile.user_id}")
+                if seen:
+                    profile.last_active, profile.last_login_ip = seen
+                    profiles.append(profile)
+            UserProfile.objects.bulk_update(
+                profiles,
+                ['last_active', 'last_login_ip'],
+                batch_size=1000
+            )
+
+            cache.set(f"{prefix}:flushed", max(flushed, last_bucket), None)
+            return len(profiles)
+        except Exception as e:
+            logger.error(f"Error flushing user activity: {str(e)}")
+            raise
+
+_stream = threading.local()
+
+class ActivityStreamService:
+    """
+    Buffered writer for the activity stream. Actions are queued as plain
+    tuples and written with one bulk insert per batch: when the transaction
+    they were recorded in commits (never if it or the savepoint they were
+    recorded in rolls back), or at the end of a batch() scope such as a
+    request, whichever comes last. Content types come from the ContentType
+    cache, and actions by the owner of a company are resolved for the
+    whole batch with one query.
+    """
+
+    @staticmethod
+    def get_buffer():
+        if not hasattr(_stream, 'events'):
+            _stream.events = []
+            _stream.depth = 0
+        return _stream
+
+    @staticmethod
+    def get_reference(instance):
+        if instance is None:
+            return None, None
+        return ContentType.objects.get_for_model(instance).pk, str(instance.pk)
+
+    @staticmethod
+    def record(verb, actor=None, company_id=None, target=None, description=None):
+        """
+        Queue an action by actor, or by the owner of company_id when no
+        actor is given.
+        """
+        actor_type, actor_id = ActivityStreamService.get_reference(actor)
+        target_type, target_id = ActivityStreamService.get_reference(target)
+        event = (
+            actor_type, actor_id, company_id, verb, description,
+            target_type, target_id, timezone.now()
+        )
+
+        if not transaction.get_connection().in_atomic_block:
+            ActivityStreamService.committed([event])
+            return
+        # Callbacks of a savepoint that rolls back are dropped with it
+        transaction.on_commit(partial(ActivityStreamService.committed, [event]))
+
+    @staticmethod
+    def committed(events):
+        buffer = ActivityStreamService.get_buffer()
+        buffer.events.extend(events)
+        if not buffer.depth:
+            ActivityStreamService.flush()
+
+    @staticmethod
+    @contextmanager
+    def batch():
+        """Hold committed actions and write them together at the end."""
+        buffer = ActivityStreamService.get_buffer()
+        buffer.depth += 1
+        try:
+            yield
+        finally:
+            buffer.depth -= 1
+            if not buffer.depth:
+                ActivityStreamService.flush()
+
+    @staticmethod
+    def flush():
+        """
+        Write the queued actions with one bulk insert. Failures are logged
+        rather than raised, since the changes they describe are committed.
+        Returns the number of actions written.
+        """
+        from actstream.models import Action
+
+        buffer = ActivityStreamService.get_buffer()
+        events, buffer.events = buffer.events, []
+        if not events:
+            return 0
+
+        try:
+            company_ids = {event[2] for event in events if event[0] is None}
+            owners = dict(
+                Company.objects.filter(pk__in=company_ids).values_list('pk', 'owner_id')
+            ) if company_ids else {}
+            user_type = ContentType.objects.get_for_model(User).pk
+
+            actions = []
+            for (actor_type, actor_id, company_id, verb, description,
+                    target_type, target_id, timestamp) in events:
+                if actor_type is None:
+                    # Companies deleted since have no owner to credit
+                    if owners.get(company_id) is None:
+                        continue
+                    actor_type, actor_id = user_type, str(owners[company_id])
+                actions.append(Action(
+                    actor_content_type_id=actor_type,
+                    actor_object_id=actor_id,
+                    verb=verb,
+                    description=description,
+                    target_content_type_id=target_type,
+                    target_object_id=target_id,
+                    timestamp=timestamp
+                ))
+            Action.objects.bulk_create(actions, batch_size=500)
+            return len(actions)
+        except Exception as e:
+            logger.error(f"Error writing {len(events)} activity stream actions: {str(e)}")
+            return 0
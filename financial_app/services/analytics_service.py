@@ -1,73 +1,77 @@
 # File: financial_app/services/analytics_service.py
 
-from django.db.models import Sum, Count, F, Value, CharField
-from django.db.models.functions import TruncMonth, Coalesce
+from django.db.models import Sum, Count, F, Q, Value, CharField
+from django.db.models.functions import Coalesce
 from django.utils import timezone
 from datetime import timedelta
 from ..models import Invoice, Expense, ExpenseCategory, PaymentRecord
+from .rollup_service import RollupService
+
+class RollingPeriod:
+    """
+    Reporting period covering the last `days` days, compared against the
+    `days` days before it. Any object providing bounds() can be passed to
+    AnalyticsService.get_business_overview instead.
+    """
+    def __init__(self, days=30):
+        self.days = days
+
+    def bounds(self, today=None):
+        """Return (previous_start, current_start, current_end) as dates."""
+        current_end = today or timezone.now().date()
+        current_start = current_end - timedelta(days=self.days)
+        previous_start = current_start - timedelta(days=self.days)
+        return previous_start, current_start, current_end
 
 class AnalyticsService:
     @staticmethod
-    def get_business_overview(company):
+    def get_business_overview(company, period=None):
         """
-        Get comprehensive business overview including income, expenses, and trends
+        Get comprehensive business overview including income, expenses, and trends.
+        All invoice metrics are computed in one scan and all expense metrics
+        in another using conditional aggregation.
         """
-        current_period_end = timezone.now()
-        current_period_start = current_period_end - timedelta(days=30)
-        previous_period_start = current_period_start - timedelta(days=30)
-
-        # Current period metrics
-        current_income = Invoice.objects.filter(
-            company=company,
-            issue_date__range=[current_period_start, current_period_end],
-            status='PAID'
-        ).aggregate(Sum('total_amount'))['total_amount__sum'] or 0
-
-        current_expenses = Expense.objects.filter(
-            company=company,
-            date__range=[current_period_start, current_period_end]
-        ).aggregate(Sum('amount'))['amount__sum'] or 0
-
-        # Previous period metrics
-        previous_income = Invoice.objects.filter(
-            company=company,
-            issue_date__range=[previous_period_start, current_period_start],
-            status='PAID'
-        ).aggregate(Sum('total_amount'))['total_amount__sum'] or 1  # Avoid division by zero
-
-        previous_expenses = Expense.objects.filter(
-            company=company,
-            date__range=[previous_period_start, current_period_start]
-        ).aggregate(Sum('amount'))['amount__sum'] or 1
-
-        # Outstanding invoices
-        outstanding = Invoice.objects.filter(
-            company=company,
-            status='SENT'
-        ).aggregate(
-            total=Sum('total_amount'),
-            count=Count('id')
+        period = period or RollingPeriod()
+        previous_period_start, current_period_start, current_period_end = period.bounds()
+        today = timezone.now().date()
+
+        current = Q(issue_date__range=[current_period_start, current_period_end])
+        previous = Q(issue_date__range=[previous_period_start, current_period_start])
+        sent = Q(status='SENT')
+        overdue = sent & Q(due_date__lt=today)
+
+        invoice_metrics = Invoice.objects.filter(company=company).aggregate(
+            current_income=Sum('total_amount', filter=current & Q(status='PAID')),
+            previous_income=Sum('total_amount', filter=previous & Q(status='PAID')),
+            outstanding_total=Sum('total_amount', filter=sent),
+            outstanding_count=Count('id', filter=sent),
+            overdue_total=Sum('total_amount', filter=overdue),
+            overdue_count=Count('id', filter=overdue)
         )
 
-        # Overdue invoices
-        overdue = Invoice.objects.filter(
-            company=company,
-            status='SENT',
-            due_date__lt=timezone.now()
-        ).aggregate(
-            total=Sum('total_amount'),
-            count=Count('id')
+        expense_metrics = Expense.objects.filter(company=company).aggregate(
+            current_expenses=Sum('amount', filter=Q(
+                date__range=[current_period_start, current_period_end]
+            )),
+            previous_expenses=Sum('amount', filter=Q(
+                date__range=[previous_period_start, current_period_start]
+            ))
         )
 
+        current_income = invoice_metrics['current_income'] or 0
+        previous_income = invoice_metrics['previous_income'] or 1  # Avoid division by zero
+        current_expenses = expense_metrics['current_expenses'] or 0
+        previous_expenses = expense_metrics['previous_expenses'] or 1
+
         return {
             'total_income': current_income,
             'total_expenses': current_expenses,
             'income_trend': ((current_income - previous_income) / previous_income) * 100,
             'expense_trend': ((current_expenses - previous_expenses) / previous_expenses) * 100,
-            'outstanding_invoices': outstanding['total'] or 0,
-            'pending_invoices_count': outstanding['count'] or 0,
-            'overdue_invoices': overdue['total'] or 0,
-            'overdue_invoices_count': overdue['count'] or 0,
+            'outstanding_invoices': invoice_metrics['outstanding_total'] or 0,
+            'pending_invoices_count': invoice_metrics['outstanding_count'] or 0,
+            'overdue_invoices': invoice_metrics['overdue_total'] or 0,
+            'overdue_invoices_count': invoice_metrics['overdue_count'] or 0,
             'net_cash_flow': current_income - current_expenses,
             'cash_flow_trend': (((current_income - current_expenses) - 
                                (previous_income - previous_expenses)) / 
@@ -128,48 +132,23 @@ class AnalyticsService:
     @staticmethod
     def get_cash_flow_trend(company, months=6):
         """
-        Get cash flow trend over specified number of months
+        Get cash flow trend over specified number of months from the monthly
+        rollup. Income is the completed payments received in each month.
         """
-        end_date = timezone.now()
+        end_date = timezone.now().date()
         start_date = end_date - timedelta(days=30 * months)
 
-        income_by_month = Invoice.objects.filter(
-            company=company,
-            status='PAID',
-            payment_date__range=[start_date, end_date]
-        ).annotate(
-            month=TruncMonth('payment_date')
-        ).values('month').annotate(
-            total=Sum('total_amount')
-        ).order_by('month')
-
-        expenses_by_month = Expense.objects.filter(
-            company=company,
-            date__range=[start_date, end_date]
-        ).annotate(
-            month=TruncMonth('date')
-        ).values('month').annotate(
-            total=Sum('amount')
-        ).order_by('month')
-
-        # Combine into cash flow trend
-        trend = {}
-        for income in income_by_month:
-            month = income['month'].strftime('%Y-%m')
-            trend[month] = {
-                'income': income['total'],
-                'expenses': 0,
-                'net': income['total']
-            }
-
-        for expense in expenses_by_month:
-            month = expense['month'].strftime('%Y-%m')
-            if month not in trend:
-                trend[month] = {'income': 0, 'expenses': 0, 'net': 0}
-            trend[month]['expenses'] = expense['total']
-            trend[month]['net'] = trend[month]['income'] - expense['total']
-
-        return [{'month': k, **v} for k, v in sorted(trend.items())]
+        trend = []
+        for month in RollupService.by_month(company, start_date, end_date):
+            if not (month['inflow'] or month['expense']):
+                continue
+            trend.append({
+                'month': month['month'].strftime('%Y-%m'),
+                'income': month['inflow'],
+                'expenses': month['expense'],
+                'net': month['inflow'] - month['expense']
+            })
+        return trend
 
     @staticmethod
     def get_payment_statistics(company):
@@ -0,0 +1,359 @@
+from datetime import timedelta
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Sum
+from django.utils import timezone
+import logging
+import time
+from ..models import Company, Invoice, Expense, Client, PaymentRecord
+from .analytics_service import AnalyticsService
+from .rollup_service import RollupService
+
+logger = logging.getLogger(__name__)
+
+class DashboardService:
+    """
+    Per-widget dashboard cache kept fresh by events instead of expiry.
+
+    Each company has a version counter per source model, bumped when a
+    change to an invoice, expense, payment or client commits. A cached
+    widget is stamped with the date and the versions of its sources at the
+    time it was computed. Reads always answer from the cache: an outdated
+    widget is served as is and queued for recomputation by the
+    refresh_dashboard task, which writes also queue, so widgets catch up
+    within seconds of a change. Only a company's first read computes
+    widgets in the request.
+
+    Settings:
+        DASHBOARD_CACHE_TIMEOUT: seconds a widget stays cached without
+            being read (default 7 days)
+        DASHBOARD_REFRESH_TIMEOUT: seconds after which a queued refresh
+            that never ran may be queued again (default 60)
+    """
+
+    KEY_PREFIX = 'dashboard'
+
+    # Widget name -> models whose changes make it outdated
+    WIDGETS = {
+        'revenue_metrics': ('invoice',),
+        'expense_metrics': ('expense',),
+        'invoice_metrics': ('invoice',),
+        'client_metrics': ('client', 'invoice'),
+        'recent_invoices': ('invoice', 'client'),
+        'recent_expenses': ('expense',),
+        'recent_payments': ('paymentrecord', 'invoice'),
+        'revenue_trend': ('invoice',),
+        'expense_breakdown': ('expense',),
+        'cash_flow': ('paymentrecord', 'expense'),
+    }
+
+    @staticmethod
+    def get_timeout():
+        return getattr(settings, 'DASHBOARD_CACHE_TIMEOUT', 7 * 24 * 3600)
+
+    @staticmethod
+    def version_key(company_id, source):
+        return f"{DashboardService.KEY_PREFIX}:{company_id}:version:{source}"
+
+    @staticmethod
+    def widget_key(company_id, name):
+        return f"{DashboardService.KEY_PREFIX}:{company_id}:widget:{name}"
+
+    @staticmethod
+    def queued_key(company_id):
+        return f"{DashboardService.KEY_PREFIX}:{company_id}:queued"
+
+    @staticmethod
+    def get_versions(company_id, sources):
+        """
+        Get the current version of each source. Missing counters start at
+        the current time, so a counter lost from the cache never comes
+        back to a value an old widget was stamped with.
+        """
+        keys = {source: DashboardService.version_key(company_id, source) for source in sources}
+        found = cache.get_many(keys.values())
+        versions = {}
+        for source, key in keys.items():
+            if key not in found:
+                cache.add(key, time.time_ns(), None)
+                found[key] = cache.get(key)
+            versions[source] = found[key]
+        return versions
+
+    @staticmethod
+    def get_stamp(name, versions, today):
+        return (today.isoformat(),) + tuple(
+            versions[source] for source in DashboardService.WIDGETS[name]
+        )
+
+    @staticmethod
+    def invalidate(company_id, *sources):
+        """
+        Bump the versions of the given sources of a company once the
+        current transaction commits, and queue a refresh.
+        """
+        def bump():
+            for source in sources:
+                key = DashboardService.version_key(company_id, source)
+                try:
+                    cache.incr(key)
+                except ValueError:
+                    cache.add(key, time.time_ns(), None)
+            DashboardService.schedule_refresh(company_id)
+
+        transaction.on_commit(bump)
+
+    @staticmethod
+    def schedule_refresh(company_id):
+        """Queue a refresh of a company's dashboard unless one is pending."""
+        from ..tasks import refresh_dashboard
+
+        key = DashboardService.queued_key(company_id)
+        if not cache.add(key, True, getattr(settings, 'DASHBOARD_REFRESH_TIMEOUT', 60)):
+            return
+        try:
+            refresh_dashboard.delay(company_id)
+        except Exception as e:
+            cache.delete(key)
+            logger.error(f"Error queueing dashboard refresh for company {company_id}: {str(e)}")
+
+    @staticmethod
+    def get_widgets(company, names=None):
+        """
+        Get the data of the given widgets (all by default) by name. Widgets
+        never computed are computed now; outdated ones are returned and
+        refreshed in the background.
+        """
+        names = list(names or DashboardService.WIDGETS)
+        today = timezone.now().date()
+        versions = DashboardService.get_versions(
+            company.pk,
+            {source for name in names for source in DashboardService.WIDGETS[name]}
+        )
+        keys = {name: DashboardService.widget_key(company.pk, name) for name in names}
+        cached = cache.get_many(keys.values())
+
+        widgets, missing, outdated = {}, [], False
+        for name, key in keys.items():
+            if key not in cached:
+                missing.append(name)
+                continue
+            stamp, widgets[name] = cached[key]
+            if stamp != DashboardService.get_stamp(name, versions, today):
+                outdated = True
+
+        if missing:
+            widgets.update(DashboardService.compute(company, missing, versions, today))
+        if outdated:
+            DashboardService.schedule_refresh(company.pk)
+        return widgets
+
+    @staticmethod
+    def refresh(company_id):
+        """
+        Recompute the cached widgets of a company that are outdated.
+        Returns the names of the widgets recomputed.
+        """
+        try:
+            # Changes committed from here on queue another refresh
+            cache.delete(DashboardService.queued_key(company_id))
+
+            names = list(DashboardService.WIDGETS)
+            keys = {name: DashboardService.widget_key(company_id, name) for name in names}
+            cached = cache.get_many(keys.values())
+            if not cached:
+                return []
+
+            today = timezone.now().date()
+            versions = DashboardService.get_versions(
+                company_id,
+                {source for sources in DashboardService.WIDGETS.values() for source in sources}
+            )
+            outdated = [
+                name for name, key in keys.items()
+                if key in cached and cached[key][0] != DashboardService.get_stamp(name, versions, today)
+            ]
+            company = Company.objects.filter(pk=company_id).first()
+            if company is None or not outdated:
+                return []
+
+            DashboardService.compute(company, outdated, versions, today)
+            return outdated
+        except Exception as e:
+            logger.error(f"Error refreshing dashboard for company {company_id}: {str(e)}")
+            raise
+
+    @staticmethod
+    def refresh_all():
+        """
+        Recompute the outdated widgets of every company with a cached
+        dashboard, such as after the date changes. Returns the number of
+        companies refreshed.
+        """
+        refreshed = 0
+        for company_id in Company.objects.values_list('pk', flat=True).iterator():
+            if DashboardService.refresh(company_id):
+                refreshed += 1
+        return refreshed
+
+    @staticmethod
+    def compute(company, names, versions, today):
+        """
+        Compute widgets and cache them stamped with the versions read
+        before computing, so a change committed meanwhile leaves them
+        outdated rather than lost.
+        """
+        widgets = {
+            name: getattr(DashboardService, f'get_{name}')(company, today)
+            for name in names
+        }
+        cache.set_many({
+            DashboardService.widget_key(company.pk, name): (
+                DashboardService.get_stamp(name, versions, today),
+                data
+            )
+            for name, data in widgets.items()
+        }, DashboardService.get_timeout())
+        return widgets
+
+    @staticmethod
+    def get_month_bounds(today):
+        start_of_month = today.replace(day=1)
+        end_of_month = (start_of_month + timedelta(days=32)).replace(day=1) - timedelta(days=1)
+        return start_of_month, end_of_month
+
+    @staticmethod
+    def get_revenue_metrics(company, today):
+        """Calculate revenue metrics for the dashboard."""
+        start_date, end_date = DashboardService.get_month_bounds(today)
+        return {
+            'current_month': RollupService.totals(company, start_date, end_date)['revenue'],
+
+            'overdue_amount': Invoice.objects.filter(
+                company=company,
+                status='OVERDUE'
+            ).aggregate(total=Sum('total_amount'))['total'] or 0,
+
+            'pending_amount': Invoice.objects.filter(
+                company=company,
+                status__in=['SENT', 'PARTIALLY_PAID']
+            ).aggregate(total=Sum('total_amount'))['total'] or 0
+        }
+
+    @staticmethod
+    def get_expense_metrics(company, today):
+        """Calculate expense metrics for the dashboard."""
+        start_date, end_date = DashboardService.get_month_bounds(today)
+        return {
+            'current_month': Expense.objects.filter(
+                company=company,
+                date__range=[start_date, end_date]
+            ).aggregate(total=Sum('amount'))['total'] or 0,
+
+            'pending_approval': Expense.objects.filter(
+                company=company,
+                approved_by__isnull=True
+            ).count(),
+
+            'by_category': list(Expense.objects.filter(
+                company=company,
+                date__range=[start_date, end_date]
+            ).values('category__name').annotate(
+                total=Sum('amount')
+            ).order_by('-total')[:5])
+        }
+
+    @staticmethod
+    def get_invoice_metrics(company, today):
+        """Calculate invoice metrics for the dashboard."""
+        return {
+            'total_outstanding': Invoice.objects.filter(
+                company=company,
+                status__in=['SENT', 'OVERDUE', 'PARTIALLY_PAID']
+            ).count(),
+
+            'overdue_count': Invoice.objects.filter(
+                company=company,
+                status='OVERDUE'
+            ).count(),
+
+            'draft_count': Invoice.objects.filter(
+                company=company,
+                status='DRAFT'
+            ).count()
+        }
+
+    @staticmethod
+    def get_client_metrics(company, today):
+        """Calculate client metrics for the dashboard."""
+        return {
+            'total_active': Client.objects.filter(
+                company=company,
+                is_active=True
+            ).count(),
+
+            'new_this_month': Client.objects.filter(
+                company=company,
+                created_at__month=today.month
+            ).count(),
+
+            'with_overdue': Client.objects.filter(
+                company=company,
+                invoices__status='OVERDUE'
+            ).distinct().count()
+        }
+
+    @staticmethod
+    def get_recent_invoices(company, today, limit=5):
+        """Get recent invoices for the dashboard."""
+        return list(Invoice.objects.filter(
+            company=company
+        ).order_by(
+            '-created_at'
+        )[:limit].values(
+            'id', 'invoice_number', 'client__name',
+            'total_amount', 'status', 'due_date'
+        ))
+
+    @staticmethod
+    def get_recent_expenses(company, today, limit=5):
+        """Get recent expenses for the dashboard."""
+        return list(Expense.objects.filter(
+            company=company
+        ).order_by(
+            '-created_at'
+        )[:limit].values(
+            'id', 'category__name', 'amount',
+            'date', 'vendor'
+        ))
+
+    @staticmethod
+    def get_recent_payments(company, today, limit=5):
+        """Get recent payments for the dashboard."""
+        return list(PaymentRecord.objects.filter(
+            invoice__company=company
+        ).order_by(
+            '-created_at'
+        )[:limit].values(
+            'id', 'invoice__invoice_number',
+            'amount', 'payment_date', 'payment_method'
+        ))
+
+    @staticmethod
+    def get_revenue_trend(company, today):
+        """Generate revenue trend data for charts."""
+        return [
+            {'month': month['month'].strftime('%Y-%m'), 'revenue': month['revenue']}
+            for month in RollupService.by_month(company, today - timedelta(days=180), today)
+        ]
+
+    @staticmethod
+    def get_expense_breakdown(company, today):
+        """Generate expense breakdown data for charts."""
+        return AnalyticsService.get_expense_breakdown(company, today.replace(day=1))
+
+    @staticmethod
+    def get_cash_flow(company, today):
+        """Generate cash flow data for charts."""
+        return AnalyticsService.get_cash_flow_trend(company, months=3)
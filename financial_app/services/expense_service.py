@@ -4,6 +4,7 @@ from django.db.models import Sum
 from django.core.files.storage import default_storage
 import logging
 from ..models import Expense, ExpenseCategory
+from .dashboard_service import DashboardService
 
 logger = logging.getLogger(__name__)
 
@@ -111,7 +112,10 @@ class ExpenseService:
         Bulk categorize multiple expenses.
         """
         try:
-            expenses.update(category=category)
+            company_ids = set(expenses.values_list('company_id', flat=True))
+            expenses.update(category=category, updated_at=timezone.now())
+            for company_id in company_ids:
+                DashboardService.invalidate(company_id, 'expense')
         except Exception as e:
             logger.error("Error bulk categorizing expenses: {str(e)}")
             raise
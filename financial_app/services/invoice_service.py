@@ -4,10 +4,11 @@ from django.utils import timezone
 from django.template.loader import render_to_string
 from django.core.mail import EmailMessage
 from django.conf import settings
+from django.db import transaction
 from django.db.models import Sum
-import pdfkit
 import logging
-from ..models import Invoice, PaymentRecord
+from ..models import Invoice, InvoiceItem, PaymentRecord
+from .pdf_service import InvoicePdfService
 
 logger = logging.getLogger(__name__)
 
@@ -32,39 +33,120 @@ class InvoiceService:
             )
 
             # Create invoice items
-            for item in items:
-                invoice.items.create(
-                    description=item['description'],
-                    quantity=item['quantity'],
-                    unit_price=item['unit_price'],
-                    tax_rate=item.get('tax_rate', Decimal('0'))
-                )
+            InvoiceService.add_items(invoice, items)
 
             return invoice
         except Exception as e:
             logger.error(f"Error creating invoice: {str(e)}")
             raise
 
+    ITEM_FIELDS = ('description', 'quantity', 'unit_price', 'tax_rate')
+    ITEM_BATCH_SIZE = 500
+
     @staticmethod
-    def generate_pdf(invoice):
+    def build_item(invoice, item):
         """
-        Generate PDF version of the invoice.
+        Build an unsaved invoice item with its total calculated in Python.
         """
-        try:
-            context = {
-                'invoice': invoice,
-                'company': invoice.company,
-                'client': invoice.client,
-                'items': invoice.items.all()
-            }
+        line = InvoiceItem(
+            invoice=invoice,
+            description=item['description'],
+            quantity=item['quantity'],
+            unit_price=item['unit_price'],
+            tax_rate=item.get('tax_rate', Decimal('0'))
+        )
+        line.total = line.calculate_total()
+        return line
 
-            html_content = render_to_string(
-                'financial_app/pdf/invoice_template.html',
-                context
+    @staticmethod
+    def add_items(invoice, items):
+        """
+        Add items to an invoice with one bulk insert and one totals write.
+        """
+        lines = [InvoiceService.build_item(invoice, item) for item in items]
+        if not lines:
+            return []
+
+        with transaction.atomic():
+            InvoiceItem.objects.bulk_create(
+                lines,
+                batch_size=InvoiceService.ITEM_BATCH_SIZE
             )
+            invoice.apply_item_delta(sum(line.total for line in lines))
+        return lines
 
-            pdf_file = pdfkit.from_string(html_content, False)
-            return pdf_file
+    @staticmethod
+    def sync_items(invoice, items, save=True):
+        """
+        Make the invoice items match the given list, writing only the
+        differences. Items are matched by id, or for items without an id,
+        by identical content. Unmatched existing items are deleted.
+        When save is False the caller is responsible for saving the invoice.
+        """
+        existing = {line.pk: line for line in invoice.items.all()}
+        unclaimed = {}
+        for line in existing.values():
+            key = tuple(getattr(line, field) for field in InvoiceService.ITEM_FIELDS)
+            unclaimed.setdefault(key, []).append(line)
+
+        to_create, to_update, kept = [], [], []
+        for item in items:
+            candidate = InvoiceService.build_item(invoice, item)
+            line = existing.pop(item.get('id'), None)
+            if line is None:
+                key = tuple(getattr(candidate, field) for field in InvoiceService.ITEM_FIELDS)
+                matches = [m for m in unclaimed.get(key, []) if m.pk in existing]
+                if matches:
+                    line = existing.pop(matches[0].pk)
+
+            if line is None:
+                to_create.append(candidate)
+                kept.append(candidate)
+                continue
+
+            changed = False
+            for field in InvoiceService.ITEM_FIELDS + ('total',):
+                value = getattr(candidate, field)
+                if getattr(line, field) != value:
+                    setattr(line, field, value)
+                    changed = True
+            if changed:
+                to_update.append(line)
+            kept.append(line)
+
+        with transaction.atomic():
+            # Totals are written once below from the final set of lines
+            with invoice.deferred_totals(recalculate=False):
+                if existing:
+                    InvoiceItem.objects.filter(pk__in=list(existing)).delete()
+                if to_update:
+                    now = timezone.now()
+                    for line in to_update:
+                        line.updated_at = now
+                    InvoiceItem.objects.bulk_update(
+                        to_update,
+                        InvoiceService.ITEM_FIELDS + ('total', 'updated_at'),
+                        batch_size=InvoiceService.ITEM_BATCH_SIZE
+                    )
+                if to_create:
+                    InvoiceItem.objects.bulk_create(
+                        to_create,
+                        batch_size=InvoiceService.ITEM_BATCH_SIZE
+                    )
+
+            invoice.subtotal = sum((line.total for line in kept), Decimal('0'))
+            if save:
+                invoice.save(update_fields=Invoice.TOTAL_FIELDS)
+        return kept
+
+    @staticmethod
+    def generate_pdf(invoice):
+        """
+        Generate PDF version of the invoice, reusing the cached copy when
+        the invoice has not changed.
+        """
+        try:
+            return InvoicePdfService.render(invoice)
         except Exception as e:
             logger.error(f"Error generating PDF for invoice {invoice.id}: {str(e)}")
             raise
@@ -0,0 +1,208 @@
+from django.conf import settings
+from django.core.mail import EmailMessage, EmailMultiAlternatives, get_connection
+from django.db.models import F
+from django.template.loader import render_to_string
+from django.utils import timezone
+import base64
+import logging
+import time
+from ..models import Invoice
+from .pdf_service import InvoicePdfService
+
+logger = logging.getLogger(__name__)
+
+class MailService:
+    """
+    Batched mail dispatch. Messages are grouped into batches, each batch is
+    sent by a Celery task over one SMTP connection, and messages that fail
+    are retried with exponential backoff.
+
+    Invoice PDFs are attached by the task from the PDF cache, so only
+    invoice ids travel through the broker, and reminder tracking of an
+    invoice is updated once its reminder has been delivered.
+
+    Settings:
+        MAIL_BATCH_SIZE: messages per task and connection (default 200)
+        MAIL_RATE_LIMIT: messages per second per task, 0 for no limit
+        MAIL_MAX_RETRIES: retries of a failed message (default 3)
+        MAIL_RETRY_BACKOFF: seconds before the first retry (default 30)
+    """
+
+    @staticmethod
+    def get_setting(name, default):
+        return getattr(settings, name, default)
+
+    @staticmethod
+    def build_message(subject, template, context, to, cc=None, attachments=None,
+                      invoice_pdfs=(), reminder_for=None):
+        """
+        Render an HTML email template into a message ready to dispatch.
+
+        invoice_pdfs are the ids of invoices whose PDF is attached when the
+        message is sent, and reminder_for the id of the invoice whose
+        reminder tracking is updated once it has been delivered.
+        """
+        message = EmailMessage(
+            subject=subject,
+            body=render_to_string(template, context),
+            from_email=settings.DEFAULT_FROM_EMAIL,
+            to=to,
+            cc=cc
+        )
+        message.content_subtype = 'html'
+        for attachment in attachments or []:
+            message.attach(*attachment)
+        message.invoice_pdfs = list(invoice_pdfs)
+        message.reminder_for = reminder_for
+        return message
+
+    @staticmethod
+    def serialize(message):
+        """Convert a message into JSON serializable data for a task."""
+        attachments = []
+        for filename, content, mimetype in message.attachments:
+            if isinstance(content, str):
+                content = content.encode()
+            attachments.append([filename, base64.b64encode(content).decode(), mimetype])
+        return {
+            'subject': message.subject,
+            'body': message.body,
+            'from_email': message.from_email,
+            'to': list(message.to),
+            'cc': list(message.cc),
+            'bcc': list(message.bcc),
+            'reply_to': list(message.reply_to),
+            'headers': dict(message.extra_headers),
+            'content_subtype': message.content_subtype,
+            'alternatives': [list(alternative) for alternative in getattr(message, 'alternatives', [])],
+            'attachments': attachments,
+            'invoice_pdfs': list(getattr(message, 'invoice_pdfs', [])),
+            'reminder_for': getattr(message, 'reminder_for', None)
+        }
+
+    @staticmethod
+    def deserialize(data):
+        """Rebuild a message from serialize()."""
+        message = EmailMultiAlternatives(
+            subject=data['subject'],
+            body=data['body'],
+            from_email=data['from_email'],
+            to=data['to'],
+            cc=data['cc'],
+            bcc=data['bcc'],
+            reply_to=data['reply_to'],
+            headers=data['headers']
+        )
+        message.content_subtype = data['content_subtype']
+        for content, mimetype in data['alternatives']:
+            message.attach_alternative(content, mimetype)
+        for filename, content, mimetype in data['attachments']:
+            message.attach(filename, base64.b64decode(content), mimetype)
+        message.invoice_pdfs = data.get('invoice_pdfs', [])
+        message.reminder_for = data.get('reminder_for')
+        return message
+
+    @staticmethod
+    def load_messages(messages):
+        """
+        Rebuild serialized messages and attach their invoice PDFs, rendering
+        those not cached in one pass. Returns (serialized, message) pairs
+        ready to send and the serialized messages whose PDFs could not be
+        rendered.
+        """
+        invoice_ids = {pk for data in messages for pk in data.get('invoice_pdfs', [])}
+        invoices = {}
+        pdfs = {}
+        if invoice_ids:
+            invoices = Invoice.objects.in_bulk(invoice_ids)
+            pdfs = InvoicePdfService.render_many(invoices.values(), fail_silently=True)
+
+        loaded, unavailable = [], []
+        for data in messages:
+            if any(pk not in pdfs for pk in data.get('invoice_pdfs', [])):
+                unavailable.append(data)
+                continue
+            message = MailService.deserialize(data)
+            for pk in message.invoice_pdfs:
+                message.attach(
+                    f'invoice_{invoices[pk].invoice_number}.pdf',
+                    pdfs[pk],
+                    'application/pdf'
+                )
+            loaded.append((data, message))
+        return loaded, unavailable
+
+    @staticmethod
+    def record_delivery(messages):
+        """Update the reminder tracking of the invoices messages remind of."""
+        invoice_ids = [message.reminder_for for message in messages if message.reminder_for]
+        if invoice_ids:
+            # Without touching updated_at, which would invalidate the cached
+            # PDF of an otherwise unchanged invoice
+            Invoice.objects.filter(pk__in=invoice_ids).update(
+                last_reminder_sent=timezone.now(),
+                reminder_count=F('reminder_count') + 1
+            )
+
+    @staticmethod
+    def send_messages(messages, rate=None, connection=None):
+        """
+        Send messages over one connection, at most rate messages per second.
+        A failure closes the connection and the next message reopens it.
+        Returns the list of messages that could not be sent.
+        """
+        if rate is None:
+            rate = MailService.get_setting('MAIL_RATE_LIMIT', 0)
+        interval = 1.0 / rate if rate else 0
+        connection = connection or get_connection()
+
+        failed = []
+        next_send = time.monotonic()
+        try:
+            for message in messages:
+                if interval:
+                    delay = next_send - time.monotonic()
+                    if delay > 0:
+                        time.sleep(delay)
+                    next_send = max(next_send, time.monotonic()) + interval
+
+                try:
+                    connection.open()
+                    connection.send_messages([message])
+                except Exception as e:
+                    logger.error(f"Error sending email to {', '.join(message.to)}: {str(e)}")
+                    failed.append(message)
+                    try:
+                        connection.close()
+                    except Exception:
+                        pass
+        finally:
+            connection.close()
+        return failed
+
+    @staticmethod
+    def dispatch(messages):
+        """
+        Queue messages for delivery, one Celery task per batch. Returns the
+        number of batches queued.
+        """
+        from ..tasks import send_mail_batch
+
+        batch_size = MailService.get_setting('MAIL_BATCH_SIZE', 200)
+        batch = []
+        batches = 0
+        for message in messages:
+            batch.append(MailService.serialize(message))
+            if len(batch) >= batch_size:
+                send_mail_batch.delay(batch)
+                batches += 1
+                batch = []
+        if batch:
+            send_mail_batch.delay(batch)
+            batches += 1
+        return batches
+
+    @staticmethod
+    def get_retry_delay(attempt):
+        """Seconds to wait before retry number attempt + 1."""
+        return MailService.get_setting('MAIL_RETRY_BACKOFF', 30) * (2 ** attempt)
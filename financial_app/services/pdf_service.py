@@ -0,0 +1,220 @@
+from concurrent.futures import ThreadPoolExecutor
+from django.conf import settings
+from django.db.models import Count, Max
+from django.db.models import prefetch_related_objects
+from django.template.loader import render_to_string
+import glob
+import hashlib
+import logging
+import os
+import threading
+import pdfkit
+from ..models import Invoice
+
+logger = logging.getLogger(__name__)
+
+_executor = None
+_configuration = None
+_lock = threading.Lock()
+
+class InvoicePdfService:
+    """
+    Render invoice PDFs on a bounded pool of rendering threads, shared by
+    every caller in the process, with a file cache under MEDIA_ROOT/cache.
+
+    wkhtmltopdf runs as a child process per document, so threads are enough
+    to render in parallel; templates are rendered in the calling thread,
+    which owns the database connection. A cached PDF is keyed by invoice
+    id, the updated_at of the invoice, its company and its client, and the
+    state of its items, so an unchanged invoice is never rendered twice.
+    Writing a PDF removes the older versions of the same invoice, and
+    prune_cache keeps the cache under PDF_CACHE_MAX_BYTES.
+    """
+
+    CACHE_DIR = os.path.join('cache', 'invoice_pdfs')
+
+    @staticmethod
+    def get_executor():
+        """Get the process wide rendering pool, creating it on first use."""
+        global _executor
+        with _lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(
+                    max_workers=getattr(settings, 'PDF_RENDER_WORKERS', os.cpu_count() or 4),
+                    thread_name_prefix='invoice-pdf'
+                )
+            return _executor
+
+    @staticmethod
+    def get_configuration():
+        """Resolve the wkhtmltopdf binary once rather than per document."""
+        global _configuration
+        with _lock:
+            if _configuration is None:
+                _configuration = pdfkit.configuration(
+                    wkhtmltopdf=getattr(settings, 'WKHTMLTOPDF_PATH', '')
+                )
+            return _configuration
+
+    @staticmethod
+    def render_html(invoice):
+        """Render the invoice template to HTML."""
+        context = {
+            'invoice': invoice,
+            'company': invoice.company,
+            'client': invoice.client,
+            'items': invoice.items.all()
+        }
+        return render_to_string('financial_app/pdf/invoice_template.html', context)
+
+    @staticmethod
+    def _render_pdf(html):
+        return pdfkit.from_string(
+            html,
+            False,
+            configuration=InvoicePdfService.get_configuration()
+        )
+
+    @staticmethod
+    def get_cache_paths(invoices):
+        """
+        Get the cache file path of each invoice, keyed by invoice id, with
+        one query for the state of everything the PDF renders.
+        """
+        states = {
+            row['pk']: row
+            for row in Invoice.objects.filter(
+                pk__in=[invoice.pk for invoice in invoices]
+            ).values(
+                'pk', 'updated_at', 'company__updated_at', 'client__updated_at'
+            ).annotate(
+                item_count=Count('items'),
+                items_updated=Max('items__updated_at')
+            ).order_by()
+        }
+
+        paths = {}
+        for invoice in invoices:
+            state = states.get(invoice.pk, {})
+            fingerprint = (
+                f"{invoice.pk}:{state.get('updated_at')}:"
+                f"{state.get('company__updated_at')}:{state.get('client__updated_at')}:"
+                f"{state.get('item_count', 0)}:{state.get('items_updated')}"
+            )
+            digest = hashlib.sha256(fingerprint.encode()).hexdigest()[:32]
+            paths[invoice.pk] = os.path.join(
+                settings.MEDIA_ROOT,
+                InvoicePdfService.CACHE_DIR,
+                f"invoice_{invoice.pk}_{digest}.pdf"
+            )
+        return paths
+
+    @staticmethod
+    def read_cached(path):
+        try:
+            with open(path, 'rb') as pdf_file:
+                return pdf_file.read()
+        except FileNotFoundError:
+            return None
+
+    @staticmethod
+    def write_cached(path, pdf):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # Write then rename so concurrent readers never see a partial file
+        temp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(temp_path, 'wb') as pdf_file:
+            pdf_file.write(pdf)
+        os.replace(temp_path, path)
+
+        # Older versions of the invoice are never read again
+        prefix = os.path.basename(path).rsplit('_', 1)[0]
+        for stale_path in glob.glob(os.path.join(os.path.dirname(path), f"{prefix}_*.pdf")):
+            if stale_path != path:
+                try:
+                    os.remove(stale_path)
+                except FileNotFoundError:
+                    pass
+
+    @staticmethod
+    def prune_cache(max_bytes=None):
+        """
+        Remove the least recently written PDFs until the cache holds at most
+        max_bytes (PDF_CACHE_MAX_BYTES, 500 MB by default). Returns the
+        number of files removed.
+        """
+        if max_bytes is None:
+            max_bytes = getattr(settings, 'PDF_CACHE_MAX_BYTES', 500 * 1024 * 1024)
+        cache_dir = os.path.join(settings.MEDIA_ROOT, InvoicePdfService.CACHE_DIR)
+
+        files = []
+        for path in glob.glob(os.path.join(cache_dir, '*.pdf')):
+            try:
+                stat = os.stat(path)
+            except FileNotFoundError:
+                continue
+            files.append((stat.st_mtime, stat.st_size, path))
+
+        total = sum(size for _, size, _ in files)
+        removed = 0
+        for _, size, path in sorted(files):
+            if total <= max_bytes:
+                break
+            try:
+                os.remove(path)
+                removed += 1
+            except FileNotFoundError:
+                pass
+            total -= size
+        return removed
+
+    @staticmethod
+    def render_many(invoices, fail_silently=False):
+        """
+        Render PDFs for many invoices and return them keyed by invoice id.
+        Cached PDFs are reused and the rest are rendered in parallel. With
+        fail_silently, invoices that fail to render are logged and left out
+        of the result instead of raising.
+        """
+        invoices = list(invoices)
+        paths = InvoicePdfService.get_cache_paths(invoices)
+
+        pdfs = {}
+        missing = []
+        for invoice in invoices:
+            pdf = InvoicePdfService.read_cached(paths[invoice.pk])
+            if pdf is None:
+                missing.append(invoice)
+            else:
+                pdfs[invoice.pk] = pdf
+
+        if not missing:
+            return pdfs
+
+        prefetch_related_objects(missing, 'company', 'client', 'items')
+        executor = InvoicePdfService.get_executor()
+        futures = {}
+        errors = []
+        for invoice in missing:
+            try:
+                html = InvoicePdfService.render_html(invoice)
+                futures[invoice.pk] = executor.submit(InvoicePdfService._render_pdf, html)
+            except Exception as e:
+                errors.append((invoice.pk, e))
+
+        for invoice_id, future in futures.items():
+            try:
+                pdfs[invoice_id] = future.result()
+                InvoicePdfService.write_cached(paths[invoice_id], pdfs[invoice_id])
+            except Exception as e:
+                errors.append((invoice_id, e))
+
+        for invoice_id, error in errors:
+            logger.error(f"Error generating PDF for invoice {invoice_id}: {str(error)}")
+        if errors and not fail_silently:
+            raise errors[0][1]
+        return pdfs
+
+    @staticmethod
+    def render(invoice):
+        """Render the PDF for one invoice."""
+        return InvoicePdfService.render_many([invoice])[invoice.pk]
@@ -0,0 +1,262 @@
+from decimal import Decimal
+from datetime import timedelta
+from django.db import transaction
+from django.db.models import prefetch_related_objects
+from django.utils import timezone
+import logging
+from ..models import (
+    Company, Invoice, InvoiceItem, InvoiceNumberSequence,
+    Expense, CompanyMonthlyRollup
+)
+from .dashboard_service import DashboardService
+
+logger = logging.getLogger(__name__)
+
+def calculate_next_recurring_date(current_date, frequency):
+    """Helper function to calculate next recurring date."""
+    if frequency == 'DAILY':
+        return current_date + timedelta(days=1)
+    elif frequency == 'WEEKLY':
+        return current_date + timedelta(weeks=1)
+    elif frequency == 'MONTHLY':
+        next_month = current_date + timedelta(days=32)
+        return next_month.replace(day=1)
+    elif frequency == 'QUARTERLY':
+        next_quarter = current_date + timedelta(days=92)
+        return next_quarter.replace(day=1)
+    elif frequency == 'YEARLY':
+        try:
+            return current_date.replace(year=current_date.year + 1)
+        except ValueError:
+            # 29 February
+            return current_date.replace(year=current_date.year + 1, day=28)
+    return None
+
+class RecurringService:
+    """
+    Generate records from recurring templates in bulk. Due templates are
+    claimed a chunk at a time with SELECT ... FOR UPDATE SKIP LOCKED, so
+    several workers can process the same company without duplicates.
+    """
+
+    CHUNK_SIZE = 500
+
+    @staticmethod
+    def due_invoice_templates(today):
+        return Invoice.objects.filter(
+            is_recurring=True,
+            next_recurring_date__lte=today
+        )
+
+    @staticmethod
+    def companies_with_due_invoices(today):
+        """Get the ids of companies with recurring invoices due."""
+        return list(
+            RecurringService.due_invoice_templates(today)
+            .values_list('company_id', flat=True)
+            .distinct()
+            .order_by()
+        )
+
+    @staticmethod
+    def generate_invoices(company_id, today, chunk_size=None):
+        """
+        Clone every due recurring invoice of a company into a new draft
+        invoice and advance the templates. Returns the number of invoices
+        created.
+        """
+        try:
+            company = Company.objects.get(pk=company_id)
+            created = 0
+            while True:
+                count = RecurringService._generate_invoice_chunk(
+                    company,
+                    today,
+                    chunk_size or RecurringService.CHUNK_SIZE
+                )
+                if not count:
+                    return created
+                created += count
+        except Exception as e:
+            logger.error(f"Error generating recurring invoices for company {company_id}: {str(e)}")
+            raise
+
+    @staticmethod
+    def _generate_invoice_chunk(company, today, chunk_size):
+        with transaction.atomic():
+            templates = list(
+                RecurringService.due_invoice_templates(today)
+                .filter(company=company)
+                .select_for_update(skip_locked=True)
+                .order_by('pk')[:chunk_size]
+            )
+            if not templates:
+                return 0
+            prefetch_related_objects(templates, 'items')
+
+            numbers = InvoiceNumberSequence.next_numbers(company.pk, len(templates), today)
+            due_date = today + timedelta(days=company.default_payment_terms)
+
+            # Totals are computed here once instead of per item save
+            invoices = []
+            for template, number in zip(templates, numbers):
+                subtotal = sum((item.total for item in template.items.all()), Decimal('0'))
+                tax_amount = subtotal * Decimal(template.tax_rate) / Decimal('100')
+                invoices.append(Invoice(
+                    company=company,
+                    client_id=template.client_id,
+                    invoice_number=number,
+                    status='DRAFT',
+                    issue_date=today,
+                    due_date=due_date,
+                    tax_rate=template.tax_rate,
+                    subtotal=subtotal,
+                    tax_amount=tax_amount,
+                    total_amount=subtotal + tax_amount,
+                    notes=template.notes,
+                    terms=template.terms,
+                    footer=template.footer
+                ))
+            Invoice.objects.bulk_create(invoices)
+            if invoices[0].pk is None:
+                # Backends that cannot return ids from a bulk insert
+                ids = dict(Invoice.objects.filter(
+                    company=company,
+                    invoice_number__in=numbers
+                ).values_list('invoice_number', 'pk'))
+                for invoice in invoices:
+                    invoice.pk = ids[invoice.invoice_number]
+
+            InvoiceItem.objects.bulk_create([
+                InvoiceItem(
+                    invoice=invoice,
+                    description=item.description,
+                    quantity=item.quantity,
+                    unit_price=item.unit_price,
+                    tax_rate=item.tax_rate,
+                    total=item.total
+                )
+                for template, invoice in zip(templates, invoices)
+                for item in template.items.all()
+            ], batch_size=1000)
+
+            now = timezone.now()
+            for template in templates:
+                template.next_recurring_date = calculate_next_recurring_date(
+                    today,
+                    template.recurring_frequency
+                )
+                template.updated_at = now
+            Invoice.objects.bulk_update(templates, ['next_recurring_date', 'updated_at'])
+            DashboardService.invalidate(company.pk, 'invoice')
+            return len(templates)
+
+    @staticmethod
+    def due_expense_templates(today):
+        return Expense.objects.filter(
+            is_recurring=True,
+            next_recurring_date__lte=today
+        )
+
+    @staticmethod
+    def companies_with_due_expenses(today):
+        """Get the ids of companies with recurring expenses due."""
+        return list(
+            RecurringService.due_expense_templates(today)
+            .values_list('company_id', flat=True)
+            .distinct()
+            .order_by()
+        )
+
+    @staticmethod
+    def expense_occurrences(template, today):
+        """
+        Get the dates of every occurrence of a template due by today,
+        including ones missed by earlier runs, and the next date after them.
+        """
+        dates = []
+        next_date = template.next_recurring_date
+        while next_date and next_date <= today:
+            dates.append(next_date)
+            next_date = calculate_next_recurring_date(next_date, template.recurring_frequency)
+        return dates, next_date
+
+    @staticmethod
+    def materialize_expenses(today, company_id=None, templates=None, chunk_size=None):
+        """
+        Create the expenses for every due occurrence of the recurring
+        expense templates of a company (or of all companies, or of the
+        given templates) and advance the templates. Returns the created
+        expenses.
+        """
+        try:
+            queryset = RecurringService.due_expense_templates(today)
+            if company_id is not None:
+                queryset = queryset.filter(company_id=company_id)
+            if templates is not None:
+                queryset = queryset.filter(pk__in=[template.pk for template in templates])
+
+            created = []
+            while True:
+                claimed, expenses = RecurringService._materialize_expense_chunk(
+                    queryset,
+                    today,
+                    chunk_size or RecurringService.CHUNK_SIZE
+                )
+                if not claimed:
+                    return created
+                created.extend(expenses)
+        except Exception as e:
+            logger.error(f"Error materializing recurring expenses: {str(e)}")
+            raise
+
+    @staticmethod
+    def _materialize_expense_chunk(queryset, today, chunk_size):
+        with transaction.atomic():
+            templates = list(
+                queryset.select_for_update(skip_locked=True).order_by('pk')[:chunk_size]
+            )
+            if not templates:
+                return 0, []
+
+            now = timezone.now()
+            expenses = []
+            for template in templates:
+                dates, template.next_recurring_date = RecurringService.expense_occurrences(
+                    template,
+                    today
+                )
+                template.updated_at = now
+                expenses.extend(
+                    Expense(
+                        company_id=template.company_id,
+                        category_id=template.category_id,
+                        amount=template.amount,
+                        date=occurrence,
+                        description=template.description,
+                        vendor=template.vendor,
+                        payment_method=template.payment_method,
+                        tax_deductible=template.tax_deductible,
+                        created_by_id=template.created_by_id,
+                        tags=template.tags,
+                        notes=template.notes
+                    )
+                    for occurrence in dates
+                )
+
+            Expense.objects.bulk_create(expenses, batch_size=1000)
+            Expense.objects.bulk_update(
+                templates,
+                ['next_recurring_date', 'updated_at'],
+                batch_size=1000
+            )
+
+            # Bulk inserts skip the rollup signals, so apply the new rows here
+            CompanyMonthlyRollup.apply_change(None, [
+                contribution
+                for expense in expenses
+                for contribution in expense.get_rollup_contributions(expense.get_rollup_values())
+            ])
+            for company_id in {template.company_id for template in templates}:
+                DashboardService.invalidate(company_id, 'expense')
+            return len(templates), expenses
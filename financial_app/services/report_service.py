@@ -1,7 +1,7 @@
 from decimal import Decimal
 from django.utils import timezone
-from django.db.models import Sum, Count, Case, When, F, Q, Value
-from django.db.models.functions import TruncMonth, TruncYear, ExtractYear, Coalesce
+from django.db.models import Sum, Count, F, Q
+from django.db.models.functions import TruncYear, ExtractYear, Coalesce
 from django.core.files.storage import default_storage
 import csv
 import io
@@ -9,6 +9,7 @@ import logging
 from datetime import datetime, timedelta
 import xlsxwriter
 from ..models import Invoice, Expense, Client, PaymentRecord
+from .rollup_service import RollupService
 
 logger = logging.getLogger(__name__)
 
@@ -16,32 +17,18 @@ class ReportService:
     @staticmethod
     def generate_pl_statement(company, start_date, end_date):
         """
-        Generate Profit & Loss statement.
+        Generate Profit & Loss statement from the monthly rollup.
         """
         try:
-            # Calculate revenue
-            revenue_data = Invoice.objects.filter(
-                company=company,
-                status='PAID',
-                issue_date__range=[start_date, end_date]
-            ).aggregate(
-                total_revenue=Coalesce(Sum('total_amount'), Decimal('0')),
-                total_tax=Coalesce(Sum('tax_amount'), Decimal('0'))
-            )
+            totals = RollupService.totals(company, start_date, end_date)
+            revenue_data = {
+                'total_revenue': totals['revenue'],
+                'total_tax': totals['tax']
+            }
 
-            # Calculate expenses with categories
-            expenses = Expense.objects.filter(
-                company=company,
-                date__range=[start_date, end_date]
-            )
-            
-            expense_summary = expenses.values('category__name').annotate(
-                total=Coalesce(Sum('amount'), Decimal('0'))
-            ).order_by('-total')
-
-            total_expenses = expenses.aggregate(
-                total=Coalesce(Sum('amount'), Decimal('0'))
-            )['total']
+            # Expenses with categories
+            expense_summary = RollupService.expense_by_category(company, start_date, end_date)
+            total_expenses = totals['expense']
 
             # Calculate gross profit and net profit
             gross_profit = revenue_data['total_revenue'] - total_expenses
@@ -74,43 +61,25 @@ class ReportService:
     @staticmethod
     def generate_cash_flow_statement(company, start_date, end_date):
         """
-        Generate Cash Flow statement.
+        Generate Cash Flow statement from the monthly rollup.
         """
         try:
             # Operating Activities
-            # Cash inflows from payments received
-            cash_inflows = PaymentRecord.objects.filter(
-                invoice__company=company,
-                status='COMPLETED',
-                payment_date__range=[start_date, end_date]
-            ).aggregate(
-                total=Coalesce(Sum('amount'), Decimal('0'))
-            )['total']
-
-            # Cash outflows from expenses
-            cash_outflows = Expense.objects.filter(
-                company=company,
-                date__range=[start_date, end_date]
-            ).aggregate(
-                total=Coalesce(Sum('amount'), Decimal('0'))
-            )['total']
-
-            # Calculate monthly breakdown
-            monthly_cash_flow = PaymentRecord.objects.filter(
-                invoice__company=company,
-                payment_date__range=[start_date, end_date]
-            ).annotate(
-                month=TruncMonth('payment_date')
-            ).values('month').annotate(
-                inflow=Coalesce(Sum(Case(
-                    When(status='COMPLETED', then='amount'),
-                    default=Value(0)
-                )), Decimal('0')),
-                outflow=Coalesce(Sum(Case(
-                    When(status='REFUNDED', then='amount'),
-                    default=Value(0)
-                )), Decimal('0'))
-            ).order_by('month')
+            # Cash inflows from payments received, outflows from expenses
+            totals = RollupService.totals(company, start_date, end_date)
+            cash_inflows = totals['inflow']
+            cash_outflows = totals['expense']
+
+            # Monthly breakdown of completed and refunded payments
+            monthly_cash_flow = [
+                {
+                    'month': month['month'],
+                    'inflow': month['inflow'],
+                    'outflow': month['outflow']
+                }
+                for month in RollupService.by_month(company, start_date, end_date)
+                if month['inflow'] or month['outflow']
+            ]
 
             return {
                 'period_start': start_date,
@@ -0,0 +1,197 @@
+from decimal import Decimal
+from datetime import datetime, timedelta
+from django.db import transaction
+from django.db.models import Sum, Q
+from django.db.models.functions import TruncMonth
+import logging
+from ..models import (
+    Invoice, Expense, ExpenseCategory, PaymentRecord,
+    CompanyMonthlyRollup
+)
+
+logger = logging.getLogger(__name__)
+
+MEASURES = CompanyMonthlyRollup.MEASURES
+
+class RollupService:
+    """
+    Read and rebuild the CompanyMonthlyRollup fact table. Whole months in a
+    range are read from the rollup; partial months at either end are
+    aggregated from the source tables using the same definitions.
+    """
+
+    @staticmethod
+    def _to_date(value):
+        return value.date() if isinstance(value, datetime) else value
+
+    @staticmethod
+    def _next_month(month):
+        return (month.replace(day=1) + timedelta(days=32)).replace(day=1)
+
+    @staticmethod
+    def split_range(start_date, end_date):
+        """
+        Split an inclusive date range into the whole months it covers, as a
+        half-open (first_month, end_month) pair or None, and a list of
+        inclusive (start, end) ranges for the partial months around them.
+        """
+        first_month = start_date if start_date.day == 1 else RollupService._next_month(start_date)
+        end_month = RollupService._next_month(end_date)
+        if end_month - timedelta(days=1) != end_date:
+            end_month = end_date.replace(day=1)
+
+        if first_month >= end_month:
+            return None, [(start_date, end_date)]
+
+        partial = []
+        if start_date < first_month:
+            partial.append((start_date, first_month - timedelta(days=1)))
+        if end_month <= end_date:
+            partial.append((end_month, end_date))
+        return (first_month, end_month), partial
+
+    @staticmethod
+    def source_rows(company=None, start_date=None, end_date=None):
+        """
+        Aggregate invoices, expenses and payments into rollup shaped rows
+        keyed by (company_id, month, category_id).
+        """
+        def bounded(queryset, company_field, date_field):
+            if company is not None:
+                queryset = queryset.filter(**{company_field: company})
+            if start_date:
+                queryset = queryset.filter(**{f'{date_field}__gte': start_date})
+            if end_date:
+                queryset = queryset.filter(**{f'{date_field}__lte': end_date})
+            return queryset.annotate(month=TruncMonth(date_field))
+
+        rows = {}
+
+        def add(key, **measures):
+            row = rows.setdefault(key, dict.fromkeys(MEASURES, Decimal('0')))
+            for measure, amount in measures.items():
+                row[measure] += amount or 0
+
+        invoices = bounded(
+            Invoice.objects.filter(status='PAID'), 'company', 'issue_date'
+        ).values('company_id', 'month').annotate(
+            revenue=Sum('total_amount'),
+            tax=Sum('tax_amount')
+        ).order_by()
+        for row in invoices:
+            add((row['company_id'], row['month'], None),
+                revenue=row['revenue'], tax=row['tax'])
+
+        expenses = bounded(
+            Expense.objects.all(), 'company', 'date'
+        ).values('company_id', 'month', 'category_id').annotate(
+            expense=Sum('amount')
+        ).order_by()
+        for row in expenses:
+            add((row['company_id'], row['month'], row['category_id']),
+                expense=row['expense'])
+
+        payments = bounded(
+            PaymentRecord.objects.filter(status__in=['COMPLETED', 'REFUNDED']),
+            'invoice__company', 'payment_date'
+        ).values('invoice__company_id', 'month').annotate(
+            inflow=Sum('amount', filter=Q(status='COMPLETED')),
+            outflow=Sum('amount', filter=Q(status='REFUNDED'))
+        ).order_by()
+        for row in payments:
+            add((row['invoice__company_id'], row['month'], None),
+                inflow=row['inflow'], outflow=row['outflow'])
+
+        return rows
+
+    @staticmethod
+    def rows(company, start_date, end_date):
+        """
+        Get rollup rows for an inclusive date range as a list of dicts with
+        month, category_id and the measures.
+        """
+        start_date = RollupService._to_date(start_date)
+        end_date = RollupService._to_date(end_date)
+        full_months, partial_ranges = RollupService.split_range(start_date, end_date)
+
+        result = []
+        if full_months:
+            result.extend(CompanyMonthlyRollup.objects.filter(
+                company=company,
+                month__gte=full_months[0],
+                month__lt=full_months[1]
+            ).values('month', 'category_id', *MEASURES))
+
+        for partial_start, partial_end in partial_ranges:
+            source = RollupService.source_rows(company, partial_start, partial_end)
+            for (_, month, category_id), measures in source.items():
+                result.append({'month': month, 'category_id': category_id, **measures})
+        return result
+
+    @staticmethod
+    def totals(company, start_date, end_date):
+        """Get the sum of every measure over an inclusive date range."""
+        totals = dict.fromkeys(MEASURES, Decimal('0'))
+        for row in RollupService.rows(company, start_date, end_date):
+            for measure in MEASURES:
+                totals[measure] += row[measure]
+        return totals
+
+    @staticmethod
+    def by_month(company, start_date, end_date):
+        """Get the measures per month, ordered by month."""
+        months = {}
+        for row in RollupService.rows(company, start_date, end_date):
+            month = months.setdefault(row['month'], dict.fromkeys(MEASURES, Decimal('0')))
+            for measure in MEASURES:
+                month[measure] += row[measure]
+        return [{'month': month, **months[month]} for month in sorted(months)]
+
+    @staticmethod
+    def expense_by_category(company, start_date, end_date):
+        """
+        Get expense totals per category in the shape of
+        values('category__name').annotate(total=...), largest first.
+        """
+        totals = {}
+        for row in RollupService.rows(company, start_date, end_date):
+            if row['category_id'] is not None and row['expense']:
+                totals[row['category_id']] = totals.get(row['category_id'], Decimal('0')) + row['expense']
+
+        categories = ExpenseCategory.objects.in_bulk(list(totals))
+        breakdown = [
+            {'category__name': categories[category_id].name, 'total': total}
+            for category_id, total in totals.items()
+            if category_id in categories
+        ]
+        breakdown.sort(key=lambda item: item['total'], reverse=True)
+        return breakdown
+
+    @staticmethod
+    def rebuild(company=None):
+        """
+        Rebuild the rollup from the source tables for one company, or for
+        all companies when company is None.
+        """
+        try:
+            source = RollupService.source_rows(company)
+            rollups = [
+                CompanyMonthlyRollup(
+                    company_id=company_id,
+                    month=month,
+                    category_id=category_id,
+                    **measures
+                )
+                for (company_id, month, category_id), measures in source.items()
+            ]
+
+            with transaction.atomic():
+                existing = CompanyMonthlyRollup.objects.all()
+                if company is not None:
+                    existing = existing.filter(company=company)
+                existing.delete()
+                CompanyMonthlyRollup.objects.bulk_create(rollups, batch_size=1000)
+            return len(rollups)
+        except Exception as e:
+            logger.error(f"Error rebuilding monthly rollups: {str(e)}")
+            raise
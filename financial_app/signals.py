@@ -1,47 +1,76 @@
-from django.db.models.signals import post_save, pre_save, pre_delete
+from django.db.models.signals import post_save, pre_save, pre_delete, post_delete
 from django.dispatch import receiver
 from django.contrib.auth.models import User
-from django.core.mail import send_mail
-from django.template.loader import render_to_string
-from django.conf import settings
-from .models import Invoice, PaymentRecord, UserProfile, Client
-from actstream import action
+from django.core.exceptions import ObjectDoesNotExist
+from django.db import transaction
+from django.db.models import QuerySet
+import logging
+from .models import (
+    Invoice, InvoiceItem, PaymentRecord, UserProfile, Client, Company,
+    ClientBalance, Expense, CompanyMonthlyRollup, get_deferred_invoice_ids
+)
+from .api.permissions import AuthorizationContext
+from .services.activity_service import ActivityStreamService
+from .services.dashboard_service import DashboardService
+from .services.mail_service import MailService
+
+logger = logging.getLogger(__name__)
 
 @receiver(post_save, sender=User)
 def create_user_profile(sender, instance, created, **kwargs):
     if created:
         UserProfile.objects.create(user=instance)
-        action.send(instance, verb='joined ExpenseAlly')
+        ActivityStreamService.record('joined ExpenseAlly', actor=instance)
+
+@receiver(post_save, sender=UserProfile)
+@receiver(post_delete, sender=UserProfile)
+def invalidate_profile_authorization(sender, instance, **kwargs):
+    AuthorizationContext.invalidate(instance.user_id)
+
+@receiver(post_save, sender=Company)
+@receiver(post_delete, sender=Company)
+def invalidate_owner_authorization(sender, instance, **kwargs):
+    AuthorizationContext.invalidate(instance.owner_id)
+
+@receiver(pre_save, sender=Invoice)
+def capture_invoice_status(sender, instance, **kwargs):
+    # Instances built by hand or loaded without their status have no
+    # snapshot of the stored one, so read it from their row
+    if instance.pk is not None and getattr(instance, '_stored_status', None) is None:
+        instance._stored_status = Invoice._base_manager.filter(
+            pk=instance.pk
+        ).values_list('status', flat=True).first()
 
 @receiver(post_save, sender=Invoice)
 def handle_invoice_status_change(sender, instance, created, **kwargs):
-    if not created and instance.tracker.has_changed('status'):
+    # Invoice.save only moves the snapshot on once the post_save receivers ran
+    previous_status = getattr(instance, '_stored_status', None)
+    if not created and previous_status and previous_status != instance.status:
         # Log the status change
-        action.send(
-            instance.company.owner,
-            verb=f"changed invoice {instance.invoice_number} status to {instance.status}"
+        ActivityStreamService.record(
+            f"changed invoice {instance.invoice_number} status to {instance.status}",
+            company_id=instance.company_id
         )
         
-        # Send notifications based on status
+        # Send notifications based on status, once the change is committed
         if instance.status == 'SENT':
-            # Send email to client
-            context = {
-                'invoice': instance,
-                'client': instance.client,
-                'company': instance.company
-            }
-            html_message = render_to_string(
-                'financial_app/email/invoice_sent.html',
-                context
-            )
-            send_mail(
-                subject=f'New Invoice {instance.invoice_number} from {instance.company.name}',
-                message='',
-                html_message=html_message,
-                from_email=settings.DEFAULT_FROM_EMAIL,
-                recipient_list=[instance.client.email],
-                fail_silently=True
-            )
+            transaction.on_commit(lambda: send_invoice_sent_email(instance))
+
+def send_invoice_sent_email(invoice):
+    """Email a sent invoice to its client."""
+    try:
+        MailService.dispatch([MailService.build_message(
+            f'New Invoice {invoice.invoice_number} from {invoice.company.name}',
+            'financial_app/email/invoice_sent.html',
+            {
+                'invoice': invoice,
+                'client': invoice.client,
+                'company': invoice.company
+            },
+            [invoice.client.email]
+        )])
+    except Exception as e:
+        logger.error(f"Error sending invoice {invoice.invoice_number} to its client: {str(e)}")
 
 @receiver(post_save, sender=PaymentRecord)
 def handle_payment_record(sender, instance, created, **kwargs):
@@ -56,9 +85,9 @@ def handle_payment_record(sender, instance, created, **kwargs):
             invoice.status = 'PAID'
             invoice.save()
             
-        action.send(
-            instance.invoice.company.owner,
-            verb=f"recorded payment for invoice {instance.invoice.invoice_number}"
+        ActivityStreamService.record(
+            f"recorded payment for invoice {invoice.invoice_number}",
+            company_id=invoice.company_id
         )
 
 @receiver(pre_save, sender=Client)
@@ -72,7 +101,90 @@ def handle_client_email_change(sender, instance, **kwargs):
 @receiver(pre_delete, sender=Invoice)
 def handle_invoice_deletion(sender, instance, **kwargs):
     # Log deletion
-    action.send(
-        instance.company.owner,
-        verb=f"deleted invoice {instance.invoice_number}"
-    )
\ No newline at end of file
+    ActivityStreamService.record(
+        f"deleted invoice {instance.invoice_number}",
+        company_id=instance.company_id
+    )
+
+@receiver(post_delete, sender=Invoice)
+def update_client_balance_on_deletion(sender, instance, **kwargs):
+    # The ledger may already be gone when the client itself is deleted
+    ClientBalance.apply_invoice_change(
+        instance.get_ledger_state(),
+        None,
+        rebuild_missing=False
+    )
+
+@receiver(post_delete, sender=InvoiceItem)
+def handle_invoice_item_deletion(sender, instance, origin=None, **kwargs):
+    # Items deleted by anything but an item delete go with their invoice in
+    # the same cascade, and must not update it. Deciding from the origin of
+    # the delete leaves no state behind when the delete fails
+    origin_model = origin.model if isinstance(origin, QuerySet) else type(origin)
+    if origin is not None and origin_model is not InvoiceItem:
+        return
+    if instance.invoice_id in get_deferred_invoice_ids():
+        return
+    invoice = Invoice.objects.filter(pk=instance.invoice_id).first()
+    if invoice:
+        invoice.apply_item_delta(-instance.total)
+
+@receiver(pre_save, sender=Invoice)
+@receiver(pre_save, sender=Expense)
+@receiver(pre_save, sender=PaymentRecord)
+@receiver(pre_delete, sender=Invoice)
+@receiver(pre_delete, sender=Expense)
+@receiver(pre_delete, sender=PaymentRecord)
+def capture_rollup_values(sender, instance, **kwargs):
+    # Instances built by hand or loaded without every rollup field have no
+    # snapshot of the stored values, so read them from their row
+    if instance.pk is not None and getattr(instance, '_rollup_values', None) is None:
+        instance._rollup_values = instance.load_rollup_values()
+
+@receiver(post_save, sender=Invoice)
+@receiver(post_save, sender=Expense)
+@receiver(post_save, sender=PaymentRecord)
+def update_monthly_rollup(sender, instance, created, **kwargs):
+    previous_values = None if created else getattr(instance, '_rollup_values', None)
+    current_values = instance.get_rollup_values()
+    if current_values is None:
+        # Saved with update_fields from an instance missing rollup fields
+        current_values = instance.load_rollup_values()
+    instance._rollup_values = current_values
+
+    CompanyMonthlyRollup.apply_change(
+        instance.get_rollup_contributions(previous_values) if previous_values else None,
+        instance.get_rollup_contributions(current_values)
+    )
+
+@receiver(post_delete, sender=Invoice)
+@receiver(post_delete, sender=Expense)
+@receiver(post_delete, sender=PaymentRecord)
+def update_monthly_rollup_on_deletion(sender, instance, **kwargs):
+    values = getattr(instance, '_rollup_values', None) or instance.get_rollup_values()
+    if values is None:
+        return
+    try:
+        contributions = instance.get_rollup_contributions(values)
+    except ObjectDoesNotExist:
+        # Payment whose invoice was removed in the same cascade
+        return
+    # The rollup rows may already be gone when the company is deleted
+    CompanyMonthlyRollup.apply_change(contributions, None, create_missing=False)
+
+
+@receiver(post_save, sender=Invoice)
+@receiver(post_save, sender=Expense)
+@receiver(post_save, sender=PaymentRecord)
+@receiver(post_save, sender=Client)
+@receiver(post_delete, sender=Invoice)
+@receiver(post_delete, sender=Expense)
+@receiver(post_delete, sender=PaymentRecord)
+@receiver(post_delete, sender=Client)
+def invalidate_dashboard(sender, instance, **kwargs):
+    try:
+        company_id = instance.invoice.company_id if sender is PaymentRecord else instance.company_id
+    except ObjectDoesNotExist:
+        # Payment whose invoice was removed in the same cascade
+        return
+    DashboardService.invalidate(company_id, sender._meta.model_name)
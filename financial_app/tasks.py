@@ -1,42 +1,111 @@
 from celery import shared_task
 from django.utils import timezone
-from django.core.mail import send_mail, EmailMessage
-from django.template.loader import render_to_string
-from django.conf import settings
-from django.db.models import Sum, Q
-from datetime import timedelta
+from django.db import transaction
+from django.db.models import Q, F
+from datetime import date, timedelta
 from decimal import Decimal
 import csv
 import io
 import logging
 from .models import (
     Invoice, Expense, Company, Client,
-    PaymentRecord, UserProfile
+    PaymentRecord, UserProfile, ClientBalance
 )
 
+from .services.rollup_service import RollupService
+from .services.mail_service import MailService
+from .services.recurring_service import RecurringService
+from .services.activity_service import UserActivityService
+from .services.dashboard_service import DashboardService
+from .services.pdf_service import InvoicePdfService
+
 logger = logging.getLogger(__name__)
 
+OVERDUE_CHUNK_SIZE = 1000
+
+# Unpaid sent invoices, which Invoice.save would also move to OVERDUE once due
+OVERDUE_CANDIDATES = Q(status='SENT', amount_paid=0, total_amount__gt=0)
+
 @shared_task
 def check_overdue_invoices():
     """
-    Check for overdue invoices and send reminders.
-    Runs daily.
+    Mark sent invoices past their due date as overdue and send reminders.
+    Runs hourly.
+
+    Each chunk is moved to OVERDUE with one UPDATE guarded by status='SENT',
+    so overlapping runs never transition (or email) the same invoice twice.
+    The rows a run changed are tagged with its own updated_at value and
+    their reminders are sent by one subtask per chunk.
     """
     today = timezone.now().date()
     
-    # Find invoices that are overdue but not marked as overdue
-    overdue_invoices = Invoice.objects.filter(
-        Q(status='SENT') | Q(status='PARTIALLY_PAID'),
+    # Only invoices that still need the transition are read
+    candidates = list(Invoice.objects.filter(
+        OVERDUE_CANDIDATES,
         due_date__lt=today
-    )
+    ).values_list('pk', flat=True))
     
-    for invoice in overdue_invoices:
-        try:
-            # Update status
-            invoice.status = 'OVERDUE'
-            invoice.save()
+    transitioned = 0
+    for start in range(0, len(candidates), OVERDUE_CHUNK_SIZE):
+        transitioned += mark_invoices_overdue(
+            candidates[start:start + OVERDUE_CHUNK_SIZE],
+            today
+        )
+    return transitioned
+
+def mark_invoices_overdue(invoice_ids, today):
+    """
+    Move one chunk of invoices to OVERDUE and queue their reminders once
+    the transaction commits. Returns the number of invoices changed.
+    """
+    run_stamp = timezone.now()
+    try:
+        with transaction.atomic():
+            updated = Invoice.objects.filter(
+                OVERDUE_CANDIDATES,
+                pk__in=invoice_ids,
+                due_date__lt=today
+            ).update(
+                status='OVERDUE',
+                updated_at=run_stamp
+            )
+            if not updated:
+                return 0
             
-            # Send reminder email
+            changed = list(Invoice.objects.filter(
+                pk__in=invoice_ids,
+                status='OVERDUE',
+                updated_at=run_stamp
+            ).values_list('pk', flat=True))
+            
+            # Queryset updates bypass Invoice.save, so keep the ledgers in step
+            ClientBalance.apply_status_transition(changed, 'SENT', 'OVERDUE')
+            for company_id in Invoice.objects.filter(
+                pk__in=changed
+            ).values_list('company_id', flat=True).distinct().order_by():
+                DashboardService.invalidate(company_id, 'invoice')
+            
+            transaction.on_commit(lambda: send_overdue_reminders.delay(changed))
+        return updated
+    except Exception as e:
+        logger.error(f"Error marking invoices overdue: {str(e)}")
+        return 0
+
+@shared_task
+def send_overdue_reminders(invoice_ids):
+    """
+    Send the overdue reminders for one chunk of invoices marked overdue by
+    check_overdue_invoices.
+    """
+    today = timezone.now().date()
+    invoices = Invoice.objects.filter(
+        pk__in=invoice_ids,
+        status='OVERDUE'
+    ).select_related('client', 'company')
+    
+    messages = []
+    for invoice in invoices:
+        try:
             context = {
                 'invoice': invoice,
                 'client': invoice.client,
@@ -44,117 +113,71 @@ def check_overdue_invoices():
                 'days_overdue': (today - invoice.due_date).days
             }
             
-            html_message = render_to_string(
-                'financial_app/email/invoice_overdue.html',
-                context
-            )
-            
-            send_mail(
+            messages.append(MailService.build_message(
                 subject=f'Overdue Invoice Reminder - {invoice.invoice_number}',
-                message='',
-                html_message=html_message,
-                from_email=settings.DEFAULT_FROM_EMAIL,
-                recipient_list=[invoice.client.email],
-                fail_silently=True
-            )
-            
-            # Log the reminder
-            invoice.last_reminder_sent = timezone.now()
-            invoice.reminder_count += 1
-            invoice.save()
-            
+                template='financial_app/email/invoice_overdue.html',
+                context=context,
+                to=[invoice.client.email],
+                reminder_for=invoice.pk
+            ))
         except Exception as e:
             logger.error(f"Error processing overdue invoice {invoice.id}: {str(e)}")
+    
+    MailService.dispatch(messages)
+    return len(messages)
 
 @shared_task
 def generate_recurring_invoices():
     """
     Generate new invoices for recurring invoices.
-    Runs daily.
+    Runs daily, fanning out one task per company with invoices due.
     """
     today = timezone.now().date()
     
-    recurring_invoices = Invoice.objects.filter(
-        is_recurring=True,
-        next_recurring_date__lte=today
-    )
-    
-    for invoice in recurring_invoices:
-        try:
-            # Create new invoice
-            new_invoice = Invoice.objects.create(
-                company=invoice.company,
-                client=invoice.client,
-                status='DRAFT',
-                issue_date=today,
-                due_date=today + timedelta(days=invoice.company.default_payment_terms),
-                tax_rate=invoice.tax_rate,
-                notes=invoice.notes,
-                terms=invoice.terms,
-                footer=invoice.footer,
-                is_recurring=True,
-                recurring_frequency=invoice.recurring_frequency,
-                next_recurring_date=calculate_next_recurring_date(today, invoice.recurring_frequency)
-            )
-            
-            # Copy invoice items
-            for item in invoice.items.all():
-                item.pk = None
-                item.invoice = new_invoice
-                item.save()
-            
-            # Update original invoice's next recurring date
-            invoice.next_recurring_date = calculate_next_recurring_date(
-                today,
-                invoice.recurring_frequency
-            )
-            invoice.save()
-            
-        except Exception as e:
-            logger.error(f"Error generating recurring invoice {invoice.id}: {str(e)}")
+    company_ids = RecurringService.companies_with_due_invoices(today)
+    for company_id in company_ids:
+        generate_company_recurring_invoices.delay(company_id, today.isoformat())
+    return len(company_ids)
+
+@shared_task
+def generate_company_recurring_invoices(company_id, today):
+    """
+    Clone the due recurring invoices of one company in bulk.
+    """
+    try:
+        return RecurringService.generate_invoices(
+            company_id,
+            date.fromisoformat(today)
+        )
+    except Exception as e:
+        logger.error(f"Error generating recurring invoices for company {company_id}: {str(e)}")
 
 @shared_task
 def process_recurring_expenses():
     """
     Process recurring expenses.
-    Runs daily.
+    Runs daily, fanning out one task per company with expenses due.
     """
     today = timezone.now().date()
     
-    recurring_expenses = Expense.objects.filter(
-        is_recurring=True,
-        next_recurring_date__lte=today
-    )
-    
-    for expense in recurring_expenses:
-        try:
-            # Create new expense
-            new_expense = Expense.objects.create(
-                company=expense.company,
-                category=expense.category,
-                amount=expense.amount,
-                date=today,
-                description=expense.description,
-                vendor=expense.vendor,
-                payment_method=expense.payment_method,
-                is_recurring=True,
-                recurring_frequency=expense.recurring_frequency,
-                next_recurring_date=calculate_next_recurring_date(today, expense.recurring_frequency),
-                tax_deductible=expense.tax_deductible,
-                created_by=expense.created_by,
-                tags=expense.tags,
-                notes=expense.notes
-            )
-            
-            # Update original expense's next recurring date
-            expense.next_recurring_date = calculate_next_recurring_date(
-                today,
-                expense.recurring_frequency
-            )
-            expense.save()
-            
-        except Exception as e:
-            logger.error(f"Error processing recurring expense {expense.id}: {str(e)}")
+    company_ids = RecurringService.companies_with_due_expenses(today)
+    for company_id in company_ids:
+        materialize_company_recurring_expenses.delay(company_id, today.isoformat())
+    return len(company_ids)
+
+@shared_task
+def materialize_company_recurring_expenses(company_id, today):
+    """
+    Create the due occurrences of one company's recurring expenses in bulk,
+    including occurrences missed while the scheduler was down.
+    """
+    try:
+        return len(RecurringService.materialize_expenses(
+            date.fromisoformat(today),
+            company_id=company_id
+        ))
+    except Exception as e:
+        logger.error(f"Error processing recurring expenses for company {company_id}: {str(e)}")
 
 @shared_task
 def generate_monthly_reports():
@@ -167,27 +190,18 @@ def generate_monthly_reports():
     last_month = (first_of_month - timedelta(days=1))
     start_date = last_month.replace(day=1)
     
-    for company in Company.objects.all():
+    messages = []
+    for company in Company.objects.select_related('owner'):
         try:
-            # Calculate monthly totals
-            invoices = Invoice.objects.filter(
-                company=company,
-                issue_date__range=[start_date, last_month]
-            )
+            # Monthly totals come from the rollup table
+            totals = RollupService.totals(company, start_date, last_month)
+            revenue = totals['revenue']
+            expenses_total = totals['expense']
             
             expenses = Expense.objects.filter(
                 company=company,
                 date__range=[start_date, last_month]
-            )
-            
-            # Calculate totals
-            revenue = invoices.filter(status='PAID').aggregate(
-                total=Sum('total_amount')
-            )['total'] or Decimal('0')
-            
-            expenses_total = expenses.aggregate(
-                total=Sum('amount')
-            )['total'] or Decimal('0')
+            ).select_related('category')
             
             profit = revenue - expenses_total
             
@@ -220,30 +234,78 @@ def generate_monthly_reports():
                 'profit': profit
             }
             
-            html_message = render_to_string(
-                'financial_app/email/monthly_report.html',
-                context
-            )
-            
-            # Create email with attachment
-            email = EmailMessage(
+            # Create email with the CSV report attached
+            messages.append(MailService.build_message(
                 subject=subject,
-                body=html_message,
-                from_email=settings.DEFAULT_FROM_EMAIL,
-                to=[company.owner.email]
-            )
-            
-            # Attach CSV report
-            email.attach(
-                f'financial_report_{last_month.strftime("%Y_%m")}.csv',
-                output.getvalue(),
-                'text/csv'
-            )
-            
-            email.send(fail_silently=True)
+                template='financial_app/email/monthly_report.html',
+                context=context,
+                to=[company.owner.email],
+                attachments=[(
+                    f'financial_report_{last_month.strftime("%Y_%m")}.csv',
+                    output.getvalue(),
+                    'text/csv'
+                )]
+            ))
             
         except Exception as e:
             logger.error(f"Error generating monthly report for company {company.id}: {str(e)}")
+    
+    MailService.dispatch(messages)
+
+@shared_task
+def rebuild_monthly_rollups():
+    """
+    Rebuild the monthly company rollup table from the source records.
+    Runs nightly.
+    """
+    try:
+        RollupService.rebuild()
+    except Exception as e:
+        logger.error(f"Error rebuilding monthly rollups: {str(e)}")
+
+@shared_task
+def flush_user_activity():
+    """
+    Write user activity recorded in the cache to the user profiles.
+    Runs every minute.
+    """
+    try:
+        return UserActivityService.flush()
+    except Exception as e:
+        logger.error(f"Error flushing user activity: {str(e)}")
+
+@shared_task
+def refresh_dashboard(company_id):
+    """
+    Recompute the outdated dashboard widgets of a company. Queued by
+    DashboardService after changes and by outdated reads.
+    """
+    try:
+        return DashboardService.refresh(company_id)
+    except Exception as e:
+        logger.error(f"Error refreshing dashboard for company {company_id}: {str(e)}")
+
+@shared_task
+def refresh_dashboards():
+    """
+    Recompute the cached dashboards of every company for the new day.
+    Runs daily just after midnight.
+    """
+    try:
+        return DashboardService.refresh_all()
+    except Exception as e:
+        logger.error(f"Error refreshing dashboards: {str(e)}")
+
+@shared_task
+def prune_invoice_pdf_cache():
+    """
+    Keep the invoice PDF cache under its size limit.
+    Runs hourly.
+    """
+    try:
+        return InvoicePdfService.prune_cache()
+    except Exception as e:
+        logger.error(f"Error pruning the invoice PDF cache: {str(e)}")
 
 @shared_task
 def backup_database():
@@ -269,53 +331,45 @@ def cleanup_old_files():
     except Exception as e:
         logger.error(f"Error cleaning up old files: {str(e)}")
 
-def calculate_next_recurring_date(current_date, frequency):
-    """Helper function to calculate next recurring date."""
-    if frequency == 'DAILY':
-        return current_date + timedelta(days=1)
-    elif frequency == 'WEEKLY':
-        return current_date + timedelta(weeks=1)
-    elif frequency == 'MONTHLY':
-        next_month = current_date + timedelta(days=32)
-        return next_month.replace(day=1)
-    elif frequency == 'QUARTERLY':
-        next_quarter = current_date + timedelta(days=92)
-        return next_quarter.replace(day=1)
-    elif frequency == 'YEARLY':
-        return current_date.replace(year=current_date.year + 1)
-    return None
-
 @shared_task
 def send_low_balance_alerts():
     """
     Send alerts for clients approaching their credit limit.
     Runs daily.
     """
-    for client in Client.objects.filter(credit_limit__gt=0):
-        outstanding_balance = client.get_outstanding_balance()
-        if outstanding_balance > (client.credit_limit * Decimal('0.8')):  # 80% of credit limit
-            try:
-                context = {
-                    'client': client,
-                    'outstanding_balance': outstanding_balance,
-                    'credit_limit': client.credit_limit
-                }
-                
-                html_message = render_to_string(
-                    'financial_app/email/credit_limit_alert.html',
-                    context
-                )
-                
-                send_mail(
-                    subject='Credit Limit Alert',
-                    message='',
-                    html_message=html_message,
-                    from_email=settings.DEFAULT_FROM_EMAIL,
-                    recipient_list=[client.company.owner.email],
-                    fail_silently=True
-                )
-            except Exception as e:
-                logger.error(f"Error sending low balance alert for client {client.id}: {str(e)}")
+    # Build any missing ledgers so the threshold can be checked in the database
+    ClientBalance.rebuild(
+        Client.objects.filter(
+            credit_limit__gt=0,
+            ledger__isnull=True
+        ).values_list('pk', flat=True)
+    )
+    
+    clients = Client.objects.filter(
+        credit_limit__gt=0,
+        ledger__outstanding__gt=F('credit_limit') * Decimal('0.8')  # 80% of credit limit
+    ).select_related('ledger', 'company__owner')
+    
+    messages = []
+    for client in clients:
+        outstanding_balance = client.ledger.outstanding
+        try:
+            context = {
+                'client': client,
+                'outstanding_balance': outstanding_balance,
+                'credit_limit': client.credit_limit
+            }
+            
+            messages.append(MailService.build_message(
+                subject='Credit Limit Alert',
+                template='financial_app/email/credit_limit_alert.html',
+                context=context,
+                to=[client.company.owner.email]
+            ))
+        except Exception as e:
+            logger.error(f"Error sending low balance alert for client {client.id}: {str(e)}")
+    
+    MailService.dispatch(messages)
 
 @shared_task
 def send_weekly_summary():
@@ -326,7 +380,8 @@ def send_weekly_summary():
     end_date = timezone.now().date()
     start_date = end_date - timedelta(days=7)
     
-    for company in Company.objects.all():
+    messages = []
+    for company in Company.objects.select_related('owner'):
         try:
             context = {
                 'company': company,
@@ -346,19 +401,38 @@ def send_weekly_summary():
                 ).count()
             }
             
-            html_message = render_to_string(
-                'financial_app/email/weekly_summary.html',
-                context
-            )
-            
-            send_mail(
+            messages.append(MailService.build_message(
                 subject='Weekly Financial Summary',
-                message='',
-                html_message=html_message,
-                from_email=settings.DEFAULT_FROM_EMAIL,
-                recipient_list=[company.owner.email],
-                fail_silently=True
-            )
+                template='financial_app/email/weekly_summary.html',
+                context=context,
+                to=[company.owner.email]
+            ))
             
         except Exception as e:
-            logger.error(f"Error sending weekly summary for company {company.id}: {str(e)}")
\ No newline at end of file
+            logger.error(f"Error sending weekly summary for company {company.id}: {str(e)}")
+    
+    MailService.dispatch(messages)
+
+@shared_task
+def send_mail_batch(messages, attempt=0):
+    """
+    Send a batch of serialized emails over one connection.
+    Failed messages, and those whose invoice PDFs could not be rendered,
+    are queued again with exponential backoff.
+    """
+    loaded, unavailable = MailService.load_messages(messages)
+    failed = MailService.send_messages([message for _, message in loaded])
+    delivered = [message for _, message in loaded if message not in failed]
+    MailService.record_delivery(delivered)
+
+    # Retry from the serialized copies, which carry no PDF content
+    retry = unavailable + [data for data, message in loaded if message in failed]
+    if retry:
+        if attempt < MailService.get_setting('MAIL_MAX_RETRIES', 3):
+            send_mail_batch.apply_async(
+                (retry, attempt + 1),
+                countdown=MailService.get_retry_delay(attempt)
+            )
+        else:
+            logger.error(f"Giving up on {len(retry)} emails after {attempt} retries")
+    return len(delivered)
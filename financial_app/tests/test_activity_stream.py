@@ -0,0 +1,110 @@
+from datetime import date, timedelta
+from decimal import Decimal
+from actstream.models import Action
+from django.contrib.auth.models import User
+from django.db import connection, transaction
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from financial_app.models import Company, Client, Invoice
+from financial_app.services.activity_service import ActivityStreamService
+
+class ActivityStreamServiceTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='owner', password='secret')
+        self.company = Company.objects.create(name='Acme', owner=self.user)
+        self.client_obj = Client.objects.create(
+            company=self.company,
+            name='Client',
+            email='client@example.com',
+            address='Valletta'
+        )
+        Action.objects.all().delete()
+
+    # Test cases run inside a transaction, so commits are captured. Actions
+    # recorded in setUp share its savepoint, so each test opens its own.
+
+    def test_batch_is_written_with_one_insert(self):
+        # Like a request, the batch spans the transaction and its commit
+        with CaptureQueriesContext(connection) as queries, ActivityStreamService.batch(), \
+                self.captureOnCommitCallbacks(execute=True), transaction.atomic():
+            for i in range(5):
+                ActivityStreamService.record(f'did {i}', actor=self.user)
+            ActivityStreamService.record('did more', company_id=self.company.pk)
+
+        inserts = [query for query in queries if query['sql'].startswith('INSERT')]
+        self.assertEqual(len(inserts), 1)
+        self.assertEqual(
+            set(Action.objects.values_list('actor_object_id', flat=True)),
+            {str(self.user.pk)}
+        )
+        self.assertEqual(Action.objects.count(), 6)
+
+    def test_actions_wait_for_the_transaction(self):
+        with self.captureOnCommitCallbacks(execute=True), transaction.atomic():
+            Invoice.objects.create(
+                company=self.company,
+                client=self.client_obj,
+                status='DRAFT',
+                issue_date=date(2024, 1, 1),
+                due_date=date(2024, 1, 1) + timedelta(days=30)
+            ).delete()
+            self.assertFalse(Action.objects.exists())
+
+        self.assertEqual(Action.objects.get().verb[:15], 'deleted invoice')
+
+    def test_rolled_back_actions_are_dropped(self):
+        with self.captureOnCommitCallbacks(execute=True), transaction.atomic():
+            ActivityStreamService.record('outer', actor=self.user)
+            try:
+                with transaction.atomic():
+                    ActivityStreamService.record('rolled back', actor=self.user)
+                    raise ValueError
+            except ValueError:
+                pass
+            ActivityStreamService.record('kept', actor=self.user)
+
+        self.assertEqual(
+            list(Action.objects.order_by('pk').values_list('verb', flat=True)),
+            ['outer', 'kept']
+        )
+
+    def test_status_changes_are_recorded(self):
+        invoice = Invoice.objects.create(
+            company=self.company,
+            client=self.client_obj,
+            status='DRAFT',
+            issue_date=date(2024, 1, 1),
+            due_date=date(2024, 1, 1) + timedelta(days=30),
+            subtotal=Decimal('100.00')
+        )
+
+        with self.captureOnCommitCallbacks(execute=True), transaction.atomic():
+            invoice.status = 'CANCELLED'
+            invoice.save()
+
+        self.assertEqual(
+            Action.objects.get().verb,
+            f'changed invoice {invoice.invoice_number} status to CANCELLED'
+        )
+
+    def test_status_changes_of_partly_loaded_invoices_are_recorded(self):
+        invoice = Invoice.objects.create(
+            company=self.company,
+            client=self.client_obj,
+            status='DRAFT',
+            issue_date=date(2024, 1, 1),
+            due_date=date(2024, 1, 1) + timedelta(days=30),
+            subtotal=Decimal('100.00')
+        )
+        invoice = Invoice.objects.only('pk', 'company_id').get(pk=invoice.pk)
+
+        with self.captureOnCommitCallbacks(execute=True), transaction.atomic():
+            invoice.status = 'CANCELLED'
+            invoice.save()
+            # Saving again without a change records nothing more
+            invoice.save()
+
+        self.assertEqual(
+            Action.objects.get().verb,
+            f'changed invoice {invoice.invoice_number} status to CANCELLED'
+        )
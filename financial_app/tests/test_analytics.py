@@ -0,0 +1,74 @@
+from decimal import Decimal
+from datetime import timedelta
+from django.contrib.auth.models import User
+from django.test import TestCase
+from django.utils import timezone
+from financial_app.models import Company, Client, Invoice, Expense, ExpenseCategory
+from financial_app.services.analytics_service import AnalyticsService, RollingPeriod
+
+class BusinessOverviewTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='owner', password='secret')
+        self.company = Company.objects.create(name='Acme', owner=self.user)
+        self.client_obj = Client.objects.create(
+            company=self.company,
+            name='Client',
+            email='client@example.com',
+            address='Valletta'
+        )
+        self.category = ExpenseCategory.objects.create(name='Office')
+
+    def seed(self, count):
+        today = timezone.now().date()
+        statuses = ['PAID', 'SENT', 'DRAFT', 'OVERDUE']
+        invoices = [
+            Invoice(
+                company=self.company,
+                client=self.client_obj,
+                invoice_number=f'BENCH-{i}',
+                status=statuses[i % len(statuses)],
+                issue_date=today - timedelta(days=i % 90),
+                due_date=today - timedelta(days=i % 90) + timedelta(days=30),
+                subtotal=Decimal('100.00'),
+                total_amount=Decimal('100.00')
+            )
+            for i in range(count)
+        ]
+        Invoice.objects.bulk_create(invoices, batch_size=5000)
+        expenses = [
+            Expense(
+                company=self.company,
+                category=self.category,
+                amount=Decimal('40.00'),
+                date=today - timedelta(days=i % 90),
+                description='Supplies'
+            )
+            for i in range(count)
+        ]
+        Expense.objects.bulk_create(expenses, batch_size=5000)
+
+    def test_overview_uses_one_query_per_table(self):
+        self.seed(40)
+        with self.assertNumQueries(2):
+            overview = AnalyticsService.get_business_overview(self.company)
+        self.assertEqual(overview['pending_invoices_count'], 10)
+        self.assertEqual(set(overview), {
+            'total_income', 'total_expenses', 'income_trend', 'expense_trend',
+            'outstanding_invoices', 'pending_invoices_count', 'overdue_invoices',
+            'overdue_invoices_count', 'net_cash_flow', 'cash_flow_trend'
+        })
+
+    def test_custom_period(self):
+        self.seed(40)
+        overview = AnalyticsService.get_business_overview(
+            self.company,
+            period=RollingPeriod(days=7)
+        )
+        # Both ends of the range are inclusive
+        self.assertEqual(overview['total_expenses'], Decimal('40.00') * 8)
+
+    def test_overview_queries_do_not_grow_with_rows(self):
+        self.seed(400)
+        with self.assertNumQueries(2):
+            overview = AnalyticsService.get_business_overview(self.company)
+        self.assertEqual(overview['pending_invoices_count'], 100)
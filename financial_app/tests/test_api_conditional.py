@@ -0,0 +1,131 @@
+from datetime import date, timedelta
+from decimal import Decimal
+from django.contrib.auth.models import User
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from rest_framework.test import APIClient
+from financial_app.models import Company, Client, Invoice, Expense, ExpenseCategory
+
+class ConditionalGetTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='owner', password='secret')
+        self.company = Company.objects.create(name='Acme', owner=self.user)
+        self.client_obj = Client.objects.create(
+            company=self.company,
+            name='Client',
+            email='client@example.com',
+            address='Valletta'
+        )
+        self.invoice = Invoice.objects.create(
+            company=self.company,
+            client=self.client_obj,
+            status='DRAFT',
+            issue_date=date(2024, 1, 1),
+            due_date=date(2024, 1, 1) + timedelta(days=30),
+            subtotal=Decimal('100.00')
+        )
+        self.api = APIClient()
+        self.api.force_authenticate(self.user)
+
+    def test_unchanged_list_is_not_modified(self):
+        url = reverse('invoice-list')
+        etag = self.api.get(url)['ETag']
+
+        response = self.api.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response['ETag'], etag)
+
+        # Another page or filter is another representation
+        response = self.api.get(url, {'status': 'DRAFT'}, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+
+    def test_changes_invalidate_the_list(self):
+        url = reverse('invoice-list')
+        etag = self.api.get(url)['ETag']
+
+        self.invoice.notes = 'Updated'
+        self.invoice.save()
+        self.assertEqual(self.api.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+        etag = self.api.get(url)['ETag']
+        self.invoice.delete()
+        self.assertEqual(self.api.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+    def test_removed_items_invalidate_the_list(self):
+        url = reverse('invoice-list')
+        # Free lines leave the invoice totals, and so its timestamp, alone
+        first = self.invoice.items.create(
+            description='First', quantity=Decimal('1'), unit_price=Decimal('0.00')
+        )
+        self.invoice.items.create(
+            description='Second', quantity=Decimal('1'), unit_price=Decimal('5.00')
+        )
+        etag = self.api.get(url)['ETag']
+
+        # Neither the invoice nor the latest item changes, the number of items does
+        first.delete()
+        response = self.api.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.data['results'][0]['items']), 1)
+
+    def test_nested_changes_invalidate_the_detail(self):
+        url = reverse('invoice-detail', args=[self.invoice.pk])
+        # The first read builds the client's balance ledger
+        self.api.get(url)
+        etag = self.api.get(url)['ETag']
+        self.assertEqual(self.api.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+
+        # Client changes show in the nested client
+        self.client_obj.name = 'Renamed'
+        self.client_obj.save()
+        response = self.api.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['client']['name'], 'Renamed')
+
+        # Users have no timestamp but show in the nested company owner
+        self.user.email = 'owner@example.com'
+        self.user.save()
+        response = self.api.get(url, HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['company']['owner']['email'], 'owner@example.com')
+
+    def test_category_changes_invalidate_the_expenses(self):
+        category = ExpenseCategory.objects.create(name='Travel')
+        Expense.objects.create(
+            company=self.company,
+            category=category,
+            amount=Decimal('10.00'),
+            date=date(2024, 1, 1),
+            description='Taxi',
+            created_by=self.user
+        )
+        url = reverse('expense-list')
+        etag = self.api.get(url, {'expand': 'category'})['ETag']
+
+        category.name = 'Transport'
+        category.save()
+        response = self.api.get(url, {'expand': 'category'}, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['results'][0]['category']['name'], 'Transport')
+
+    def test_cursor_pages_are_versioned_without_counting(self):
+        url = reverse('invoice-list')
+        etag = self.api.get(url, {'pagination': 'cursor'})['ETag']
+
+        with CaptureQueriesContext(connection) as queries:
+            response = self.api.get(url, {'pagination': 'cursor'}, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        # The page query is the only one, it carries the versions itself
+        self.assertEqual(len(queries), 1)
+
+    def test_missing_detail_is_still_not_found(self):
+        response = self.api.get(reverse('invoice-detail', args=[self.invoice.pk + 1]))
+        self.assertEqual(response.status_code, 404)
+
+    def test_unchanged_dashboard_is_not_modified(self):
+        url = reverse('company-dashboard', args=[self.company.pk])
+        etag = self.api.get(url)['ETag']
+
+        self.assertEqual(self.api.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
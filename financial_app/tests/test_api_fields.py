@@ -0,0 +1,70 @@
+from datetime import date, timedelta
+from decimal import Decimal
+from django.contrib.auth.models import User
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from rest_framework.test import APIClient
+from financial_app.models import Company, Client, Invoice
+
+class SparseFieldsetTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='owner', password='secret')
+        self.company = Company.objects.create(name='Acme', owner=self.user)
+        self.client_obj = Client.objects.create(
+            company=self.company,
+            name='Client',
+            email='client@example.com',
+            address='Valletta'
+        )
+        self.invoice = Invoice.objects.create(
+            company=self.company,
+            client=self.client_obj,
+            status='DRAFT',
+            issue_date=date(2024, 1, 1),
+            due_date=date(2024, 1, 1) + timedelta(days=30),
+            terms='Net 30'
+        )
+        self.item = self.invoice.items.create(
+            description='Consulting',
+            quantity=Decimal('1'),
+            unit_price=Decimal('100.00')
+        )
+        self.api = APIClient()
+        self.api.force_authenticate(self.user)
+
+    def test_list_sends_relations_as_ids(self):
+        row = self.api.get(reverse('invoice-list')).data['results'][0]
+
+        self.assertEqual(row['company'], self.company.pk)
+        self.assertEqual(row['client'], self.client_obj.pk)
+        self.assertEqual(row['items'], [self.item.pk])
+
+    def test_expanded_relations_are_nested(self):
+        row = self.api.get(
+            reverse('invoice-list'), {'expand': 'client,items'}
+        ).data['results'][0]
+
+        self.assertEqual(row['client']['name'], 'Client')
+        self.assertEqual(row['items'][0]['description'], 'Consulting')
+        self.assertEqual(row['company'], self.company.pk)
+
+    def test_detail_stays_full(self):
+        data = self.api.get(reverse('invoice-detail', args=[self.invoice.pk])).data
+
+        self.assertEqual(data['company']['name'], 'Acme')
+        self.assertEqual(data['client']['email'], 'client@example.com')
+
+    def test_only_requested_columns_are_fetched(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.api.get(reverse('invoice-list'), {'fields': 'id,status'})
+
+        self.assertEqual(set(response.data['results'][0]), {'id', 'status'})
+        invoice_query = next(
+            query['sql'] for query in queries
+            if query['sql'].startswith('SELECT') and 'issue_date' in query['sql'] and
+            'COUNT' not in query['sql']
+        )
+        self.assertNotIn('"terms"', invoice_query)
+        self.assertNotIn('financial_app_client', invoice_query)
@@ -0,0 +1,90 @@
+import json
+import logging
+import threading
+from unittest import mock
+from django.contrib.auth.models import AnonymousUser
+from django.http import HttpResponse, JsonResponse
+from django.test import RequestFactory, SimpleTestCase, override_settings
+from financial_app.api import middleware
+from financial_app.api.middleware import APILoggingMiddleware, LazyLogEntry
+
+class RecordingHandler(logging.Handler):
+    def __init__(self):
+        super().__init__()
+        self.messages = []
+
+    def emit(self, record):
+        self.messages.append((record.levelno, json.loads(record.getMessage())))
+
+class APILoggingMiddlewareTests(SimpleTestCase):
+    def setUp(self):
+        self.factory = RequestFactory()
+        self.handler = RecordingHandler()
+        middleware.logger.addHandler(self.handler)
+        self.addCleanup(middleware.logger.removeHandler, self.handler)
+        level = middleware.logger.level
+        middleware.logger.setLevel(logging.INFO)
+        self.addCleanup(middleware.logger.setLevel, level)
+
+    def call(self, request, response, **settings):
+        request.user = AnonymousUser()
+        with override_settings(**settings):
+            result = APILoggingMiddleware(lambda request: response)(request)
+        APILoggingMiddleware.log_queue.flush()
+        return result
+
+    def record_parse_threads(self):
+        """Record the thread of every LazyLogEntry.parse_body call."""
+        threads = []
+        parse_body = LazyLogEntry.parse_body
+
+        def parse(body):
+            threads.append(threading.current_thread())
+            return parse_body(body)
+
+        patcher = mock.patch.object(LazyLogEntry, 'parse_body', side_effect=parse)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        return threads
+
+    def test_success_bodies_are_capped_and_responses_skipped(self):
+        request = self.factory.post(
+            '/api/v1/clients/',
+            data=json.dumps({'name': 'x' * 100}),
+            content_type='application/json'
+        )
+        threads = self.record_parse_threads()
+        self.call(request, JsonResponse({'id': 1}), API_LOG_BODY_LIMIT=20)
+
+        level, entry = self.handler.messages[0]
+        self.assertEqual(level, logging.INFO)
+        self.assertEqual(entry['request_body'], '{"name": "xxxxxxxxxx')
+        self.assertIsNone(entry['response_body'])
+        # Parsing happened on the logging thread, not before the response
+        self.assertTrue(threads)
+        self.assertNotIn(threading.current_thread(), threads)
+
+    def test_errors_are_logged_with_their_body_when_not_sampled(self):
+        request = self.factory.get('/api/v1/invoices/')
+        self.call(request, JsonResponse({'id': 1}), API_LOG_SAMPLE_RATE=0)
+        self.assertEqual(self.handler.messages, [])
+
+        self.call(
+            request,
+            JsonResponse({'error': 'Invalid'}, status=400),
+            API_LOG_SAMPLE_RATE=0
+        )
+        level, entry = self.handler.messages[0]
+        self.assertEqual(level, logging.WARNING)
+        self.assertEqual(entry['response_body'], {'error': 'Invalid'})
+
+    def test_large_responses_are_capped_off_the_request_thread(self):
+        threads = self.record_parse_threads()
+        response = HttpResponse(json.dumps([{'id': i} for i in range(10000)]))
+        request = self.factory.get('/api/v1/invoices/')
+
+        self.call(request, response, API_LOG_RESPONSE_BODIES='all', API_LOG_BODY_LIMIT=10)
+
+        entry = self.handler.messages[0][1]
+        self.assertEqual(entry['response_body'], '[{"id": 0}')
+        self.assertNotIn(threading.current_thread(), threads)
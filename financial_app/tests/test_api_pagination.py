@@ -0,0 +1,62 @@
+from datetime import date, timedelta
+from django.contrib.auth.models import User
+from django.test import TestCase
+from django.urls import reverse
+from rest_framework.test import APIClient
+from financial_app.models import Company, Client, Invoice
+
+class KeysetPaginationTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='owner', password='secret')
+        self.company = Company.objects.create(name='Acme', owner=self.user)
+        self.client_obj = Client.objects.create(
+            company=self.company,
+            name='Client',
+            email='client@example.com',
+            address='Valletta'
+        )
+        # Several invoices share an issue date, so the id breaks the ties
+        start = date(2024, 1, 1)
+        self.invoices = [
+            Invoice.objects.create(
+                company=self.company,
+                client=self.client_obj,
+                status='DRAFT',
+                issue_date=start + timedelta(days=i // 3),
+                due_date=start + timedelta(days=30)
+            )
+            for i in range(25)
+        ]
+        self.api = APIClient()
+        self.api.force_authenticate(self.user)
+
+    def collect_pages(self, url):
+        ids = []
+        while url:
+            response = self.api.get(url)
+            self.assertEqual(response.status_code, 200)
+            self.assertNotIn('count', response.data)
+            ids.extend(invoice['id'] for invoice in response.data['results'])
+            url = response.data['next']
+        return ids
+
+    def test_cursor_pages_cover_every_invoice_once_in_order(self):
+        ids = self.collect_pages(reverse('invoice-list') + '?pagination=cursor&page_size=4')
+
+        expected = sorted(
+            self.invoices,
+            key=lambda invoice: (invoice.issue_date, invoice.pk),
+            reverse=True
+        )
+        self.assertEqual(ids, [invoice.pk for invoice in expected])
+
+    def test_page_number_pagination_is_the_default(self):
+        response = self.api.get(reverse('invoice-list'))
+
+        self.assertEqual(response.data['count'], 25)
+        self.assertEqual(len(response.data['results']), 10)
+
+    def test_invalid_cursor_is_rejected(self):
+        response = self.api.get(reverse('invoice-list') + '?cursor=not-a-cursor')
+
+        self.assertEqual(response.status_code, 404)
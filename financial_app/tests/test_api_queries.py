@@ -0,0 +1,95 @@
+from datetime import date, timedelta
+from decimal import Decimal
+from django.contrib.auth.models import User
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from rest_framework.test import APIClient
+from financial_app.models import (
+    Company, Client, ClientBalance, Invoice, Expense, ExpenseCategory, PaymentRecord
+)
+
+# Queries allowed per list request, independent of the number of rows
+QUERY_BUDGETS = {
+    'company-list': 4,
+    'client-list': 4,
+    'invoice-list': 5,
+    'expense-list': 4,
+    'payment-list': 5,
+}
+
+class ListQueryBudgetTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='owner', password='secret')
+        self.company = Company.objects.create(name='Acme', owner=self.user)
+        self.category = ExpenseCategory.objects.create(name='Travel')
+        self.api = APIClient()
+        self.api.force_authenticate(self.user)
+        self.serial = 0
+
+    def add_rows(self, count):
+        start = date(2024, 1, 1)
+        for _ in range(count):
+            self.serial += 1
+            client = Client.objects.create(
+                company=self.company,
+                name=f'Client {self.serial}',
+                email=f'client{self.serial}@example.com',
+                address='Valletta'
+            )
+            invoice = Invoice.objects.create(
+                company=self.company,
+                client=client,
+                status='SENT',
+                issue_date=start,
+                due_date=start + timedelta(days=30),
+                subtotal=Decimal('100.00')
+            )
+            invoice.items.create(
+                description='Consulting',
+                quantity=Decimal('1'),
+                unit_price=Decimal('100.00')
+            )
+            PaymentRecord.objects.create(
+                invoice=invoice,
+                amount=Decimal('10.00'),
+                payment_date=start,
+                payment_method='BANK_TRANSFER',
+                processed_by=self.user
+            )
+            Expense.objects.create(
+                company=self.company,
+                category=self.category,
+                amount=Decimal('20.00'),
+                date=start,
+                description='Taxi',
+                created_by=self.user,
+                approved_by=self.user
+            )
+
+    def count_queries(self, name):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.api.get(reverse(name), {'page_size': 50})
+        self.assertEqual(response.status_code, 200)
+        return len(queries)
+
+    def test_list_endpoints_stay_within_their_query_budget(self):
+        self.add_rows(2)
+        few = {name: self.count_queries(name) for name in QUERY_BUDGETS}
+        self.add_rows(20)
+
+        for name, budget in QUERY_BUDGETS.items():
+            with self.subTest(endpoint=name):
+                self.assertLessEqual(few[name], budget)
+                self.assertEqual(self.count_queries(name), few[name])
+
+    def test_missing_ledgers_are_loaded_together(self):
+        self.add_rows(2)
+        ClientBalance.objects.all().delete()
+        few = self.count_queries('client-list')
+        self.add_rows(20)
+        ClientBalance.objects.all().delete()
+
+        self.assertEqual(self.count_queries('client-list'), few)
+        self.assertEqual(ClientBalance.objects.count(), 22)
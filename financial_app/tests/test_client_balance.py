@@ -0,0 +1,61 @@
+from decimal import Decimal
+from datetime import timedelta
+from django.contrib.auth.models import User
+from django.test import TestCase
+from django.utils import timezone
+from financial_app.models import Company, Client, ClientBalance
+from financial_app.services.invoice_service import InvoiceService
+
+class ClientBalanceTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='owner', password='secret')
+        self.company = Company.objects.create(name='Acme', owner=self.user)
+        self.client_obj = Client.objects.create(
+            company=self.company,
+            name='Client',
+            email='client@example.com',
+            address='Valletta',
+            credit_limit=Decimal('150.00')
+        )
+
+    def create_sent_invoice(self, amount):
+        today = timezone.now().date()
+        invoice = InvoiceService.create_invoice(
+            self.company,
+            self.client_obj,
+            [{'description': 'Work', 'quantity': Decimal('1'), 'unit_price': amount}],
+            due_date=today + timedelta(days=30)
+        )
+        invoice.status = 'SENT'
+        invoice.amount_paid = Decimal('0')
+        invoice.save()
+        return invoice
+
+    def assert_ledger_matches_rebuild(self):
+        ledger = ClientBalance.objects.get(client=self.client_obj)
+        expected = (ledger.outstanding, ledger.overdue, ledger.paid_to_date)
+        ClientBalance.rebuild([self.client_obj.pk])
+        ledger.refresh_from_db()
+        self.assertEqual(expected, (ledger.outstanding, ledger.overdue, ledger.paid_to_date))
+
+    def test_ledger_follows_invoice_transitions(self):
+        invoice = self.create_sent_invoice(Decimal('100.00'))
+        self.assertEqual(self.client_obj.get_outstanding_balance(), Decimal('100.00'))
+        self.assert_ledger_matches_rebuild()
+
+        invoice.status = 'OVERDUE'
+        invoice.save()
+        self.assert_ledger_matches_rebuild()
+
+        InvoiceService.record_payment(invoice, Decimal('100.00'), 'CASH')
+        self.assert_ledger_matches_rebuild()
+
+        invoice.delete()
+        ledger = ClientBalance.objects.get(client=self.client_obj)
+        self.assertEqual(ledger.outstanding, Decimal('0'))
+
+    def test_balance_reads_do_not_query(self):
+        self.create_sent_invoice(Decimal('200.00'))
+        client = Client.objects.select_related('ledger').get(pk=self.client_obj.pk)
+        with self.assertNumQueries(0):
+            self.assertTrue(client.is_credit_limit_exceeded())
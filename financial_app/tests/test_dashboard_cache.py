@@ -0,0 +1,73 @@
+from datetime import date, timedelta
+from decimal import Decimal
+from unittest import mock
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+from financial_app.models import Company, Client, Invoice
+from financial_app.services.dashboard_service import DashboardService
+
+@override_settings(CACHES={
+    'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}
+})
+class DashboardCacheTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username='owner', password='secret')
+        self.company = Company.objects.create(name='Acme', owner=self.user)
+        self.client_obj = Client.objects.create(
+            company=self.company,
+            name='Client',
+            email='client@example.com',
+            address='Valletta'
+        )
+        patcher = mock.patch('financial_app.tasks.refresh_dashboard.delay')
+        self.delay = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def add_invoice(self):
+        # Invoices with nothing to pay would be saved as PAID
+        with self.captureOnCommitCallbacks(execute=True):
+            return Invoice.objects.create(
+                company=self.company,
+                client=self.client_obj,
+                status='DRAFT',
+                issue_date=date(2024, 1, 1),
+                due_date=date(2024, 1, 1) + timedelta(days=30),
+                subtotal=Decimal('100.00')
+            )
+
+    def draft_count(self):
+        return DashboardService.get_widgets(
+            self.company, ['invoice_metrics']
+        )['invoice_metrics']['draft_count']
+
+    def test_cached_widgets_are_read_without_queries(self):
+        self.add_invoice()
+        self.assertEqual(self.draft_count(), 1)
+
+        with self.assertNumQueries(0):
+            self.assertEqual(self.draft_count(), 1)
+
+    def test_changes_queue_a_refresh_and_stale_reads_stay_cached(self):
+        self.assertEqual(self.draft_count(), 0)
+        self.delay.reset_mock()
+
+        self.add_invoice()
+        self.add_invoice()
+
+        # One refresh is queued however many changes commit before it runs
+        self.delay.assert_called_once_with(self.company.pk)
+        with self.assertNumQueries(0):
+            self.assertEqual(self.draft_count(), 0)
+
+        self.assertEqual(DashboardService.refresh(self.company.pk), ['invoice_metrics'])
+        self.assertEqual(self.draft_count(), 2)
+        self.assertEqual(DashboardService.refresh(self.company.pk), [])
+
+    def test_unrelated_widgets_are_not_recomputed(self):
+        DashboardService.get_widgets(self.company, ['invoice_metrics', 'expense_metrics'])
+
+        self.add_invoice()
+
+        self.assertEqual(DashboardService.refresh(self.company.pk), ['invoice_metrics'])
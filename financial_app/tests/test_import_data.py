@@ -0,0 +1,170 @@
+import os
+import tempfile
+from decimal import Decimal
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from financial_app.management.commands.import_data import Command
+from financial_app.models import Company, Client, Invoice, Expense, CompanyMonthlyRollup
+
+def write_csv(test, content):
+    handle, path = tempfile.mkstemp(suffix='.csv')
+    with os.fdopen(handle, 'w') as csv_file:
+        csv_file.write(content)
+    test.addCleanup(os.remove, path)
+    return path
+
+def expense_rows(count):
+    return 'category,amount,date,description\n' + ''.join(
+        f'Category {i % 5},{i % 100}.50,2024-{i % 12 + 1:02d}-15,Expense {i}\n'
+        for i in range(count)
+    )
+
+class ImportDataTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='owner', password='secret')
+        self.company = Company.objects.create(name='Acme', owner=self.user)
+
+    def write_csv(self, content):
+        return write_csv(self, content)
+
+    def run_import(self, path, import_type, *args):
+        call_command(
+            'import_data', path,
+            '--type', import_type,
+            '--company-id', str(self.company.pk),
+            *args,
+            stdout=open(os.devnull, 'w')
+        )
+
+    def test_clients_are_imported_in_chunks(self):
+        rows = ''.join(
+            f'Client {i},client{i}@example.com,Valletta\n' for i in range(25)
+        )
+        path = self.write_csv('name,email,address\n' + rows)
+
+        self.run_import(path, 'clients', '--chunk-size', '10')
+
+        self.assertEqual(Client.objects.filter(company=self.company).count(), 25)
+        self.assertFalse(os.path.exists(f'{path}.clients.checkpoint'))
+
+    def test_existing_clients_are_updated(self):
+        Client.objects.create(
+            company=self.company,
+            name='Old name',
+            email='client@example.com',
+            address='Valletta'
+        )
+        path = self.write_csv('name,email\nNew name,client@example.com\n')
+
+        self.run_import(path, 'clients', '--update-existing')
+
+        self.assertEqual(Client.objects.get(email='client@example.com').name, 'New name')
+
+    def test_invalid_rows_stop_the_import_unless_skipped(self):
+        Client.objects.create(
+            company=self.company,
+            name='Client',
+            email='client@example.com',
+            address='Valletta'
+        )
+        path = self.write_csv(
+            'client_email,amount,issue_date,due_date,status\n'
+            'client@example.com,100.00,2024-01-10,2024-02-10,PAID\n'
+            'client@example.com,abc,2024-01-11,2024-02-11,PAID\n'
+            'missing@example.com,50.00,2024-01-12,2024-02-12,PAID\n'
+        )
+
+        with self.assertRaises(CommandError):
+            self.run_import(path, 'invoices')
+        self.assertFalse(Invoice.objects.exists())
+
+        self.run_import(path, 'invoices', '--skip-errors')
+        invoice = Invoice.objects.get()
+        self.assertEqual(invoice.total_amount, Decimal('100.00'))
+        self.assertEqual(
+            Client.objects.get(email='client@example.com').ledger.paid_to_date,
+            Decimal('100.00')
+        )
+
+    def test_invoice_totals_come_from_their_items(self):
+        Client.objects.create(
+            company=self.company,
+            name='Client',
+            email='client@example.com',
+            address='Valletta'
+        )
+        path = self.write_csv(
+            'client_email,amount,issue_date,due_date,status,items\n'
+            'client@example.com,1.00,2024-01-10,2024-02-10,PAID,'
+            '"[{""description"": ""Design"", ""quantity"": 2, ""unit_price"": ""40.00""},'
+            ' {""description"": ""Hosting"", ""quantity"": 1, ""unit_price"": ""20.00""}]"\n'
+            'client@example.com,50.00,2024-01-11,2024-02-11,PAID,not json\n'
+            'client@example.com,50.00,2024-01-12,2024-02-12,PAID,"[{""quantity"": 1}]"\n'
+        )
+
+        with self.assertRaises(CommandError):
+            self.run_import(path, 'invoices')
+        self.assertFalse(Invoice.objects.exists())
+
+        self.run_import(path, 'invoices', '--skip-errors')
+        invoice = Invoice.objects.get()
+        self.assertEqual(invoice.items.count(), 2)
+        self.assertEqual(invoice.subtotal, Decimal('100.00'))
+        self.assertEqual(invoice.total_amount, Decimal('100.00'))
+        self.assertEqual(
+            sum(rollup.revenue for rollup in CompanyMonthlyRollup.objects.filter(company=self.company)),
+            Decimal('100.00')
+        )
+
+    def test_expenses_update_the_monthly_rollup(self):
+        path = self.write_csv(
+            'category,amount,date,description\n'
+            'Rent,500.00,2024-03-01,March rent\n'
+            'Travel,20.50,2024-03-15,Taxi\n'
+        )
+
+        self.run_import(path, 'expenses')
+
+        self.assertEqual(Expense.objects.filter(company=self.company).count(), 2)
+        total = sum(
+            rollup.expense
+            for rollup in CompanyMonthlyRollup.objects.filter(company=self.company)
+        )
+        self.assertEqual(total, Decimal('520.50'))
+
+    def count_import_queries(self, rows):
+        path = self.write_csv(expense_rows(rows))
+        with CaptureQueriesContext(connection) as queries:
+            self.run_import(path, 'expenses')
+        # SQLite splits bulk inserts by its variable limit
+        return len([
+            query for query in queries.captured_queries
+            if not query['sql'].startswith('INSERT')
+        ])
+
+    def test_expense_import_queries_do_not_grow_with_rows(self):
+        # The first import also creates the categories
+        self.count_import_queries(12)
+        few = self.count_import_queries(12)
+
+        self.assertEqual(self.count_import_queries(1200), few)
+        self.assertEqual(Expense.objects.filter(company=self.company).count(), 1224)
+
+    def test_shards_cover_every_row_once(self):
+        path = self.write_csv(expense_rows(1000))
+        command = Command()
+
+        for workers in (1, 3, 7):
+            shards = command.plan_shards(path, workers)
+            self.assertLessEqual(len(shards), workers)
+            descriptions = [
+                description
+                for shard in shards
+                for chunk in command.read_shard_chunks(shard, 128)
+                for description in chunk['description']
+            ]
+            self.assertEqual(descriptions, [f'Expense {i}' for i in range(1000)])
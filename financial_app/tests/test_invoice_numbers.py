@@ -0,0 +1,117 @@
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+from unittest import skipUnless
+from django.contrib.auth.models import User
+from django.db import connection, connections
+from django.test import TestCase, TransactionTestCase
+from django.utils import timezone
+from financial_app.models import Company, Client, Invoice, InvoiceNumberSequence
+
+def create_company(name, username):
+    user = User.objects.create_user(username=username, password='secret')
+    company = Company.objects.create(name=name, owner=user)
+    client = Client.objects.create(
+        company=company,
+        name='Client',
+        email=f'{username}@example.com',
+        address='Valletta'
+    )
+    return company, client
+
+def create_invoice(company, client):
+    today = timezone.now().date()
+    return Invoice.objects.create(
+        company=company,
+        client=client,
+        issue_date=today,
+        due_date=today + timedelta(days=30)
+    )
+
+class InvoiceNumberSequenceTests(TestCase):
+    def test_numbers_are_sequential_per_company(self):
+        company, client = create_company('Acme', 'acme')
+        other, other_client = create_company('Other', 'other')
+        period = timezone.now().strftime('%Y%m')
+
+        first = create_invoice(company, client)
+        second = create_invoice(company, client)
+        third = create_invoice(other, other_client)
+
+        self.assertEqual(first.invoice_number, f'INV-{period}-0001')
+        self.assertEqual(second.invoice_number, f'INV-{period}-0002')
+        self.assertEqual(third.invoice_number, f'INV-{period}-0001')
+
+    def test_numbers_do_not_run_out_after_9999(self):
+        company, client = create_company('Acme', 'acme')
+        period = timezone.now().strftime('%Y%m')
+        InvoiceNumberSequence.objects.create(
+            company=company,
+            period=period,
+            last_value=9999
+        )
+        invoice = create_invoice(company, client)
+        self.assertEqual(invoice.invoice_number, f'INV-{period}-10000')
+
+    def test_interleaved_blocks_are_disjoint_and_contiguous(self):
+        company, _ = create_company('Acme', 'acme')
+        date = timezone.now()
+        period = date.strftime('%Y%m')
+        InvoiceNumberSequence.objects.create(
+            company=company,
+            period=period,
+            last_value=9995
+        )
+
+        # Two importers taking blocks in turn, with a single invoice and
+        # another month's block in between
+        blocks = [
+            InvoiceNumberSequence.next_numbers(company.pk, 3, date),
+            InvoiceNumberSequence.next_numbers(company.pk, 2, date),
+            InvoiceNumberSequence.next_numbers(company.pk, 1, date),
+        ]
+        InvoiceNumberSequence.next_numbers(company.pk, 5, date - timedelta(days=40))
+        blocks += [
+            InvoiceNumberSequence.next_numbers(company.pk, 3, date),
+            InvoiceNumberSequence.next_numbers(company.pk, 2, date),
+        ]
+
+        self.assertEqual(blocks[0], [f'INV-{period}-{value}' for value in (9996, 9997, 9998)])
+        self.assertEqual(blocks[1], [f'INV-{period}-9999', f'INV-{period}-10000'])
+        values = [
+            [int(number.rsplit('-', 1)[1]) for number in block]
+            for block in blocks
+        ]
+        for block in values:
+            self.assertEqual(block, list(range(block[0], block[0] + len(block))))
+        numbers = [value for block in values for value in block]
+        self.assertEqual(numbers, list(range(9996, 9996 + len(numbers))))
+        self.assertEqual(
+            InvoiceNumberSequence.objects.get(company=company, period=period).last_value,
+            numbers[-1]
+        )
+
+@skipUnless(connection.vendor == 'postgresql', 'Requires row level locking')
+class InvoiceNumberConcurrencyTests(TransactionTestCase):
+    THREADS = 8
+    INVOICES_PER_THREAD = 250
+
+    def test_parallel_invoice_creation_never_collides(self):
+        company, client = create_company('Acme', 'acme')
+
+        def worker(_):
+            try:
+                return [
+                    create_invoice(company, client).invoice_number
+                    for _ in range(self.INVOICES_PER_THREAD)
+                ]
+            finally:
+                connections.close_all()
+
+        with ThreadPoolExecutor(max_workers=self.THREADS) as executor:
+            results = list(executor.map(worker, range(self.THREADS)))
+
+        numbers = [number for batch in results for number in batch]
+        expected = self.THREADS * self.INVOICES_PER_THREAD
+        self.assertEqual(len(numbers), expected)
+        self.assertEqual(len(set(numbers)), expected)
+        self.assertEqual(Invoice.objects.filter(company=company).count(), expected)
@@ -0,0 +1,114 @@
+import os
+import shutil
+import tempfile
+from decimal import Decimal
+from datetime import timedelta
+from unittest import mock
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.test import TestCase, override_settings
+from django.utils import timezone
+from financial_app.models import Company, Client, Invoice
+from financial_app.services.pdf_service import InvoicePdfService
+
+class InvoicePdfServiceTests(TestCase):
+    def setUp(self):
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root, ignore_errors=True)
+        settings_override = override_settings(MEDIA_ROOT=media_root)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+        # Render without a template or a wkhtmltopdf binary
+        html = mock.patch.object(
+            InvoicePdfService, 'render_html',
+            side_effect=lambda invoice: f'<p>{invoice.invoice_number}</p>'
+        )
+        self.render_html = html.start()
+        self.addCleanup(html.stop)
+        pdf = mock.patch.object(
+            InvoicePdfService, '_render_pdf',
+            side_effect=lambda html: html.encode()
+        )
+        self.render_pdf = pdf.start()
+        self.addCleanup(pdf.stop)
+
+        user = User.objects.create_user(username='owner', password='secret')
+        self.company = Company.objects.create(name='Acme', owner=user)
+        self.client_obj = Client.objects.create(
+            company=self.company,
+            name='Client',
+            email='client@example.com',
+            address='Valletta'
+        )
+
+    def create_invoices(self, count):
+        today = timezone.now().date()
+        return [
+            Invoice.objects.create(
+                company=self.company,
+                client=self.client_obj,
+                status='DRAFT',
+                issue_date=today,
+                due_date=today + timedelta(days=30)
+            )
+            for _ in range(count)
+        ]
+
+    def test_render_many_renders_each_invoice_once(self):
+        invoices = self.create_invoices(5)
+
+        first = InvoicePdfService.render_many(invoices)
+        second = InvoicePdfService.render_many(Invoice.objects.all())
+
+        self.assertEqual(self.render_pdf.call_count, 5)
+        self.assertEqual(first, second)
+        self.assertEqual(first[invoices[0].pk], f'<p>{invoices[0].invoice_number}</p>'.encode())
+
+    def test_changed_invoices_are_rendered_again(self):
+        invoice, unchanged = self.create_invoices(2)
+        InvoicePdfService.render_many([invoice, unchanged])
+
+        invoice.items.create(
+            description='Consulting',
+            quantity=Decimal('1'),
+            unit_price=Decimal('100.00')
+        )
+        InvoicePdfService.render_many(Invoice.objects.all())
+
+        self.assertEqual(self.render_pdf.call_count, 3)
+
+    def test_client_changes_render_again_and_replace_the_old_file(self):
+        invoice, = self.create_invoices(1)
+        InvoicePdfService.render_many([invoice])
+
+        self.client_obj.name = 'Renamed'
+        self.client_obj.save()
+        InvoicePdfService.render_many([invoice])
+
+        self.assertEqual(self.render_pdf.call_count, 2)
+        cache_dir = os.path.join(settings.MEDIA_ROOT, InvoicePdfService.CACHE_DIR)
+        self.assertEqual(len(os.listdir(cache_dir)), 1)
+
+    def test_prune_cache_removes_the_oldest_files(self):
+        invoices = self.create_invoices(3)
+        paths = InvoicePdfService.get_cache_paths(invoices)
+        for age, invoice in enumerate(reversed(invoices)):
+            InvoicePdfService.write_cached(paths[invoice.pk], b'x' * 10)
+            os.utime(paths[invoice.pk], (0, 1000 - age))
+
+        self.assertEqual(InvoicePdfService.prune_cache(max_bytes=15), 2)
+        self.assertTrue(os.path.exists(paths[invoices[-1].pk]))
+        self.assertFalse(os.path.exists(paths[invoices[0].pk]))
+
+    def test_failed_renders_are_left_out_when_failing_silently(self):
+        broken, invoice = self.create_invoices(2)
+        self.render_html.side_effect = lambda target: (
+            1 / 0 if target.pk == broken.pk else '<p>ok</p>'
+        )
+
+        pdfs = InvoicePdfService.render_many([broken, invoice], fail_silently=True)
+        self.assertEqual(list(pdfs), [invoice.pk])
+
+        with self.assertRaises(ZeroDivisionError):
+            InvoicePdfService.render(broken)
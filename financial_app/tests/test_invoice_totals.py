@@ -0,0 +1,185 @@
+from decimal import Decimal
+from datetime import timedelta
+from django.contrib.auth.models import User
+from django.db import connection, transaction
+from django.db.models.signals import post_delete
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from financial_app.models import Company, Client, Invoice, InvoiceItem
+from financial_app.services.invoice_service import InvoiceService
+
+# Invoices with nothing to pay are marked PAID on save, so the fixtures
+# start from an opening subtotal to stay drafts
+OPENING = Decimal('10.00')
+
+def data_statements(queries):
+    """Leave out transaction and savepoint control statements."""
+    return [
+        query for query in queries
+        if not query['sql'].startswith(('BEGIN', 'COMMIT', 'SAVEPOINT', 'RELEASE SAVEPOINT'))
+    ]
+
+class InvoiceTotalsTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='owner', password='secret')
+        self.company = Company.objects.create(name='Acme', owner=self.user)
+        self.client_obj = Client.objects.create(
+            company=self.company,
+            name='Client',
+            email='client@example.com',
+            address='Valletta'
+        )
+
+    def create_invoice(self, tax_rate=Decimal('0')):
+        today = timezone.now().date()
+        return Invoice.objects.create(
+            company=self.company,
+            client=self.client_obj,
+            status='DRAFT',
+            issue_date=today,
+            due_date=today + timedelta(days=30),
+            subtotal=OPENING,
+            tax_rate=tax_rate
+        )
+
+    def add_items(self, invoice, count):
+        for i in range(count):
+            invoice.items.create(
+                description=f'Item {i}',
+                quantity=Decimal('2'),
+                unit_price=Decimal('10.00')
+            )
+
+    def test_item_changes_are_applied_as_deltas(self):
+        invoice = self.create_invoice(tax_rate=Decimal('10'))
+        item = invoice.items.create(
+            description='Consulting',
+            quantity=Decimal('1'),
+            unit_price=Decimal('100.00')
+        )
+        invoice.refresh_from_db()
+        self.assertEqual(invoice.subtotal, OPENING + Decimal('100.00'))
+        self.assertEqual(invoice.total_amount, (OPENING + Decimal('100.00')) * Decimal('1.1'))
+        self.assertEqual(invoice.status, 'DRAFT')
+
+        item = InvoiceItem.objects.get(pk=item.pk)
+        item.quantity = Decimal('3')
+        item.save()
+        invoice.refresh_from_db()
+        self.assertEqual(invoice.subtotal, OPENING + Decimal('300.00'))
+
+        item.delete()
+        invoice.refresh_from_db()
+        self.assertEqual(invoice.subtotal, OPENING)
+
+    def test_deleting_an_invoice_does_not_update_its_totals(self):
+        invoice = self.create_invoice()
+        self.add_items(invoice, 3)
+
+        with CaptureQueriesContext(connection) as queries:
+            invoice.delete()
+
+        self.assertFalse([
+            query for query in queries
+            if query['sql'].startswith('UPDATE') and 'subtotal' in query['sql']
+        ])
+
+    def test_failed_invoice_delete_leaves_item_deletes_applied(self):
+        invoice = self.create_invoice()
+        self.add_items(invoice, 2)
+
+        def fail(sender, **kwargs):
+            raise ValueError
+        # Fails in the middle of the cascade, before the invoice row goes
+        post_delete.connect(fail, sender=InvoiceItem)
+        try:
+            with self.assertRaises(ValueError), transaction.atomic():
+                invoice.delete()
+        finally:
+            post_delete.disconnect(fail, sender=InvoiceItem)
+
+        invoice.items.first().delete()
+        invoice.refresh_from_db()
+        self.assertEqual(invoice.subtotal, OPENING + Decimal('20.00'))
+
+    def test_stale_copies_do_not_lose_item_changes(self):
+        invoice = self.create_invoice(tax_rate=Decimal('10'))
+        stale = Invoice.objects.get(pk=invoice.pk)
+
+        invoice.apply_item_delta(Decimal('5.00'))
+        stale.apply_item_delta(Decimal('7.00'))
+
+        invoice.refresh_from_db()
+        self.assertEqual(invoice.subtotal, OPENING + Decimal('12.00'))
+        self.assertEqual(invoice.total_amount, stale.total_amount)
+        self.assertEqual(invoice.total_amount, (OPENING + Decimal('12.00')) * Decimal('1.1'))
+
+    def test_deferred_totals_matches_full_recalculation(self):
+        invoice = self.create_invoice()
+        with invoice.deferred_totals():
+            self.add_items(invoice, 5)
+        invoice.refresh_from_db()
+        self.assertEqual(invoice.subtotal, Decimal('100.00'))
+
+    def test_deferred_totals_query_count_is_constant(self):
+        """Benchmark: only the item INSERTs grow with the number of items."""
+        overhead = []
+        for count in (10, 100, 300):
+            invoice = self.create_invoice()
+            with CaptureQueriesContext(connection) as queries:
+                with invoice.deferred_totals():
+                    self.add_items(invoice, count)
+            overhead.append(len(queries) - count)
+        self.assertEqual(len(set(overhead)), 1)
+
+    def item_data(self, count):
+        return [
+            {
+                'description': f'Item {i}',
+                'quantity': Decimal('2'),
+                'unit_price': Decimal('10.00')
+            }
+            for i in range(count)
+        ]
+
+    def test_add_items_statement_count_is_constant(self):
+        for count in (10, 100, 300):
+            invoice = self.create_invoice()
+            with CaptureQueriesContext(connection) as queries:
+                InvoiceService.add_items(invoice, self.item_data(count))
+            # Inserts are batched by the backend, the totals take three statements
+            totals = [
+                query for query in data_statements(queries)
+                if not query['sql'].startswith('INSERT')
+            ]
+            self.assertLessEqual(len(totals), 3)
+            invoice.refresh_from_db()
+            self.assertEqual(invoice.subtotal, OPENING + Decimal('20.00') * count)
+
+    def test_sync_items_writes_only_changes(self):
+        invoice = self.create_invoice()
+        InvoiceService.add_items(invoice, self.item_data(3))
+        items = list(invoice.items.order_by('description').values(
+            'id', 'description', 'quantity', 'unit_price', 'tax_rate'
+        ))
+
+        # Change one line, drop one and add a new one
+        items[0]['quantity'] = Decimal('5')
+        del items[1]
+        items.append({
+            'description': 'Extra',
+            'quantity': Decimal('1'),
+            'unit_price': Decimal('7.50')
+        })
+        unchanged = InvoiceItem.objects.get(pk=items[1]['id'])
+
+        InvoiceService.sync_items(invoice, items)
+
+        invoice.refresh_from_db()
+        self.assertEqual(invoice.items.count(), 3)
+        self.assertEqual(invoice.subtotal, Decimal('77.50'))
+        self.assertEqual(
+            InvoiceItem.objects.get(pk=unchanged.pk).updated_at,
+            unchanged.updated_at
+        )
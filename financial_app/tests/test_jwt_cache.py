@@ -0,0 +1,73 @@
+from unittest import mock
+from django.contrib.auth.models import User
+from django.http import HttpResponse
+from django.test import RequestFactory, TestCase
+from rest_framework.request import Request
+from rest_framework_simplejwt.exceptions import InvalidToken
+from rest_framework_simplejwt.tokens import AccessToken, RefreshToken
+from financial_app.api.authentication import (
+    CachedJWTAuthentication, VerifiedTokenCache, verified_tokens
+)
+from financial_app.api.middleware import JWTAuthenticationMiddleware
+
+class CachedJWTTests(TestCase):
+    def setUp(self):
+        verified_tokens.clear()
+        self.user = User.objects.create_user(username='owner', password='secret')
+        self.token = str(AccessToken.for_user(self.user))
+        self.factory = RequestFactory()
+
+    def test_repeat_tokens_skip_verification(self):
+        cache = VerifiedTokenCache()
+        with mock.patch.object(VerifiedTokenCache, 'decode', wraps=VerifiedTokenCache.decode) as decode:
+            first = cache.verify(self.token)
+            second = cache.verify(self.token)
+
+        self.assertEqual(decode.call_count, 1)
+        self.assertEqual(first, second)
+
+    def test_expired_and_least_recent_tokens_are_evicted(self):
+        cache = VerifiedTokenCache(maxsize=2)
+        other = str(AccessToken.for_user(User.objects.create_user(username='other')))
+        cache.verify(self.token)
+        cache.verify(other)
+        cache.verify(self.token)
+        refresh = str(RefreshToken.for_user(self.user))
+        cache.verify(refresh)
+        self.assertEqual(list(cache.entries), [self.token, refresh])
+
+        expires = cache.entries[self.token][0]
+        with mock.patch.object(VerifiedTokenCache, 'decode', side_effect=ValueError):
+            with self.assertRaises(ValueError):
+                cache.verify(self.token, now=expires + 1)
+        self.assertNotIn(self.token, cache.entries)
+
+    def test_drf_reuses_the_middleware_verification(self):
+        request = self.factory.get('/api/v1/invoices/', HTTP_AUTHORIZATION=f'Bearer {self.token}')
+        JWTAuthenticationMiddleware(lambda request: HttpResponse())(request)
+
+        with mock.patch.object(VerifiedTokenCache, 'verify') as verify:
+            user, token = CachedJWTAuthentication().authenticate(Request(request))
+        verify.assert_not_called()
+        self.assertEqual(user, self.user)
+        # Newer SimpleJWT releases store the id as a string
+        self.assertEqual(str(token['user_id']), str(self.user.id))
+
+    def test_refresh_tokens_are_not_accepted(self):
+        refresh = str(RefreshToken.for_user(self.user))
+        request = self.factory.get('/api/v1/invoices/', HTTP_AUTHORIZATION=f'Bearer {refresh}')
+
+        with self.assertRaises(InvalidToken):
+            CachedJWTAuthentication().authenticate(Request(request))
+
+    def test_middleware_verifies_repeat_tokens_once_without_queries(self):
+        middleware = JWTAuthenticationMiddleware(lambda request: HttpResponse())
+        request = self.factory.get('/api/v1/invoices/', HTTP_AUTHORIZATION=f'Bearer {self.token}')
+
+        with mock.patch.object(VerifiedTokenCache, 'decode', wraps=VerifiedTokenCache.decode) as decode:
+            with self.assertNumQueries(0):
+                for _ in range(100):
+                    middleware(request)
+
+        self.assertEqual(decode.call_count, 1)
+        self.assertEqual(request.user_token, self.token)
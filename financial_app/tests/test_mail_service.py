@@ -0,0 +1,161 @@
+import socket
+from unittest import mock, skipUnless
+from django.core import mail
+from django.core.mail import EmailMessage
+from django.core.mail.backends.locmem import EmailBackend as LocmemBackend
+from django.contrib.auth.models import User
+from django.test import TestCase, override_settings
+from django.utils import timezone
+from financial_app.models import Company, Client, Invoice
+from financial_app.services.mail_service import MailService
+from financial_app.services.pdf_service import InvoicePdfService
+from financial_app.tasks import send_mail_batch
+
+try:
+    from aiosmtpd.controller import Controller
+except ImportError:
+    Controller = None
+
+class FlakyBackend(LocmemBackend):
+    """Locmem backend that refuses messages addressed to fail@example.com."""
+
+    def send_messages(self, messages):
+        if any('fail@example.com' in message.to for message in messages):
+            raise ConnectionError('Recipient refused')
+        return super().send_messages(messages)
+
+class RecordingHandler:
+    def __init__(self):
+        self.envelopes = []
+        self.peers = set()
+
+    async def handle_DATA(self, server, session, envelope):
+        self.envelopes.append(envelope)
+        self.peers.add(session.peer)
+        return '250 OK'
+
+def build_messages(recipients):
+    return [
+        EmailMessage(
+            subject=f'Reminder {index}',
+            body='<p>Please pay</p>',
+            from_email='billing@example.com',
+            to=[recipient]
+        )
+        for index, recipient in enumerate(recipients)
+    ]
+
+class MailServiceTests(TestCase):
+    def test_serialized_messages_round_trip(self):
+        message = build_messages(['client@example.com'])[0]
+        message.content_subtype = 'html'
+        message.attach('invoice.pdf', b'%PDF-1.4', 'application/pdf')
+
+        copy = MailService.deserialize(MailService.serialize(message))
+
+        self.assertEqual(copy.subject, message.subject)
+        self.assertEqual(copy.to, ['client@example.com'])
+        self.assertEqual(copy.content_subtype, 'html')
+        self.assertEqual(copy.attachments, [('invoice.pdf', b'%PDF-1.4', 'application/pdf')])
+
+    @override_settings(EMAIL_BACKEND='financial_app.tests.test_mail_service.FlakyBackend')
+    def test_failed_messages_are_retried_with_backoff(self):
+        messages = build_messages(['a@example.com', 'fail@example.com', 'b@example.com'])
+        batch = [MailService.serialize(message) for message in messages]
+
+        with mock.patch.object(send_mail_batch, 'apply_async') as apply_async:
+            sent = send_mail_batch(batch)
+
+        self.assertEqual(sent, 2)
+        self.assertEqual([message.to for message in mail.outbox], [['a@example.com'], ['b@example.com']])
+        (retry_batch, attempt), = apply_async.call_args.args
+        self.assertEqual([message['to'] for message in retry_batch], [['fail@example.com']])
+        self.assertEqual(attempt, 1)
+        self.assertEqual(apply_async.call_args.kwargs['countdown'], MailService.get_retry_delay(0))
+
+    def create_invoice(self, number):
+        user, _ = User.objects.get_or_create(username='owner')
+        company, _ = Company.objects.get_or_create(name='Acme', owner=user)
+        client = Client.objects.create(
+            company=company,
+            name=f'Client {number}',
+            email=f'client{number}@example.com',
+            address='Valletta'
+        )
+        today = timezone.now().date()
+        return Invoice.objects.create(
+            company=company,
+            client=client,
+            status='SENT',
+            issue_date=today,
+            due_date=today,
+            subtotal=100
+        )
+
+    @override_settings(EMAIL_BACKEND='financial_app.tests.test_mail_service.FlakyBackend')
+    def test_invoice_pdfs_are_attached_and_reminders_tracked_on_delivery(self):
+        delivered = self.create_invoice(1)
+        refused = self.create_invoice(2)
+        messages = build_messages(['a@example.com', 'fail@example.com'])
+        for message, invoice in zip(messages, [delivered, refused]):
+            message.invoice_pdfs = [invoice.pk]
+            message.reminder_for = invoice.pk
+        batch = [MailService.serialize(message) for message in messages]
+
+        # Only invoice ids travel with the task
+        self.assertEqual([message['attachments'] for message in batch], [[], []])
+        self.assertEqual(batch[0]['invoice_pdfs'], [delivered.pk])
+
+        pdfs = {delivered.pk: b'%PDF-1', refused.pk: b'%PDF-2'}
+        with mock.patch.object(InvoicePdfService, 'render_many', return_value=pdfs) as render_many, \
+                mock.patch.object(send_mail_batch, 'apply_async') as apply_async:
+            self.assertEqual(send_mail_batch(batch), 1)
+
+        render_many.assert_called_once()
+        self.assertEqual(mail.outbox[0].attachments, [
+            (f'invoice_{delivered.invoice_number}.pdf', b'%PDF-1', 'application/pdf')
+        ])
+        (retry_batch, attempt), = apply_async.call_args.args
+        self.assertEqual(retry_batch, batch[1:])
+
+        counts = dict(Invoice.objects.values_list('pk', 'reminder_count'))
+        self.assertEqual(counts, {delivered.pk: 1, refused.pk: 0})
+        self.assertIsNotNone(Invoice.objects.get(pk=delivered.pk).last_reminder_sent)
+
+    def test_messages_whose_pdf_fails_are_retried(self):
+        invoice = self.create_invoice(1)
+        message = build_messages(['a@example.com'])[0]
+        message.invoice_pdfs = [invoice.pk]
+        batch = [MailService.serialize(message)]
+
+        with mock.patch.object(InvoicePdfService, 'render_many', return_value={}), \
+                mock.patch.object(send_mail_batch, 'apply_async') as apply_async:
+            self.assertEqual(send_mail_batch(batch), 0)
+
+        self.assertEqual(mail.outbox, [])
+        self.assertEqual(apply_async.call_args.args[0], (batch, 1))
+
+    @skipUnless(Controller, 'Requires aiosmtpd')
+    def test_batch_reuses_one_smtp_connection(self):
+        with socket.socket() as probe:
+            probe.bind(('127.0.0.1', 0))
+            port = probe.getsockname()[1]
+        handler = RecordingHandler()
+        controller = Controller(handler, hostname='127.0.0.1', port=port)
+        controller.start()
+        self.addCleanup(controller.stop)
+
+        recipients = [f'client{index}@example.com' for index in range(50)]
+        with override_settings(
+            EMAIL_BACKEND='django.core.mail.backends.smtp.EmailBackend',
+            EMAIL_HOST='127.0.0.1',
+            EMAIL_PORT=port,
+            EMAIL_USE_TLS=False,
+            EMAIL_HOST_USER='',
+            EMAIL_HOST_PASSWORD=''
+        ):
+            failed = MailService.send_messages(build_messages(recipients))
+
+        self.assertEqual(failed, [])
+        self.assertEqual(len(handler.envelopes), 50)
+        self.assertEqual(len(handler.peers), 1)
@@ -0,0 +1,106 @@
+from decimal import Decimal
+from datetime import date, timedelta
+from unittest import mock
+from django.contrib.auth.models import User
+from django.test import TestCase
+from financial_app.models import (
+    Company, Client, CompanyMonthlyRollup, Expense, ExpenseCategory, Invoice
+)
+from financial_app.services.report_service import ReportService
+from financial_app.services.rollup_service import RollupService
+
+class MonthlyRollupTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='owner', password='secret')
+        self.company = Company.objects.create(name='Acme', owner=self.user)
+        self.client_obj = Client.objects.create(
+            company=self.company,
+            name='Client',
+            email='client@example.com',
+            address='Valletta'
+        )
+        self.category = ExpenseCategory.objects.create(name='Office')
+
+    def add_expense(self, amount, day):
+        return Expense.objects.create(
+            company=self.company,
+            category=self.category,
+            amount=amount,
+            date=day,
+            description='Supplies'
+        )
+
+    def snapshot(self):
+        # Rows emptied by deltas are kept with zero totals, a rebuild drops them
+        return sorted(
+            row for row in CompanyMonthlyRollup.objects.values_list(
+                'month', 'category_id', *CompanyMonthlyRollup.MEASURES
+            )
+            if any(row[2:])
+        )
+
+    def test_signal_deltas_match_rebuild(self):
+        expense = self.add_expense(Decimal('40.00'), date(2024, 1, 10))
+        self.add_expense(Decimal('60.00'), date(2024, 2, 5))
+        expense.amount = Decimal('45.00')
+        expense.date = date(2024, 3, 1)
+        expense.save()
+
+        invoice = Invoice.objects.create(
+            company=self.company,
+            client=self.client_obj,
+            issue_date=date(2024, 1, 15),
+            due_date=date(2024, 1, 15) + timedelta(days=30)
+        )
+        invoice.delete()
+
+        incremental = self.snapshot()
+        RollupService.rebuild(self.company)
+        self.assertEqual(incremental, self.snapshot())
+
+    def test_saves_without_a_snapshot_apply_deltas(self):
+        expense = self.add_expense(Decimal('40.00'), date(2024, 1, 10))
+
+        with mock.patch.object(RollupService, 'rebuild') as rebuild:
+            # Built by hand, then loaded without the rollup fields
+            Expense(
+                pk=expense.pk,
+                company=self.company,
+                category=self.category,
+                amount=Decimal('50.00'),
+                date=date(2024, 2, 10),
+                description='Supplies',
+                created_at=expense.created_at
+            ).save()
+            deferred = Expense.objects.only('description').get(pk=expense.pk)
+            deferred.description = 'Paper'
+            deferred.save(update_fields=['description'])
+        rebuild.assert_not_called()
+
+        incremental = self.snapshot()
+        self.assertEqual([row[:2] for row in incremental], [(date(2024, 2, 1), self.category.pk)])
+        RollupService.rebuild(self.company)
+        self.assertEqual(incremental, self.snapshot())
+
+    def test_split_range(self):
+        full, partial = RollupService.split_range(date(2024, 1, 15), date(2024, 3, 31))
+        self.assertEqual(full, (date(2024, 2, 1), date(2024, 4, 1)))
+        self.assertEqual(partial, [(date(2024, 1, 15), date(2024, 1, 31))])
+
+        full, partial = RollupService.split_range(date(2024, 1, 3), date(2024, 1, 20))
+        self.assertIsNone(full)
+        self.assertEqual(partial, [(date(2024, 1, 3), date(2024, 1, 20))])
+
+    def test_pl_statement_combines_rollup_and_partial_months(self):
+        self.add_expense(Decimal('10.00'), date(2024, 1, 10))
+        self.add_expense(Decimal('20.00'), date(2024, 2, 10))
+        self.add_expense(Decimal('30.00'), date(2024, 3, 20))
+
+        statement = ReportService.generate_pl_statement(
+            self.company, date(2024, 1, 5), date(2024, 3, 15)
+        )
+        self.assertEqual(statement['expenses']['total'], Decimal('30.00'))
+        self.assertEqual(
+            statement['expenses']['breakdown'],
+            [{'category__name': 'Office', 'total': Decimal('30.00')}]
+        )
@@ -0,0 +1,75 @@
+from decimal import Decimal
+from datetime import timedelta
+from unittest import mock
+from django.contrib.auth.models import User
+from django.test import TestCase
+from django.utils import timezone
+from financial_app.models import Company, Client, ClientBalance, Invoice
+from financial_app.tasks import check_overdue_invoices, send_overdue_reminders
+
+class CheckOverdueInvoicesTests(TestCase):
+    def setUp(self):
+        user = User.objects.create_user(username='owner', password='secret')
+        self.company = Company.objects.create(name='Acme', owner=user)
+        self.client_obj = Client.objects.create(
+            company=self.company,
+            name='Client',
+            email='client@example.com',
+            address='Valletta'
+        )
+
+    def create_invoice(self, days_past_due, amount=Decimal('100.00')):
+        today = timezone.now().date()
+        invoice = Invoice.objects.create(
+            company=self.company,
+            client=self.client_obj,
+            status='SENT',
+            issue_date=today - timedelta(days=40),
+            due_date=today + timedelta(days=30),
+            subtotal=amount
+        )
+        # Move the due date without going through save()
+        Invoice.objects.filter(pk=invoice.pk).update(
+            due_date=today - timedelta(days=days_past_due)
+        )
+        return invoice
+
+    def test_due_invoices_are_marked_overdue_once(self):
+        overdue = [self.create_invoice(5), self.create_invoice(1)]
+        not_due = self.create_invoice(-3)
+
+        with mock.patch.object(send_overdue_reminders, 'delay') as delay:
+            with self.captureOnCommitCallbacks(execute=True):
+                self.assertEqual(check_overdue_invoices(), 2)
+            with self.captureOnCommitCallbacks(execute=True):
+                self.assertEqual(check_overdue_invoices(), 0)
+
+        delay.assert_called_once()
+        self.assertCountEqual(delay.call_args.args[0], [invoice.pk for invoice in overdue])
+
+        statuses = dict(Invoice.objects.values_list('pk', 'status'))
+        self.assertEqual(statuses[overdue[0].pk], 'OVERDUE')
+        self.assertEqual(statuses[not_due.pk], 'SENT')
+        # Reminder tracking waits until the reminder is delivered
+        self.assertEqual(
+            Invoice.objects.get(pk=overdue[0].pk).reminder_count,
+            0
+        )
+
+    def test_ledger_matches_a_rebuild(self):
+        self.create_invoice(5)
+        self.create_invoice(2, amount=Decimal('40.00'))
+
+        with mock.patch.object(send_overdue_reminders, 'delay'):
+            check_overdue_invoices()
+
+        ledger = ClientBalance.objects.get(client=self.client_obj)
+        self.assertEqual(ledger.overdue, Decimal('140.00'))
+        self.assertEqual(ledger.outstanding, Decimal('140.00'))
+
+        ClientBalance.rebuild([self.client_obj.pk])
+        rebuilt = ClientBalance.objects.get(client=self.client_obj)
+        self.assertEqual(
+            (ledger.outstanding, ledger.overdue, ledger.paid_to_date),
+            (rebuilt.outstanding, rebuilt.overdue, rebuilt.paid_to_date)
+        )
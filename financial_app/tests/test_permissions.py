@@ -0,0 +1,57 @@
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.test import RequestFactory, TestCase, override_settings
+from rest_framework.request import Request
+from financial_app.api.permissions import (
+    AuthorizationContext, HasCompanyAccess, CanManageInvoices, CanManagePayments
+)
+from financial_app.models import Company, Client
+
+@override_settings(CACHES={
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'permission-tests',
+    },
+})
+class AuthorizationContextTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username='owner', password='secret')
+        self.company = Company.objects.create(name='Acme', owner=self.user)
+        self.other_company = Company.objects.create(
+            name='Other',
+            owner=User.objects.create_user(username='other', password='secret')
+        )
+
+    def make_request(self, method='get'):
+        request = Request(getattr(RequestFactory(), method)('/api/v1/invoices/'))
+        request.user = User.objects.get(pk=self.user.pk)
+        return request
+
+    def test_checks_load_the_context_once_per_request(self):
+        request = self.make_request()
+        client = Client(company=self.company, name='Client')
+        checks = [HasCompanyAccess(), CanManageInvoices(), CanManagePayments()]
+
+        with self.assertNumQueries(2):
+            for permission in checks:
+                self.assertTrue(permission.has_permission(request, None))
+            self.assertTrue(HasCompanyAccess().has_object_permission(request, None, client))
+
+        # Later requests are served from the cache
+        request = self.make_request()
+        with self.assertNumQueries(0):
+            self.assertTrue(HasCompanyAccess().has_permission(request, None))
+
+    def test_profile_changes_apply_to_the_next_request(self):
+        self.assertFalse(CanManageInvoices().has_permission(self.make_request('post'), None))
+
+        profile = self.user.profile
+        profile.role = 'ACCOUNTANT'
+        profile.save()
+
+        self.assertTrue(CanManageInvoices().has_permission(self.make_request('post'), None))
+        self.assertEqual(
+            AuthorizationContext.for_request(self.make_request()).company_ids,
+            {self.company.pk}
+        )
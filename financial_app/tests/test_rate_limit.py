@@ -0,0 +1,76 @@
+from concurrent.futures import ThreadPoolExecutor
+from unittest import mock
+from django.contrib.auth.models import User
+from django.core.cache import caches
+from django.test import RequestFactory, SimpleTestCase, TestCase, override_settings
+from financial_app.api.middleware import RateLimitMiddleware, SlidingWindowRateLimiter
+from financial_app.api.permissions import AuthorizationContext
+
+@override_settings(CACHES={
+    'default': {'BACKEND': 'django.core.cache.backends.dummy.DummyCache'},
+    'rate_limit': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'rate-limit-tests',
+    },
+})
+class SlidingWindowRateLimiterTests(SimpleTestCase):
+    def setUp(self):
+        caches['rate_limit'].clear()
+        self.limiter = SlidingWindowRateLimiter('rate_limit')
+
+    def test_limit_holds_under_parallel_load(self):
+        # Every limiter shares the cache, like one per worker process
+        limiters = [SlidingWindowRateLimiter('rate_limit') for _ in range(4)]
+
+        def hit(i):
+            return limiters[i % 4].hit('user:1', 100, 60, now=1000.0)
+
+        with ThreadPoolExecutor(max_workers=16) as executor:
+            allowed = sum(executor.map(hit, range(400)))
+
+        self.assertEqual(allowed, 100)
+
+    def test_previous_window_slides_out(self):
+        for _ in range(10):
+            self.assertTrue(self.limiter.hit('user:1', 10, 60, now=59.0))
+
+        # No fresh allowance right after the window boundary
+        self.assertFalse(self.limiter.hit('user:1', 10, 60, now=61.0))
+        # Half way into the next window only 5 of the 10 still count
+        self.assertTrue(self.limiter.hit('user:1', 10, 60, now=90.0))
+
+    def test_blocked_keys_are_refused_without_the_cache(self):
+        for _ in range(3):
+            self.limiter.hit('user:1', 2, 60, now=10.0)
+
+        with mock.patch.object(SlidingWindowRateLimiter, 'increment') as increment:
+            self.assertFalse(self.limiter.hit('user:1', 2, 60, now=20.0))
+        increment.assert_not_called()
+
+@override_settings(
+    CACHES={
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+            'LOCATION': 'rate-limit-middleware-tests',
+        },
+    },
+    API_RATE_LIMITS={'DEFAULT': {'calls': 1, 'period': 60, 'roles': {'ADMIN': 3}}},
+)
+class RateLimitMiddlewareTests(TestCase):
+    def setUp(self):
+        caches['default'].clear()
+        self.user = User.objects.create_user(username='owner', password='secret')
+        self.user.profile.role = 'ADMIN'
+        self.user.profile.save()
+
+    def test_role_limits_reuse_the_authorization_context(self):
+        middleware = RateLimitMiddleware(lambda request: 'ok')
+        request = RequestFactory().get('/api/v1/invoices/')
+        request.user = User.objects.get(pk=self.user.pk)
+        AuthorizationContext.for_request(request)
+
+        with self.assertNumQueries(0):
+            responses = [middleware(request) for _ in range(4)]
+
+        self.assertEqual(responses[:3], ['ok'] * 3)
+        self.assertEqual(responses[3].status_code, 429)
@@ -0,0 +1,64 @@
+from decimal import Decimal
+from datetime import date, timedelta
+from django.contrib.auth.models import User
+from django.test import TestCase
+from financial_app.models import Company, CompanyMonthlyRollup, Expense, ExpenseCategory
+from financial_app.services.recurring_service import RecurringService
+from financial_app.services.rollup_service import RollupService
+
+class RecurringExpenseTests(TestCase):
+    def setUp(self):
+        user = User.objects.create_user(username='owner', password='secret')
+        self.company = Company.objects.create(name='Acme', owner=user)
+        self.category = ExpenseCategory.objects.create(name='Rent')
+
+    def create_template(self, frequency, next_date, amount=Decimal('100.00')):
+        return Expense.objects.create(
+            company=self.company,
+            category=self.category,
+            amount=amount,
+            date=next_date - timedelta(days=1),
+            description='Office rent',
+            is_recurring=True,
+            recurring_frequency=frequency,
+            next_recurring_date=next_date
+        )
+
+    def rollup_snapshot(self):
+        return {
+            (row.month, row.category_id): row.expense
+            for row in CompanyMonthlyRollup.objects.filter(company=self.company)
+            if row.expense
+        }
+
+    def test_missed_occurrences_are_caught_up(self):
+        today = date(2024, 3, 10)
+        daily = self.create_template('DAILY', today - timedelta(days=3))
+        monthly = self.create_template('MONTHLY', date(2024, 1, 1), amount=Decimal('500.00'))
+
+        created = RecurringService.materialize_expenses(today)
+
+        dates = sorted(
+            Expense.objects.filter(is_recurring=False).values_list('date', 'amount')
+        )
+        self.assertEqual(len(created), 7)
+        self.assertEqual(dates, sorted(
+            [(today - timedelta(days=n), Decimal('100.00')) for n in range(4)] +
+            [(date(2024, month, 1), Decimal('500.00')) for month in (1, 2, 3)]
+        ))
+
+        daily.refresh_from_db()
+        monthly.refresh_from_db()
+        self.assertEqual(daily.next_recurring_date, today + timedelta(days=1))
+        self.assertEqual(monthly.next_recurring_date, date(2024, 4, 1))
+
+        # A second run has nothing left to create
+        self.assertEqual(RecurringService.materialize_expenses(today), [])
+
+    def test_rollup_matches_a_rebuild(self):
+        self.create_template('WEEKLY', date(2024, 1, 29))
+        RecurringService.materialize_expenses(date(2024, 3, 1))
+
+        incremental = self.rollup_snapshot()
+        RollupService.rebuild(self.company)
+        self.assertEqual(incremental, self.rollup_snapshot())
@@ -0,0 +1,77 @@
+from decimal import Decimal
+from datetime import timedelta
+from django.contrib.auth.models import User
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from financial_app.models import Company, Client, Invoice
+from financial_app.services.invoice_service import InvoiceService
+from financial_app.services.recurring_service import RecurringService
+
+class RecurringInvoiceTests(TestCase):
+    def setUp(self):
+        user = User.objects.create_user(username='owner', password='secret')
+        self.company = Company.objects.create(name='Acme', owner=user)
+        self.client_obj = Client.objects.create(
+            company=self.company,
+            name='Client',
+            email='client@example.com',
+            address='Valletta'
+        )
+        self.today = timezone.now().date()
+
+    def create_template(self, frequency='MONTHLY'):
+        invoice = Invoice.objects.create(
+            company=self.company,
+            client=self.client_obj,
+            status='SENT',
+            issue_date=self.today - timedelta(days=30),
+            due_date=self.today + timedelta(days=30),
+            tax_rate=Decimal('10'),
+            is_recurring=True,
+            recurring_frequency=frequency,
+            next_recurring_date=self.today
+        )
+        InvoiceService.add_items(invoice, [
+            {'description': 'Hosting', 'quantity': Decimal('1'), 'unit_price': Decimal('50.00')},
+            {'description': 'Support', 'quantity': Decimal('2'), 'unit_price': Decimal('25.00')},
+        ])
+        return invoice
+
+    def test_due_templates_are_cloned_with_totals(self):
+        template = self.create_template()
+
+        created = RecurringService.generate_invoices(self.company.pk, self.today)
+
+        self.assertEqual(created, 1)
+        clone = Invoice.objects.exclude(pk=template.pk).get()
+        self.assertEqual(clone.status, 'DRAFT')
+        self.assertFalse(clone.is_recurring)
+        self.assertEqual(clone.issue_date, self.today)
+        self.assertEqual(clone.subtotal, Decimal('100.00'))
+        self.assertEqual(clone.total_amount, Decimal('110.00'))
+        self.assertEqual(
+            sorted(clone.items.values_list('description', flat=True)),
+            ['Hosting', 'Support']
+        )
+
+        template.refresh_from_db()
+        self.assertGreater(template.next_recurring_date, self.today)
+
+        # Nothing is due any more
+        self.assertEqual(RecurringService.generate_invoices(self.company.pk, self.today), 0)
+
+    def test_statement_count_does_not_grow_with_templates(self):
+        for _ in range(3):
+            self.create_template()
+        with CaptureQueriesContext(connection) as small:
+            RecurringService.generate_invoices(self.company.pk, self.today)
+
+        for _ in range(30):
+            self.create_template()
+        with CaptureQueriesContext(connection) as large:
+            RecurringService.generate_invoices(self.company.pk, self.today)
+
+        self.assertEqual(len(small), len(large))
+        self.assertEqual(Invoice.objects.filter(is_recurring=False).count(), 33)
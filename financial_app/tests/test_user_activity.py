@@ -0,0 +1,64 @@
+from datetime import timedelta
+from unittest import mock
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.db import connection
+from django.test import RequestFactory, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from financial_app.api.middleware import UserActivityMiddleware
+from financial_app.models import UserProfile
+from financial_app.services.activity_service import UserActivityService
+
+@override_settings(CACHES={
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'user-activity-tests',
+    },
+})
+class UserActivityTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username='owner', password='secret')
+        self.profile = UserProfile.objects.get(user=self.user)
+
+    def test_requests_do_not_touch_the_database(self):
+        middleware = UserActivityMiddleware(lambda request: None)
+        request = RequestFactory().get('/api/v1/invoices/', REMOTE_ADDR='10.0.0.1')
+        request.user = self.user
+
+        with CaptureQueriesContext(connection) as queries:
+            for _ in range(5):
+                middleware(request)
+
+        self.assertEqual(len(queries), 0)
+        self.profile.refresh_from_db()
+        self.assertIsNone(self.profile.last_active)
+
+    def test_flush_writes_the_latest_activity_once(self):
+        now = timezone.now()
+        other = User.objects.create_user(username='other', password='secret').profile
+        UserActivityService.record(self.user.id, '10.0.0.1', now - timedelta(minutes=5))
+        UserActivityService.record(self.user.id, '10.0.0.2', now - timedelta(minutes=4))
+        UserActivityService.record(other.user_id, '10.0.0.3', now)
+
+        self.assertEqual(UserActivityService.flush(now), 1)
+        self.profile.refresh_from_db()
+        self.assertEqual(self.profile.last_login_ip, '10.0.0.2')
+        self.assertEqual(self.profile.last_active, now - timedelta(minutes=4))
+
+        # The other user's bucket is flushed once it has completed
+        self.assertEqual(UserActivityService.flush(now), 0)
+        self.assertEqual(UserActivityService.flush(now + timedelta(minutes=3)), 1)
+
+    def test_flush_skips_buckets_past_the_retention(self):
+        now = timezone.now()
+        UserActivityService.record(self.user.id, '10.0.0.1', now - timedelta(minutes=5))
+        cache.set(f"{UserActivityService.KEY_PREFIX}:flushed", 0, None)
+
+        with mock.patch.object(cache, 'get', wraps=cache.get) as get:
+            self.assertEqual(UserActivityService.flush(now), 1)
+
+        window = UserActivityService.get_retention() // UserActivityService.get_interval()
+        # One read per retained bucket, not one per bucket since the epoch
+        self.assertLess(get.call_count, 2 * window)
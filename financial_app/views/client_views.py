@@ -8,8 +8,6 @@ from django.core.paginator import Paginator
 from django.utils.translation import gettext_lazy as _
 from django.utils import timezone
 from decimal import Decimal
-import csv
-import io
 
 from ..models import Client, Company, Invoice, PaymentRecord
 from ..forms import (
@@ -18,19 +16,13 @@ from ..forms import (
 )
 from ..services.client_service import ClientService
 from ..services.report_service import ReportService
+from .csv_export import EXPORT_CHUNK_SIZE, stream_csv_response
 
-@login_required
-def client_list(request):
+def apply_client_filters(clients, filter_form):
     """
-    Display list of clients with filtering and sorting options.
+    Apply the client filter form to a queryset. Shared by the list and
+    export views so both return the same clients.
     """
-    company = get_object_or_404(Company, owner=request.user)
-    
-    # Initialize filter form
-    filter_form = ClientFilterForm(request.GET)
-    clients = Client.objects.filter(company=company)
-    
-    # Apply filters if form is valid
     if filter_form.is_valid():
         filters = filter_form.cleaned_data
         
@@ -62,6 +54,22 @@ def client_list(request):
                        Sum('invoices__amount_paid')
             ).filter(balance__lte=filters['max_balance'])
 
+    return clients
+
+@login_required
+def client_list(request):
+    """
+    Display list of clients with filtering and sorting options.
+    """
+    company = get_object_or_404(Company, owner=request.user)
+    
+    # Initialize filter form
+    filter_form = ClientFilterForm(request.GET)
+    clients = Client.objects.filter(company=company)
+    
+    # Apply filters if form is valid
+    clients = apply_client_filters(clients, filter_form)
+
     # Apply sorting
     sort_by = request.GET.get('sort_by', 'name')
     if sort_by == 'balance':
@@ -305,46 +313,33 @@ def client_add_note(request, pk):
 @login_required
 def client_export(request):
     """
-    Export clients list to CSV.
+    Stream clients as CSV, applying the same filters as the list view.
     """
     company = get_object_or_404(Company, owner=request.user)
     
     # Get filtered queryset
     filter_form = ClientFilterForm(request.GET)
-    clients = Client.objects.filter(company=company)
-    
-    if filter_form.is_valid():
-        # Apply same filters as in list view
-        pass
+    clients = apply_client_filters(
+        Client.objects.filter(company=company),
+        filter_form
+    ).order_by('name', 'id')
 
-    # Create CSV file
-    output = io.StringIO()
-    writer = csv.writer(output)
-    
-    # Write headers
-    writer.writerow([
-        'Name', 'Email', 'Phone', 'Address', 'VAT Number',
-        'Payment Terms', 'Credit Limit', 'Status'
-    ])
+    rows = clients.values_list(
+        'name', 'email', 'phone', 'address', 'vat_number',
+        'payment_terms', 'credit_limit', 'is_active'
+    ).iterator(chunk_size=EXPORT_CHUNK_SIZE)
 
-    # Write data
-    for client in clients:
-        writer.writerow([
-            client.name,
-            client.email,
-            client.phone,
-            client.address,
-            client.vat_number,
-            client.payment_terms,
-            client.credit_limit,
-            'Active' if client.is_active else 'Inactive'
-        ])
-
-    # Create response
-    response = HttpResponse(output.getvalue(), content_type='text/csv')
-    response['Content-Disposition'] = 'attachment; filename="clients.csv"'
-    
-    return response
+    return stream_csv_response(
+        'clients.csv',
+        [
+            'Name', 'Email', 'Phone', 'Address', 'VAT Number',
+            'Payment Terms', 'Credit Limit', 'Status'
+        ],
+        (
+            list(row[:-1]) + ['Active' if row[-1] else 'Inactive']
+            for row in rows
+        )
+    )
 
 @login_required
 def client_credit_check(request, pk):
@@ -0,0 +1,29 @@
+from django.http import StreamingHttpResponse
+import csv
+
+EXPORT_CHUNK_SIZE = 2000
+
+class Echo:
+    """
+    File-like object whose write() returns the value instead of buffering
+    it, so csv.writer can produce one line at a time.
+    """
+    def write(self, value):
+        return value
+
+def stream_csv_response(filename, header, rows):
+    """
+    Build a StreamingHttpResponse that writes the header and then each row
+    as it is produced. Memory stays flat regardless of the number of rows
+    when rows is a lazy iterator, e.g. queryset.values_list().iterator().
+    """
+    writer = csv.writer(Echo())
+
+    def lines():
+        yield writer.writerow(header)
+        for row in rows:
+            yield writer.writerow(row)
+
+    response = StreamingHttpResponse(lines(), content_type='text/csv')
+    response['Content-Disposition'] = f'attachment; filename="{filename}"'
+    return response
@@ -1,16 +1,13 @@
 from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib.auth.decorators import login_required, permission_required
 from django.contrib import messages
-from django.http import JsonResponse, HttpResponse
+from django.http import JsonResponse
 from django.utils import timezone
 from django.db import transaction
 from django.db.models import Sum, Count
 from django.core.paginator import Paginator
 from django.utils.translation import gettext_lazy as _
 from django.core.exceptions import PermissionDenied
-import csv
-import io
-
 from ..models import (
     Expense, ExpenseCategory, Company
 )
@@ -19,19 +16,13 @@ from ..forms import (
     ExpenseFilterForm, ExpenseCategoryForm
 )
 from ..services.expense_service import ExpenseService
+from .csv_export import EXPORT_CHUNK_SIZE, stream_csv_response
 
-@login_required
-def expense_list(request):
+def apply_expense_filters(expenses, filter_form):
     """
-    Display list of expenses with filtering and sorting options.
+    Apply the expense filter form to a queryset. Shared by the list and
+    export views so both return the same expenses.
     """
-    company = get_object_or_404(Company, owner=request.user)
-    
-    # Initialize filter form
-    filter_form = ExpenseFilterForm(request.GET)
-    expenses = Expense.objects.filter(company=company).select_related('category')
-    
-    # Apply filters if form is valid
     if filter_form.is_valid():
         filters = filter_form.cleaned_data
         
@@ -60,6 +51,22 @@ def expense_list(request):
             tax_filter = filters['tax_deductible'] == 'yes'
             expenses = expenses.filter(tax_deductible=tax_filter)
 
+    return expenses
+
+@login_required
+def expense_list(request):
+    """
+    Display list of expenses with filtering and sorting options.
+    """
+    company = get_object_or_404(Company, owner=request.user)
+    
+    # Initialize filter form
+    filter_form = ExpenseFilterForm(request.GET)
+    expenses = Expense.objects.filter(company=company).select_related('category')
+    
+    # Apply filters if form is valid
+    expenses = apply_expense_filters(expenses, filter_form)
+
     # Apply sorting
     sort_by = request.GET.get('sort_by', '-date')
     expenses = expenses.order_by(sort_by)
@@ -275,47 +282,44 @@ def expense_bulk_upload(request):
 @login_required
 def expense_export(request):
     """
-    Export expenses to CSV.
+    Stream expenses as CSV, applying the same filters as the list view.
     """
     company = get_object_or_404(Company, owner=request.user)
     
     # Get filtered queryset
     filter_form = ExpenseFilterForm(request.GET)
-    expenses = Expense.objects.filter(company=company).select_related('category')
-    
-    if filter_form.is_valid():
-        filters = filter_form.cleaned_data
-        # Apply same filters as in list view
-        # [Previous filter logic here]
-
-    # Create CSV file
-    output = io.StringIO()
-    writer = csv.writer(output)
-    
-    # Write headers
-    writer.writerow([
-        'Date', 'Category', 'Amount', 'Vendor', 'Description',
-        'Payment Method', 'Reference Number', 'Tax Deductible'
-    ])
-
-    # Write data
-    for expense in expenses:
-        writer.writerow([
-            expense.date.strftime('%Y-%m-%d'),
-            expense.category.name,
-            str(expense.amount),
-            expense.vendor,
-            expense.description,
-            expense.get_payment_method_display(),
-            expense.reference_number,
-            'Yes' if expense.tax_deductible else 'No'
-        ])
-
-    # Create response
-    response = HttpResponse(output.getvalue(), content_type='text/csv')
-    response['Content-Disposition'] = 'attachment; filename="expenses.csv"'
-    
-    return response
+    expenses = apply_expense_filters(
+        Expense.objects.filter(company=company),
+        filter_form
+    ).order_by('-date', '-id')
+
+    payment_methods = dict(Expense._meta.get_field('payment_method').choices)
+    rows = expenses.values_list(
+        'date', 'category__name', 'amount', 'vendor', 'description',
+        'payment_method', 'reference_number', 'tax_deductible'
+    ).iterator(chunk_size=EXPORT_CHUNK_SIZE)
+
+    return stream_csv_response(
+        'expenses.csv',
+        [
+            'Date', 'Category', 'Amount', 'Vendor', 'Description',
+            'Payment Method', 'Reference Number', 'Tax Deductible'
+        ],
+        (
+            [
+                date.strftime('%Y-%m-%d'),
+                category,
+                str(amount),
+                vendor,
+                description,
+                payment_methods.get(payment_method, payment_method),
+                reference_number,
+                'Yes' if tax_deductible else 'No'
+            ]
+            for (date, category, amount, vendor, description,
+                 payment_method, reference_number, tax_deductible) in rows
+        )
+    )
 
 @login_required
 def expense_category_manage(request):